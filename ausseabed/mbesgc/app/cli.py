@@ -17,11 +17,39 @@ from ausseabed.mbesgc.lib.data import (
     inputs_from_qajson_checks,
     qajson_from_inputs,
 )
-from ausseabed.mbesgc.lib.executor import Executor
+from ausseabed.mbesgc.lib.checkpoint import CheckpointError
+from ausseabed.mbesgc.lib.distributed import (
+    Coordinator,
+    CoordinatorError,
+    parse_address,
+)
+from ausseabed.mbesgc.lib.executor import Executor, run_tile_worker
+from ausseabed.mbesgc.lib.gdalconfig import GdalConfig
+from ausseabed.mbesgc.lib.scheduling import TILE_SCHEDULES
+from ausseabed.mbesgc.lib.tiling import TILE_ORDERS
 from ausseabed.mbesgc.lib.allchecks import all_checks
 from ausseabed.qajson.parser import QajsonParser
 
 
+def parse_memory_size(value: str | None) -> int | None:
+    """
+    Converts a memory size string such as `16G`, `512M` or `1000000` (bytes)
+    into a number of bytes
+    """
+    if value is None:
+        return None
+    units = {"K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+    value = value.strip().upper().removesuffix("B")
+    multiplier = 1
+    if len(value) > 0 and value[-1] in units:
+        multiplier = units[value[-1]]
+        value = value[:-1]
+    try:
+        return int(float(value) * multiplier)
+    except ValueError:
+        raise click.BadParameter(f"Invalid memory size ({value})")
+
+
 @click.command()
 @click.option("-i", "--input", required=False, help="Path to input QA JSON file")
 @click.option(
@@ -30,9 +58,240 @@ from ausseabed.qajson.parser import QajsonParser
     required=False,
     help="Path to input grid file (.tif, .bag)",
 )
-def cli(input, grid_file):
+@click.option(
+    "-w",
+    "--workers",
+    required=False,
+    default=1,
+    type=int,
+    help="Number of worker processes used to process tiles",
+)
+@click.option(
+    "--pipeline-depth",
+    required=False,
+    default=0,
+    type=int,
+    help=(
+        "Number of tiles queued between the read, check and export stages. "
+        "0 processes one tile at a time. Not used with --workers or --listen"
+    ),
+)
+@click.option(
+    "--max-memory",
+    required=False,
+    help=(
+        "Maximum memory used to process tiles (eg; 16G, 512M). The tile size "
+        "is reduced to fit within this"
+    ),
+)
+@click.option(
+    "--align-tiles",
+    is_flag=True,
+    help=(
+        "Adjust the tile size so tiles line up with the blocks of the input "
+        "rasters. Changes how the failed areas in the QAJSON are split"
+    ),
+)
+@click.option(
+    "--tile-order",
+    type=click.Choice(TILE_ORDERS),
+    default="rows",
+    show_default=True,
+    help=(
+        "Order the tiles are processed in. auto uses rows for striped "
+        "rasters and hilbert for tiled rasters, reading fewer blocks but "
+        "changing the order of the failed areas in the QAJSON"
+    ),
+)
+@click.option(
+    "--tile-halo",
+    type=int,
+    default=0,
+    show_default=True,
+    help=(
+        "Number of pixels each tile is extended by, so failed areas are not "
+        "cut off at tile edges. 2 is enough for the default checks"
+    ),
+)
+@click.option(
+    "--tile-schedule",
+    type=click.Choice(TILE_SCHEDULES),
+    default="planned",
+    show_default=True,
+    help=(
+        "Order tiles are handed out to the workers. cost hands out the tiles "
+        "estimated to take the longest first"
+    ),
+)
+@click.option(
+    "--cost-history",
+    required=False,
+    help=(
+        "Path to a JSON file the failures found in each tile are saved to, "
+        "used to schedule the tiles of later runs"
+    ),
+)
+@click.option(
+    "--gdal-cache-max",
+    required=False,
+    help="Size of GDAL's block cache (eg; 1G, 512M)",
+)
+@click.option(
+    "--gdal-num-threads",
+    required=False,
+    help=(
+        "Number of threads GDAL uses to decompress blocks and warp rasters, or ALL_CPUS"
+    ),
+)
+@click.option(
+    "--vsi-cache/--no-vsi-cache",
+    default=None,
+    help="Cache reads of the input files in memory",
+)
+@click.option(
+    "--vsi-cache-size",
+    required=False,
+    help="Size of the cache used by --vsi-cache (eg; 64M)",
+)
+@click.option(
+    "--warp-memory",
+    required=False,
+    help="Memory used when warping rasters to the pink chart (eg; 512M)",
+)
+@click.option(
+    "--checkpoint-dir",
+    required=False,
+    help=(
+        "Run directory the check results are saved to as tiles are "
+        "completed, so the run can be resumed"
+    ),
+)
+@click.option(
+    "--checkpoint-interval",
+    type=float,
+    default=60.0,
+    show_default=True,
+    help="Minimum number of seconds between saving checkpoints",
+)
+@click.option(
+    "--resume",
+    is_flag=True,
+    default=False,
+    help="Resume the run saved in the checkpoint directory",
+)
+@click.option(
+    "--listen",
+    required=False,
+    help=(
+        "Address (host:port) to listen on for mbesgc-worker processes. The "
+        "tiles are processed by the workers that connect"
+    ),
+)
+@click.option(
+    "--authkey",
+    required=False,
+    envvar="MBESGC_AUTHKEY",
+    help="Key shared with the workers (or set MBESGC_AUTHKEY)",
+)
+@click.option(
+    "--worker-timeout",
+    type=float,
+    default=600.0,
+    show_default=True,
+    help=(
+        "Seconds to wait for a worker to connect when using --listen, while "
+        "no workers are connected"
+    ),
+)
+@click.option(
+    "--task-timeout",
+    type=float,
+    required=False,
+    help="Seconds a worker has to process a tile, by default there's no limit",
+)
+@click.option(
+    "--preprocess-dir",
+    required=False,
+    help=(
+        "Directory preprocessed inputs are written to. Must be shared with "
+        "the workers when using --listen"
+    ),
+)
+@click.option(
+    "--profile",
+    required=False,
+    help=(
+        "Path to a JSON file the time spent in each stage of processing is "
+        "written to. A summary table is also printed"
+    ),
+)
+@click.option(
+    "--track-memory",
+    is_flag=True,
+    help=(
+        "Record the peak memory used by each stage, and report the tile and "
+        "check that used the most. Slows processing, and can't be used with "
+        "--pipeline-depth"
+    ),
+)
+@click.option(
+    "--progress-info",
+    is_flag=True,
+    help=(
+        "Include the tiles completed, throughput, and estimated time "
+        "remaining with the progress"
+    ),
+)
+def cli(
+    input,
+    grid_file,
+    workers,
+    pipeline_depth,
+    max_memory,
+    align_tiles,
+    tile_order,
+    tile_halo,
+    tile_schedule,
+    cost_history,
+    gdal_cache_max,
+    gdal_num_threads,
+    vsi_cache,
+    vsi_cache_size,
+    warp_memory,
+    checkpoint_dir,
+    checkpoint_interval,
+    resume,
+    listen,
+    authkey,
+    worker_timeout,
+    task_timeout,
+    preprocess_dir,
+    profile,
+    track_memory,
+    progress_info,
+):
     """Run quality assurance check over input grid file"""
 
+    if resume and checkpoint_dir is None:
+        click.echo("'--checkpoint-dir' must be provided to resume a run", err=True)
+        sys.exit(os.EX_USAGE)
+
+    if track_memory and pipeline_depth > 0 and workers <= 1 and listen is None:
+        click.echo("'--track-memory' can't be used with '--pipeline-depth'", err=True)
+        sys.exit(os.EX_USAGE)
+
+    coordinator = None
+    if listen is not None:
+        if authkey is None:
+            click.echo("'--authkey' must be provided with '--listen'", err=True)
+            sys.exit(os.EX_USAGE)
+        coordinator = Coordinator(
+            parse_address(listen),
+            authkey.encode("utf-8"),
+            connect_timeout=worker_timeout,
+            task_timeout=task_timeout,
+        )
+
     qajson = None
     qajson_folder = None
 
@@ -61,12 +320,57 @@ def cli(input, grid_file):
     spdatachecks = qajson.qa.survey_products.checks
     inputs = inputs_from_qajson_checks(spdatachecks, qajson_folder)
 
-    exe = Executor(inputs, all_checks)
+    exe = Executor(
+        inputs,
+        all_checks,
+        workers=workers,
+        pipeline_depth=pipeline_depth,
+        memory_budget=parse_memory_size(max_memory),
+        checkpoint_dir=checkpoint_dir,
+        coordinator=coordinator,
+        gdal_config=GdalConfig(
+            cache_max=parse_memory_size(gdal_cache_max),
+            num_threads=gdal_num_threads,
+            vsi_cache=vsi_cache,
+            vsi_cache_size=parse_memory_size(vsi_cache_size),
+            warp_memory=parse_memory_size(warp_memory),
+        ),
+    )
+    exe.preprocess_dir = preprocess_dir
+    exe.align_tiles = align_tiles
+    exe.tile_order = tile_order
+    exe.tile_halo = tile_halo
+    exe.tile_schedule = tile_schedule
+    exe.cost_history_file = cost_history
+    exe.checkpoint_interval = checkpoint_interval
+    exe.track_memory = track_memory
 
     def print_prog(progress):
         click.echo(f"progress = {progress}")
 
-    exe.run(print_prog)
+    def print_prog_info(progress_info):
+        click.echo(f"progress = {progress_info.progress} ({progress_info})")
+
+    if progress_info:
+        progress_callbacks = {"progress_info_callback": print_prog_info}
+    else:
+        progress_callbacks = {"progress_callback": print_prog}
+
+    try:
+        exe.run(resume=resume, **progress_callbacks)
+    except CheckpointError as e:
+        click.echo(str(e), err=True)
+        sys.exit(os.EX_DATAERR)
+    except CoordinatorError as e:
+        click.echo(str(e), err=True)
+        sys.exit(os.EX_UNAVAILABLE)
+
+    if profile is not None:
+        click.echo(exe.stats.format_table(), err=True)
+        with open(profile, "w") as f:
+            json.dump(exe.stats.to_dict(), f, indent=4)
+    elif track_memory:
+        click.echo(exe.stats.format_table(), err=True)
 
     for check_id, check in exe.check_result_cache.items():
         output = check.get_outputs()
@@ -74,5 +378,24 @@ def cli(input, grid_file):
         print(json.dumps(output_dict, indent=4))
 
 
+@click.command()
+@click.option(
+    "-c",
+    "--coordinator",
+    required=True,
+    help="Address (host:port) of the mbesgc run to process tiles for",
+)
+@click.option(
+    "--authkey",
+    required=True,
+    envvar="MBESGC_AUTHKEY",
+    help="Key shared with the coordinator (or set MBESGC_AUTHKEY)",
+)
+def worker(coordinator, authkey):
+    """Process tiles for an mbesgc run started with --listen"""
+    task_count = run_tile_worker(parse_address(coordinator), authkey.encode("utf-8"))
+    click.echo(f"processed {task_count} tiles")
+
+
 if __name__ == "__main__":
     cli()
@@ -0,0 +1,103 @@
+"""
+Reusable arrays that tile data is read into
+"""
+
+from typing import Dict, List, Tuple
+import math
+import threading
+
+import numpy as np
+
+
+class BufferArena:
+    """
+    Keeps the arrays that tile data is read into so they can be reused by the
+    following tiles, instead of each tile allocating (and freeing) arrays the
+    size of the tile for each band.
+
+    Buffers are handed out through a lease, and returned to the arena when
+    the lease is released. Each buffer grows to the size of the largest tile
+    it has been used for, and the arrays handed out are views of the start of
+    a buffer. The number of buffers kept by the arena is the largest number
+    that have been leased at once (eg; by the tiles queued in the pipeline).
+    Buffers are kept until the arena is cleared.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        # buffers that are not leased, by data type
+        self._free: Dict[np.dtype, List[np.ndarray]] = {}
+        # total size in bytes of all buffers allocated by the arena
+        self.allocated_bytes = 0
+
+    def lease(self) -> "BufferLease":
+        return BufferLease(self)
+
+    def _acquire(self, size: int, dtype: np.dtype) -> np.ndarray:
+        """Gets a free buffer of at least `size` elements, allocating if needed"""
+        with self._lock:
+            free = self._free.setdefault(dtype, [])
+            fits = [buffer for buffer in free if buffer.size >= size]
+            if len(fits) > 0:
+                buffer = min(fits, key=lambda buffer: buffer.size)
+                free.remove(buffer)
+                return buffer
+            if len(free) > 0:
+                # none of the free buffers are big enough, so the largest is
+                # replaced by a bigger one
+                smaller = max(free, key=lambda buffer: buffer.size)
+                free.remove(smaller)
+                self.allocated_bytes -= smaller.nbytes
+            buffer = np.empty(size, dtype=dtype)
+            self.allocated_bytes += buffer.nbytes
+            return buffer
+
+    def _release(self, buffers: List[np.ndarray]) -> None:
+        with self._lock:
+            for buffer in buffers:
+                self._free.setdefault(buffer.dtype, []).append(buffer)
+
+    def clear(self) -> None:
+        """
+        Frees the buffers that are not leased. Buffers that are leased are
+        still returned to the arena when their lease is released.
+        """
+        with self._lock:
+            for free in self._free.values():
+                self.allocated_bytes -= sum(buffer.nbytes for buffer in free)
+            self._free = {}
+
+    @property
+    def free_count(self) -> int:
+        """Number of buffers that are available to be leased"""
+        with self._lock:
+            return sum(len(free) for free in self._free.values())
+
+
+class BufferLease:
+    """
+    The buffers leased from an arena for a single tile. The arrays given out
+    by `acquire` must not be used once the lease has been released, as their
+    memory is given to the next tile.
+    """
+
+    def __init__(self, arena: BufferArena) -> None:
+        self._arena = arena
+        self._buffers: List[np.ndarray] = []
+
+    def acquire(self, shape: Tuple[int, ...], dtype) -> np.ndarray:
+        """
+        Gets an array of the given shape and data type, the contents of the
+        array are not initialised
+        """
+        dtype = np.dtype(dtype)
+        size = math.prod(shape)
+        buffer = self._arena._acquire(size, dtype)
+        self._buffers.append(buffer)
+        return buffer[:size].reshape(shape)
+
+    def release(self) -> None:
+        """Returns the leased buffers to the arena"""
+        buffers = self._buffers
+        self._buffers = []
+        self._arena._release(buffers)
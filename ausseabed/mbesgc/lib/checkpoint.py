@@ -0,0 +1,259 @@
+"""
+Checkpointing of the merged check results, so that a long running Executor
+can be resumed from the last completed tile
+"""
+
+from typing import Any, BinaryIO, Dict, List, Set, Tuple
+import hashlib
+import io
+import json
+import logging
+import os
+import pickle
+import threading
+import uuid
+import weakref
+
+from .data import InputFileDetails
+from .geometrystore import GeometryStore
+from .gridcheck import GridCheck
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_FILENAME = "checkpoint.pkl"
+# the spilled polygons of the geometry stores are kept in files named with
+# this prefix alongside the checkpoint
+GEOMETRY_FILENAME_PREFIX = "geometry_"
+# incremented whenever the content of the checkpoint file changes
+CHECKPOINT_VERSION = 3
+
+
+class CheckpointError(RuntimeError):
+    """Error raised when a checkpoint cannot be used to resume a run"""
+
+    pass
+
+
+def _file_details(filename: str) -> Tuple[str, int, int]:
+    """Gets the details used to identify if a file has been modified"""
+    if not os.path.exists(filename):
+        return (filename, -1, -1)
+    stat = os.stat(filename)
+    return (os.path.abspath(filename), stat.st_size, stat.st_mtime_ns)
+
+
+def get_run_fingerprint(
+    input_file_details: List[InputFileDetails],
+    settings: Dict[str, Any],
+) -> str:
+    """
+    Calculates a fingerprint of everything that affects the results of a run.
+    This includes the input files (name, size, and modification time), the
+    checks and their parameters, and the executor settings (including those
+    that determine how the inputs are broken into tiles). If any of these
+    change the results of a previous run cannot be resumed.
+
+    The fingerprint does not require the inputs to be preprocessed, so a
+    checkpoint can be checked before any of the work is repeated.
+
+    Args:
+        input_file_details (List[InputFileDetails]): the input files as given
+            by the user, before any preprocessing
+        settings (Dict[str, Any]): executor settings that change the outputs
+    """
+    inputs = []
+    for ifd in input_file_details:
+        inputs.append(
+            {
+                "bands": [
+                    [_file_details(filename), band_index, str(band_type)]
+                    for filename, band_index, band_type in ifd.input_band_details
+                ],
+                "pink_chart": (
+                    None
+                    if ifd.pink_chart_filename is None
+                    else _file_details(ifd.pink_chart_filename)
+                ),
+                "checks": [
+                    [check_id, [param.to_dict() for param in params]]
+                    for check_id, params in ifd.check_ids_and_params
+                ],
+            }
+        )
+    content = json.dumps(
+        {"inputs": inputs, "settings": settings},
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+class _CheckpointPickler(pickle.Pickler):
+    """
+    Pickles the run state, saving the spilled polygons of geometry stores to
+    files in the run directory rather than including them in the checkpoint
+    """
+
+    def __init__(self, file: BinaryIO, checkpoint: "RunCheckpoint"):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self._checkpoint = checkpoint
+
+    def persistent_id(self, obj: Any) -> Any:
+        if isinstance(obj, GeometryStore) and obj.spilled_count > 0:
+            return self._checkpoint._save_geometry(obj)
+        return None
+
+
+class _CheckpointUnpickler(pickle.Unpickler):
+    def __init__(self, file: BinaryIO, run_dir: str):
+        super().__init__(file)
+        self._run_dir = run_dir
+
+    def persistent_load(self, pid: Any) -> Any:
+        kind, filename, length, spilled_count, spill_count, polygons = pid
+        if kind != "geometry":
+            raise pickle.UnpicklingError(f"Unknown persistent id {kind}")
+        with open(os.path.join(self._run_dir, filename), "rb") as f:
+            return GeometryStore.from_spilled(
+                f, length, spilled_count, polygons, spill_count
+            )
+
+
+class RunCheckpoint:
+    """
+    Stores the merged check results of a run, along with the number of tiles
+    of each input file that have been merged into them, in a run directory.
+    The tiles of a file are always merged in the order they were planned, so
+    the completed tile counts are all that's needed to know which tiles
+    remain.
+
+    The checkpoint is written to a temporary file that then replaces the
+    previous checkpoint, so a run that's killed while saving leaves the last
+    checkpoint intact.
+
+    The spilled polygons of the geometry stores of the checks are not
+    included in the checkpoint file. Each store is given its own file in the
+    run directory, and as polygons are only ever appended to a store, only
+    the polygons spilled since the last checkpoint are copied to it. The
+    checkpoint records the length of this file, so polygons appended after
+    the checkpoint was captured are ignored when it's loaded.
+    """
+
+    def __init__(self, run_dir: str, fingerprint: str):
+        self.run_dir = run_dir
+        self.fingerprint = fingerprint
+        # file name, and the number of bytes copied to it, of each store
+        # that has been saved
+        self._geometry_files: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        # names of the geometry files written by this checkpoint, checkpoints
+        # may be captured and written on different threads
+        self._geometry_filenames: Set[str] = set()
+        self._lock = threading.Lock()
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.run_dir, CHECKPOINT_FILENAME)
+
+    def dumps(
+        self,
+        completed_tile_counts: List[int],
+        checks: List[Tuple[int, str, GridCheck]],
+    ) -> bytes:
+        """
+        Serialises the state of the run. This is separate from `write` so
+        that the state can be captured on one thread and written on another.
+
+        Args:
+            completed_tile_counts (List[int]): number of tiles of each input
+                file merged into the checks
+            checks (List[Tuple[int, str, GridCheck]]): the merged checks,
+                along with the index of the input file they were run on and
+                their check id
+        """
+        data = io.BytesIO()
+        _CheckpointPickler(data, self).dump(
+            {
+                "version": CHECKPOINT_VERSION,
+                "fingerprint": self.fingerprint,
+                "completed_tile_counts": completed_tile_counts,
+                "checks": checks,
+            }
+        )
+        return data.getvalue()
+
+    def _save_geometry(self, store: GeometryStore) -> Tuple:
+        """
+        Copies the polygons spilled by a store since it was last saved to
+        its file in the run directory. Returns the persistent id the store is
+        pickled as.
+        """
+        saved = self._geometry_files.get(store)
+        if saved is None:
+            filename = f"{GEOMETRY_FILENAME_PREFIX}{uuid.uuid4().hex}.jsonl"
+            saved = [filename, 0]
+            self._geometry_files[store] = saved
+            with self._lock:
+                self._geometry_filenames.add(filename)
+        filename, copied = saved
+        os.makedirs(self.run_dir, exist_ok=True)
+        with open(os.path.join(self.run_dir, filename), "ab") as f:
+            saved[1] = store.copy_spilled(f, copied)
+            f.flush()
+            os.fsync(f.fileno())
+        return (
+            "geometry",
+            filename,
+            saved[1],
+            store.spilled_count,
+            store.spill_count,
+            store.memory_polygons,
+        )
+
+    def write(self, data: bytes) -> None:
+        """Writes the serialised state of the run to the run directory"""
+        os.makedirs(self.run_dir, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._remove_old_geometry()
+
+    def _remove_old_geometry(self) -> None:
+        """
+        Removes the geometry files of previous runs, once a checkpoint of
+        this run has replaced theirs
+        """
+        with self._lock:
+            filenames = set(self._geometry_filenames)
+        for filename in os.listdir(self.run_dir):
+            if filename.startswith(GEOMETRY_FILENAME_PREFIX) and (
+                filename not in filenames
+            ):
+                try:
+                    os.remove(os.path.join(self.run_dir, filename))
+                except OSError as e:
+                    logger.warning(f"Failed to remove {filename}: {e}")
+
+    def load(self) -> Tuple[List[int], List[Tuple[int, str, GridCheck]]] | None:
+        """
+        Loads the completed tile counts and merged checks from the run
+        directory. Returns None if there is no checkpoint, and raises a
+        CheckpointError if the checkpoint was made by a different run.
+        """
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path, "rb") as f:
+            state = _CheckpointUnpickler(f, self.run_dir).load()
+
+        if state.get("version") != CHECKPOINT_VERSION:
+            raise CheckpointError(
+                f"Checkpoint {self.path} was created by an incompatible version"
+            )
+        if state["fingerprint"] != self.fingerprint:
+            raise CheckpointError(
+                f"Checkpoint {self.path} was created with different inputs, "
+                "check parameters, or settings and cannot be resumed"
+            )
+        return state["completed_tile_counts"], state["checks"]
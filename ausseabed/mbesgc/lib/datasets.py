@@ -0,0 +1,62 @@
+"""
+Management of the GDAL datasets opened while reading tile data
+"""
+
+from osgeo import gdal
+from typing import Dict, List
+import threading
+
+
+class DatasetPool:
+    """
+    Keeps GDAL datasets open so they can be reused across tiles, instead of
+    each band of each tile opening (and parsing the header of) the file again.
+
+    GDAL dataset handles must not be used by more than one thread at a time,
+    so each thread is given its own handle for each file. All handles are
+    closed when `close` is called.
+    """
+
+    def __init__(self) -> None:
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # the datasets opened by each thread, keyed by filename
+        self._thread_datasets: List[Dict[str, gdal.Dataset]] = []
+
+    def open(self, filename: str) -> gdal.Dataset:
+        """
+        Gets the dataset for the given filename, opening it if this thread
+        has not already done so.
+        """
+        datasets = getattr(self._local, "datasets", None)
+        if datasets is None:
+            datasets = {}
+            self._local.datasets = datasets
+            with self._lock:
+                self._thread_datasets.append(datasets)
+
+        ds = datasets.get(filename)
+        if ds is None:
+            ds = gdal.Open(filename)
+            if ds is None:
+                raise RuntimeError(f"Could not open {filename}")
+            datasets[filename] = ds
+        return ds
+
+    @property
+    def open_count(self) -> int:
+        """Total number of dataset handles open across all threads"""
+        with self._lock:
+            return sum(len(datasets) for datasets in self._thread_datasets)
+
+    def close(self) -> None:
+        """
+        Closes all datasets opened by all threads. Must only be called once
+        the threads using this pool have finished reading.
+        """
+        with self._lock:
+            for datasets in self._thread_datasets:
+                # GDAL closes the dataset once the last reference is released
+                datasets.clear()
+            self._thread_datasets = []
+            self._local = threading.local()
@@ -0,0 +1,295 @@
+"""
+Distribution of tiles from a coordinator to worker processes running on
+other hosts
+
+The coordinator listens on a socket that the workers connect to. Once
+connected a worker is sent the job (the check classes and executor settings),
+and then repeatedly requests a task, processes it, and sends back the result
+along with its request for the next task. All messages are pickled, and
+connections are authenticated using a key shared by the coordinator and
+workers.
+
+Tasks refer to input files by their path, so all input files (and the
+outputs of any preprocessing) must be accessible at the same path by the
+coordinator and all workers (eg; on a shared filesystem).
+"""
+
+from multiprocessing.connection import Client, Connection, Listener
+from typing import Any, Callable, Dict, Tuple
+import logging
+import queue
+import socket
+import threading
+import time
+import traceback
+
+logger = logging.getLogger(__name__)
+
+
+def parse_address(address: str) -> Tuple[str, int]:
+    """
+    Converts an address string of the form `host:port` into the tuple used
+    by the coordinator and workers
+    """
+    host, sep, port = address.rpartition(":")
+    if sep == "" or not port.isdigit():
+        raise ValueError(f"Invalid address ({address}), expected host:port")
+    return (host, int(port))
+
+
+class CoordinatorError(Exception):
+    """
+    Raised when the coordinator can't complete the tasks it was given, as no
+    workers are connected or a worker has not returned a task in time
+    """
+
+
+class Coordinator:
+    """
+    Hands out tasks to the workers that connect to it, and collects their
+    results. The socket is opened when the coordinator is created so its
+    address (including the port, if 0 was given) is known before any
+    workers are started. A coordinator is used for a single run, it can't
+    be started again once stopped.
+
+    If the connection to a worker is lost while it is processing a task the
+    task is queued again to be given to another worker.
+
+    Args:
+        address (Tuple[str, int]): address to listen on for workers
+        authkey (bytes): key shared with the workers
+        connect_timeout (float): time in seconds to wait for a worker to
+            connect while no workers are connected, before giving up on the
+            tasks that remain
+        task_timeout (float): time in seconds a worker has to return the
+            result of a task, or None to wait indefinitely. A worker that
+            stops responding without its connection being closed would
+            otherwise leave its task incomplete.
+    """
+
+    def __init__(
+        self,
+        address: Tuple[str, int],
+        authkey: bytes,
+        connect_timeout: float = 600.0,
+        task_timeout: float | None = None,
+    ):
+        self._listener: Listener = Listener(address, authkey=authkey)
+        self.connect_timeout = connect_timeout
+        self.task_timeout = task_timeout
+        self._tasks: queue.Queue = queue.Queue()
+        self._results: queue.Queue = queue.Queue()
+        self._job: Dict[str, Any] | None = None
+        self._stop_event = threading.Event()
+        self._accept_thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+        # number of workers connected, and the time since there have been
+        # none connected
+        self._worker_count = 0
+        self._no_workers_since = time.monotonic()
+        # time each task that's being processed by a worker was handed out
+        self._task_start_times: Dict[int, float] = {}
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        address = self._listener.address
+        # the listener is always given a host and port, not a socket file
+        assert isinstance(address, tuple)
+        return address
+
+    def start(self, job: Dict[str, Any]) -> None:
+        """
+        Starts accepting workers. The job is sent to each worker as it
+        connects, before it's given any tasks.
+        """
+        if self._stop_event.is_set():
+            raise CoordinatorError("A coordinator can't be started once stopped")
+        self._job = job
+        with self._lock:
+            self._no_workers_since = time.monotonic()
+        self._accept_thread = threading.Thread(
+            target=self._accept, name="mbesgc-coordinator", daemon=True
+        )
+        self._accept_thread.start()
+
+    def put_task(self, task_id: int, task: Any) -> None:
+        self._tasks.put((task_id, task))
+
+    def get_result(self, timeout: float | None = None) -> Tuple[int, Any, str | None]:
+        """
+        Gets the next result returned by a worker. Results are returned in
+        the order they're completed, not the order the tasks were put. The
+        result is a tuple of the task id, the value returned by the task,
+        and the error (formatted traceback) if the task failed. Raises
+        `queue.Empty` if no result is returned within the timeout, or a
+        CoordinatorError if no worker has been connected for
+        `connect_timeout` seconds or a task has exceeded the `task_timeout`.
+        """
+        try:
+            return self._results.get(timeout=timeout)
+        except queue.Empty:
+            self._check_timeouts()
+            raise
+
+    def _check_timeouts(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if (
+                self._worker_count == 0
+                and now - self._no_workers_since > self.connect_timeout
+            ):
+                raise CoordinatorError(
+                    f"No workers connected to {self.address} within "
+                    f"{self.connect_timeout} seconds"
+                )
+            if self.task_timeout is None:
+                return
+            for task_id, start_time in self._task_start_times.items():
+                if now - start_time > self.task_timeout:
+                    raise CoordinatorError(
+                        f"Task {task_id} was not completed by its worker within "
+                        f"{self.task_timeout} seconds"
+                    )
+
+    def stop(self) -> None:
+        """
+        Stops accepting workers. Workers are told there are no more tasks
+        the next time they request one, after which they exit. A coordinator
+        cannot be started again once stopped.
+        """
+        if self._stop_event.is_set():
+            return
+        self._stop_event.set()
+        if self._accept_thread is not None:
+            try:
+                # accept blocks until a connection is made, so connect to
+                # wake it up. The connection fails authentication, which
+                # the accept thread ignores once stopped.
+                socket.create_connection(self.address, timeout=5).close()
+            except OSError:
+                pass
+            self._accept_thread.join()
+        self._listener.close()
+
+    def _accept(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                conn: Connection = self._listener.accept()
+            except Exception as e:
+                # failed authentication, or a worker that disconnected during
+                # the handshake
+                if not self._stop_event.is_set():
+                    logger.warning(f"Worker connection failed: {e}")
+                continue
+            if self._stop_event.is_set():
+                conn.close()
+                return
+            threading.Thread(
+                target=self._serve_worker,
+                args=(conn,),
+                name="mbesgc-coordinator-worker",
+                daemon=True,
+            ).start()
+
+    def _next_task(self) -> Tuple[int, Any] | None:
+        """Waits for the next task, returns None once stopped"""
+        while not self._stop_event.is_set():
+            try:
+                return self._tasks.get(timeout=0.5)
+            except queue.Empty:
+                continue
+        return None
+
+    def _serve_worker(self, conn: Connection) -> None:
+        # the task given to the worker that it has not returned a result for
+        in_progress: Tuple[int, Any] | None = None
+        with self._lock:
+            self._worker_count += 1
+        try:
+            conn.send(self._job)
+            while True:
+                message = conn.recv()
+                if message is not None:
+                    task_id, result, error = message
+                    with self._lock:
+                        self._task_start_times.pop(task_id, None)
+                    self._results.put((task_id, result, error))
+                    in_progress = None
+
+                in_progress = self._next_task()
+                if in_progress is not None:
+                    with self._lock:
+                        self._task_start_times[in_progress[0]] = time.monotonic()
+                conn.send(in_progress)
+                if in_progress is None:
+                    return
+        except (EOFError, OSError) as e:
+            if in_progress is not None:
+                logger.warning(
+                    f"Lost connection to worker ({e}), task {in_progress[0]} "
+                    "will be given to another worker"
+                )
+                with self._lock:
+                    self._task_start_times.pop(in_progress[0], None)
+                self._tasks.put(in_progress)
+        finally:
+            conn.close()
+            with self._lock:
+                self._worker_count -= 1
+                if self._worker_count == 0:
+                    self._no_workers_since = time.monotonic()
+
+
+def run_worker(
+    address: Tuple[str, int],
+    authkey: bytes,
+    init_job: Callable[[Dict[str, Any]], None],
+    process_task: Callable[[Any], Any],
+    connect_timeout: float = 60.0,
+) -> int:
+    """
+    Connects to a coordinator and processes the tasks it hands out until
+    there are none left. Returns the number of tasks processed.
+
+    Args:
+        address (Tuple[str, int]): address of the coordinator
+        authkey (bytes): key shared with the coordinator
+        init_job (Callable): called with the job sent by the coordinator
+            before any tasks are processed
+        process_task (Callable): called to process each task, the value it
+            returns is sent back to the coordinator
+        connect_timeout (float): time in seconds to keep retrying the
+            connection to the coordinator, so workers can be started before
+            the coordinator
+    """
+    connect_until = time.monotonic() + connect_timeout
+    while True:
+        try:
+            conn: Connection = Client(address, authkey=authkey)
+            break
+        except ConnectionRefusedError:
+            if time.monotonic() > connect_until:
+                raise
+            time.sleep(1)
+
+    task_count = 0
+    try:
+        init_job(conn.recv())
+        conn.send(None)
+        while True:
+            task = conn.recv()
+            if task is None:
+                break
+            task_id, task_data = task
+            try:
+                result = process_task(task_data)
+                conn.send((task_id, result, None))
+            except Exception:
+                logger.error(f"Task {task_id} failed", exc_info=True)
+                conn.send((task_id, None, traceback.format_exc()))
+            task_count += 1
+    except (EOFError, OSError):
+        logger.info("Connection to coordinator closed")
+    finally:
+        conn.close()
+    return task_count
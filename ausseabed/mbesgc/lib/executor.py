@@ -2,42 +2,380 @@
 Manages process of executing checks
 """
 
-from typing import Dict, List, Tuple
-from osgeo import gdal
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, Future, FIRST_COMPLETED, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from multiprocessing.util import Finalize
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Iterator, List, Tuple
+from osgeo import gdal, gdal_array
+import asyncio
+import functools
 import logging
 import numpy as np
-import numpy.ma as ma
 import os
+import queue
 import tempfile
+import threading
+import time
+import tracemalloc
 from pathlib import Path
 
 from .check_utils import get_check
+from .checkpoint import RunCheckpoint, CheckpointError, get_run_fingerprint
+from .datasets import DatasetPool
+from .distributed import Coordinator, run_worker
+from .buffers import BufferArena, BufferLease
 from .data import InputFileDetails, BandType, InputFileDetailsError
-from .tiling import get_tiles, Tile
-from .gridcheck import GridCheck
+from .gdalconfig import GdalConfig
+from .tiling import (
+    get_tiles,
+    get_aligned_tile_size,
+    get_budget_tile_size,
+    get_tile_order,
+    order_tiles,
+    Tile,
+)
+from .gridcheck import CheckSummary, GridCheck
 from .pinkchart import PinkChartProcessor
+from .profiling import RunStats
+from .progress import ProgressInfo, ProgressTracker
+from .scheduling import PROBE_SIZE, CostHistory, estimate_tile_cost, get_schedule
 
 logger = logging.getLogger(__name__)
 
+# maximum number of pixels of the pink chart read at once when checking if
+# it covers a tile
+PINKCHART_SCAN_PIXELS = 1024 * 1024
+
+# density (the number of soundings per node) is loaded as the smallest of
+# these types that holds the values of the tile, or int64 if none do
+DENSITY_DTYPES: List[np.dtype] = [np.dtype(np.uint16), np.dtype(np.uint32)]
+
+
+def _get_density_read_dtype(gdal_data_type: int) -> np.dtype | None:
+    """
+    Gets the type a density band is read as by GDAL, or None if the band is
+    read as its own type and converted once its nodata has been identified
+    """
+    numeric_type = np.dtype(gdal_array.GDALTypeCodeToNumericTypeCode(gdal_data_type))
+    if numeric_type.kind != "u":
+        # signed and floating point values may not fit
+        return None
+    for dtype in DENSITY_DTYPES:
+        if numeric_type.itemsize <= dtype.itemsize:
+            return dtype
+    return None
+
+
+def _get_density_dtype(density: np.ndarray) -> np.dtype:
+    """
+    Gets the smallest density type that holds the values of the density
+    array. Values that are negative or not finite fall back to int64.
+    """
+    if density.size == 0:
+        return DENSITY_DTYPES[0]
+    low = density.min()
+    high = density.max()
+    for dtype in DENSITY_DTYPES:
+        # comparisons with NaN are false, so NaN falls through to int64
+        if low >= 0 and high <= np.iinfo(dtype).max:
+            return dtype
+    return np.dtype(np.int64)
+
+
+def _get_input_key(ifd: InputFileDetails) -> str:
+    """
+    Gets the key identifying an input in the tile cost history, the files of
+    the input as given by the user (before any preprocessing)
+    """
+    src_ifd = ifd if ifd.source is None else ifd.source
+    filenames = sorted(
+        set(os.path.abspath(filename) for filename, _, _ in src_ifd.input_band_details)
+    )
+    return "|".join(filenames)
+
+
+# executor instance used by each worker process of the process pool, this is
+# created once per process by `_init_worker`
+_worker_executor: "Executor | None" = None
+
+
+def _init_worker(check_classes, settings: Dict[str, Any]):
+    """
+    Initialises a worker process of the process pool. Each worker gets its own
+    Executor that is only used to load tile data and run the checks over it.
+    The `settings` are the attributes of the parent Executor that affect how
+    tiles are processed.
+    """
+    global _worker_executor
+    exe = Executor([], check_classes)
+    for name, value in settings.items():
+        setattr(exe, name, value)
+    exe._progress_callback = None
+    exe._progress_info_callback = None
+    exe._tile_callback = None
+    # the worker process only runs tiles for this run, so the GDAL settings
+    # are applied until the worker exits
+    exe._gdal_config_previous = exe.gdal_config.apply()
+    if exe.track_memory and not tracemalloc.is_tracing():
+        # traces the memory of all tiles processed by this worker
+        tracemalloc.start()
+    # datasets are kept open for all the tiles given to this worker, and
+    # closed when the worker process exits
+    Finalize(exe, exe._datasets.close, exitpriority=10)
+    _worker_executor = exe
+
+
+def _prepare_input_in_worker(
+    ifd: InputFileDetails, completed_count: int
+) -> Tuple[
+    bool, List[str], InputFileDetails, List[str], List[Tile], List[int], RunStats
+]:
+    """
+    Validates, preprocesses, and plans the tiles of a single input file
+    within a worker process. Returns the validation result and messages, the
+    preprocessed input file details, the temporary directories created by
+    the preprocessing, the tiles, the order the tiles following the
+    `completed_count` already completed are to be processed in, and the time
+    taken by each stage.
+    """
+    assert _worker_executor is not None
+    exe = _worker_executor
+    exe.stats = RunStats(track_memory=exe.track_memory)
+    with exe.stats.stage("validate"):
+        passed, messages = ifd.validate()
+    if not passed:
+        return passed, messages, ifd, [], [], [], exe.stats
+    exe.temp_dirs = []
+    with exe.stats.stage("preprocess"):
+        processed_ifd = exe._preprocess_input(ifd)
+    with exe.stats.stage("plan_tiles"):
+        tiles = exe._plan_tiles(processed_ifd)
+    schedule = exe._schedule_tiles(processed_ifd, tiles[completed_count:])
+    return (
+        passed,
+        messages,
+        processed_ifd,
+        exe.temp_dirs,
+        tiles,
+        schedule,
+        exe.stats,
+    )
+
+
+def _process_tile_in_worker(
+    ifd: InputFileDetails, tile: Tile
+) -> Tuple[List[Tuple[str, GridCheck]], RunStats]:
+    """
+    Processes a tile within a worker process. Returns the checks run over
+    the tile, and the time taken by each stage.
+    """
+    assert _worker_executor is not None
+    exe = _worker_executor
+    exe.stats = RunStats(track_memory=exe.track_memory)
+    return exe._process_tile(ifd, tile), exe.stats
+
+
+def run_tile_worker(address: Tuple[str, int], authkey: bytes, **kwargs) -> int:
+    """
+    Runs a worker that processes tiles handed out by the coordinator of an
+    Executor running on another host. Returns once the Executor has
+    finished, or the connection to it is lost.
+    """
+
+    def init_job(job: Dict[str, Any]) -> None:
+        _init_worker(job["check_classes"], job["settings"])
+
+    def process_task(task: Tuple[InputFileDetails, Tile]):
+        ifd, tile = task
+        return _process_tile_in_worker(ifd, tile)
+
+    try:
+        return run_worker(address, authkey, init_job, process_task, **kwargs)
+    finally:
+        if _worker_executor is not None:
+            _worker_executor._datasets.close()
+            if _worker_executor._gdal_config_previous is not None:
+                _worker_executor.gdal_config.restore(
+                    _worker_executor._gdal_config_previous
+                )
+
+
+class TileRecord:
+    """
+    The results of the checks run over a single tile, yielded by
+    `Executor.iter_results` as each tile is completed. Unlike the checks of a
+    TileResult these are the results of this tile only, so a caller can
+    build up maps and statistics of a run as it proceeds.
+    """
+
+    def __init__(
+        self,
+        ifd: InputFileDetails,
+        tile: Tile,
+        checks: Dict[str, CheckSummary],
+    ):
+        self.ifd = ifd
+        # the window of the input file covered by the results, the halo of
+        # the tile is counted by the neighbouring tiles
+        self.tile = tile.core
+        # summary of the results of each check, by check id
+        self.checks = checks
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "tile": {
+                "min_x": self.tile.min_x,
+                "min_y": self.tile.min_y,
+                "max_x": self.tile.max_x,
+                "max_y": self.tile.max_y,
+            },
+            "checks": {
+                check_id: summary.to_dict() for check_id, summary in self.checks.items()
+            },
+        }
+
+
+class TileResult:
+    """
+    The checks run over a tile, given to the tile callback of the Executor
+    once the tile has been completed. The checks have been merged with the
+    results of the tiles completed before this one, so they hold the results
+    of all tiles up to and including this tile. The results of this tile
+    alone are in `record`.
+    """
+
+    def __init__(
+        self,
+        ifd: InputFileDetails,
+        tile: Tile,
+        checks: List[Tuple[str, GridCheck]],
+        record: TileRecord,
+    ):
+        self.ifd = ifd
+        self.tile = tile
+        self.checks = checks
+        self.record = record
+
 
 class Executor:
-    def __init__(self, input_file_details: List[InputFileDetails], check_classes):
+    def __init__(
+        self,
+        input_file_details: List[InputFileDetails],
+        check_classes,
+        workers: int = 1,
+        pipeline_depth: int = 0,
+        memory_budget: int | None = None,
+        checkpoint_dir: str | None = None,
+        coordinator: Coordinator | None = None,
+        gdal_config: GdalConfig | None = None,
+    ):
         self.input_file_details = input_file_details
         self.tile_size_x = 40000
         self.tile_size_y = 40000
+        # adjust the tile size so that tiles line up with the internal block
+        # layout of the input rasters. This changes the tile boundaries, so
+        # the failed areas of the QAJSON map and the spatial outputs are
+        # split differently to the tile size given.
+        self.align_tiles = False
+        # order the tiles are processed in, one of `TILE_ORDERS`. `auto`
+        # picks the order based on the block layout of the input rasters.
+        # The failed areas of the QAJSON map are in the order the tiles are
+        # processed, so only `rows` keeps the order of earlier versions.
+        self.tile_order = "rows"
+        # number of pixels each tile is extended by on all sides, so that
+        # the neighbourhood operations of the checks (eg; growing failed
+        # pixels) give the same results at tile edges as within a tile. The
+        # results of each tile only include the pixels of the tile before it
+        # was extended.
+        self.tile_halo = 0
+        # maximum amount of memory (in bytes) to be used for processing tiles.
+        # If set the tile size is reduced so that the estimated memory used to
+        # process all tiles held in memory at once fits within this budget.
+        self.memory_budget = memory_budget
+        # tiles that contain only nodata are not read, the checks are given
+        # empty arrays for these tiles instead
+        self.skip_empty_tiles = True
         self.checks = check_classes
 
+        # number of processes used to process tiles. A value of 1 processes
+        # all tiles in this process, one after another.
+        self.workers = workers
+        # when set the tiles are processed by the workers (running on other
+        # hosts) connected to the coordinator instead of by this process
+        self.coordinator = coordinator
+        # order the tiles are handed out to the worker processes (or the
+        # workers of the coordinator), one of `TILE_SCHEDULES`. The results
+        # are always merged in the planned order, so the schedule doesn't
+        # change the outputs.
+        self.tile_schedule = "planned"
+        # JSON file the fraction of valid and failed pixels of each tile is
+        # saved to at the end of a run. Used by the `cost` schedule of the
+        # following runs in place of probing the tiles.
+        self.cost_history_file: str | None = None
+        self._cost_history: CostHistory | None = None
+
+        # maximum number of tiles that can be queued between the reader,
+        # compute, and exporter stages when processing tiles with a single
+        # worker. A value of 0 disables the pipeline, each tile is then read,
+        # checked, and exported before moving onto the next.
+        self.pipeline_depth = pipeline_depth
+        # set when the checks should leave their spatial exports for the
+        # exporter stage of the pipeline
+        self._defer_exports = False
+
         # used to store the results of each check as the checks are run
         # across multiple tiles
         self.check_result_cache: Dict[Tuple[InputFileDetails, str], GridCheck] = {}
 
+        # run directory the merged check results are saved to as tiles are
+        # completed, allowing a run that did not complete to be resumed
+        self.checkpoint_dir = checkpoint_dir
+        self._checkpoint: RunCheckpoint | None = None
+        # minimum number of seconds between saving checkpoints. Each save
+        # includes all merged results, so saving after every tile (a value
+        # of 0) slows down runs with many tiles. The results merged since
+        # the last save are always saved when the run stops or completes.
+        self.checkpoint_interval = 60.0
+        self._checkpoint_time = 0.0
+        self._checkpoint_pending = False
+
         self.spatial_export = False
         self.spatial_export_location = None
         self.spatial_qajson = True
 
+        # time spent in each stage of the last run
+        self.stats = RunStats()
+        # record the peak memory used when loading, checking, and exporting
+        # each tile. This slows processing, as all memory allocations are
+        # traced by tracemalloc. Can't be used with the pipeline, as the
+        # peak traced by tracemalloc is shared by all threads.
+        self.track_memory = False
+
+        self._progress_callback = None
+        self._progress_info_callback: Callable[[ProgressInfo], None] | None = None
+        self._tile_callback: Callable[[TileResult], None] | None = None
+        # tiles, pixels, and bytes completed by the current run
+        self._progress = ProgressTracker()
+
+        # open GDAL datasets, shared by all tiles read during a run
+        self._datasets = DatasetPool()
+        # arrays the tile data is read into, reused by the following tiles
+        self._buffers = BufferArena()
+        # GDAL settings applied for the duration of a run, including within
+        # the worker processes
+        self.gdal_config = GdalConfig() if gdal_config is None else gdal_config
+        # settings in place before the GDAL settings were applied by
+        # `_init_worker`
+        self._gdal_config_previous: Dict[str, Any] | None = None
+
         # list of temporary directories that need to be cleaned up after the Executor
         # has completed processing
         self.temp_dirs: list[str] = []
+        # directory the temporary directories are created in, the system
+        # temp directory is used if not set. When tiles are processed on
+        # other hosts this must be on a filesystem shared with them.
+        self.preprocess_dir: str | None = None
 
         # this source input files before any preprocessing is performed
         self.source_input_file_details: List[InputFileDetails] | None = None
@@ -57,128 +395,387 @@ class Executor:
         # iterate by index as we'll be replacing ifds as we iterate over this list
         for ifd_index in range(0, len(self.input_file_details)):
             ifd = self.input_file_details[ifd_index]
+            # replace this set of input files (ifd) with the preprocessed version
+            with self.stats.stage("preprocess"):
+                self.input_file_details[ifd_index] = self._preprocess_input(ifd)
 
-            if ifd.pink_chart_filename is None:
-                # then there's no pre processing required, so skip to next ifd
-                continue
+    def _preprocess_input(self, ifd: InputFileDetails) -> InputFileDetails:
+        """
+        Performs the preprocessing of a single set of input files. Returns
+        the preprocessed input file details, or the given input file details
+        if no preprocessing is required.
+        """
+        if ifd.pink_chart_filename is None:
+            # then there's no pre processing required
+            return ifd
 
-            processed_ifd = ifd.clone()
-            # replace this set of input files (ifd) with the preprocessed version
-            self.input_file_details[ifd_index] = processed_ifd
+        processed_ifd = ifd.clone()
 
-            # each ifd is a set of input files, the pink chart stuff needs to be
-            # done per each set of these inputs
-            if ifd.pink_chart_filename is None:
-                # don't do any of the following if there is no pink chart specified
-                continue
-            # temp_dir = tempfile.TemporaryDirectory()
-            # self.temp_dirs.append(temp_dir)
-            # temp_dir_path = Path(temp_dir.name)
-            temp_dir = tempfile.mkdtemp()
-            self.temp_dirs.append(temp_dir)
-            temp_dir_path = Path(temp_dir)
-
-            raster_inputs = []
-            raster_outputs = []
-            pc_output = temp_dir_path.joinpath(
-                Path(ifd.pink_chart_filename).stem + "_pinkchart.tif"
-            )
+        # each ifd is a set of input files, the pink chart stuff needs to be
+        # done per each set of these inputs
+        # temp_dir = tempfile.TemporaryDirectory()
+        # self.temp_dirs.append(temp_dir)
+        # temp_dir_path = Path(temp_dir.name)
+        temp_dir = tempfile.mkdtemp(dir=self.preprocess_dir)
+        self.temp_dirs.append(temp_dir)
+        temp_dir_path = Path(temp_dir)
 
-            for input_file, band_index, band_type in ifd.input_band_details:
-                output_file = temp_dir_path.joinpath(Path(input_file).stem + ".tif")
-                # The pink chart processor processes whole geotiffs including all the bands
-                # to make sure we don't unecessarily process the same input raster multiple
-                # times (as would be the case with a multi band geotiff), we filter out duplicates
-                # here.
-                # Also, while reprocessing duplicates worked on MacOS it failed on Windows
-                if Path(input_file) not in raster_inputs:
-                    raster_inputs.append(Path(input_file))
-                    raster_outputs.append(output_file)
-
-                processed_ifd.add_band_details(str(output_file), band_index, band_type)
-
-            pcp = PinkChartProcessor(
-                raster_inputs, Path(ifd.pink_chart_filename), raster_outputs, pc_output
-            )
-            pcp.process()
+        raster_inputs = []
+        raster_outputs = []
+        pc_output = temp_dir_path.joinpath(
+            Path(ifd.pink_chart_filename).stem + "_pinkchart.tif"
+        )
 
-            # update the size of the rasters so the correct tiling strategy is calculated later
-            processed_ifd.size_x = pcp.size_x
-            processed_ifd.size_y = pcp.size_y
-            processed_ifd.geotransform = pcp.geotransform
+        for input_file, band_index, band_type in ifd.input_band_details:
+            output_file = temp_dir_path.joinpath(Path(input_file).stem + ".tif")
+            # The pink chart processor processes whole geotiffs including all the bands
+            # to make sure we don't unecessarily process the same input raster multiple
+            # times (as would be the case with a multi band geotiff), we filter out duplicates
+            # here.
+            # Also, while reprocessing duplicates worked on MacOS it failed on Windows
+            if Path(input_file) not in raster_inputs:
+                raster_inputs.append(Path(input_file))
+                raster_outputs.append(output_file)
+
+            processed_ifd.add_band_details(str(output_file), band_index, band_type)
+
+        pcp = PinkChartProcessor(
+            raster_inputs,
+            Path(ifd.pink_chart_filename),
+            raster_outputs,
+            pc_output,
+            gdal_config=self.gdal_config,
+        )
+        pcp.process()
 
-            # now that we have a raster version of the pink chart we can add it as a band of data
-            # to the input file details
-            processed_ifd.add_band_details(str(pc_output), 1, BandType.pinkChart)
+        # update the size of the rasters so the correct tiling strategy is calculated later
+        processed_ifd.size_x = pcp.size_x
+        processed_ifd.size_y = pcp.size_y
+        processed_ifd.geotransform = pcp.geotransform
+
+        # now that we have a raster version of the pink chart we can add it as a band of data
+        # to the input file details
+        processed_ifd.add_band_details(str(pc_output), 1, BandType.pinkChart)
+
+        return processed_ifd
+
+    def _get_required_band_types(self, ifd: InputFileDetails) -> List[BandType]:
+        """
+        Gets the band types required by the checks that will be run on the
+        input file, in the order they're passed to the checks
+        """
+        required = set()
+        for check_id, _ in ifd.check_ids_and_params:
+            check_class = get_check(check_id, self.checks)
+            if check_class is None:
+                continue
+            required.update(check_class.band_types)
+        return [band_type for band_type in BandType if band_type in required]
+
+    def _get_required_bands(
+        self, ifd: InputFileDetails
+    ) -> List[Tuple[str, int, BandType]]:
+        """
+        Gets the input band details of the bands required by the checks that
+        will be run on the input file
+        """
+        band_types = self._get_required_band_types(ifd)
+        return [
+            band_details
+            for band_details in ifd.input_band_details
+            if band_details[2] in band_types
+        ]
 
-    def _load_band_tile(
+    def _read_tile_bands(
         self,
-        filename: str | None,
-        band_index: int | None,
-        tile: Tile | None,
-        zeroed_nulls: bool = False,
-    ) -> np.ndarray | None:
-        # function may be called even when the band was not given as input
-        # by the user. In such cases the filename and band index will be
-        # None. It's up to the checks later on to handle being given None
-        # instead of a numpy array
-        if filename is None or band_index is None or tile is None:
-            return None
+        src_ds: gdal.Dataset,
+        band_indexes: List[int],
+        tile: Tile,
+        lease: BufferLease | None = None,
+        read_dtypes: List[np.dtype | None] | None = None,
+    ) -> List[np.ndarray]:
+        """
+        Reads the tile data for a number of bands from the same dataset. Where
+        all bands are read as the same data type they are read with a single
+        call, so GDAL only decodes each block once (for pixel interleaved
+        files), and the returned arrays are views into the one array that was
+        read.
 
-        src_ds = gdal.Open(filename)
-        if src_ds is None:
-            raise RuntimeError(f"Could not open {filename}")
+        Each band is read as its own data type, unless a type is given for it
+        in `read_dtypes`, in which case GDAL converts the data as it's read.
+        If a lease is given the data is read into buffers taken from it,
+        rather than new arrays.
+        """
+        bands = [src_ds.GetRasterBand(band_index) for band_index in band_indexes]
+        dtypes = []
+        for i, band in enumerate(bands):
+            dtype = None if read_dtypes is None else read_dtypes[i]
+            if dtype is None:
+                dtype = gdal_array.GDALTypeCodeToNumericTypeCode(band.DataType)
+            dtypes.append(np.dtype(dtype))
 
-        src_band = src_ds.GetRasterBand(band_index)
-        band_data = np.array(
-            src_band.ReadAsArray(
-                tile.min_x, tile.min_y, tile.max_x - tile.min_x, tile.max_y - tile.min_y
+        def get_buffer(shape: Tuple[int, ...], dtype: np.dtype) -> np.ndarray:
+            if lease is not None:
+                return lease.acquire(shape, dtype)
+            return np.empty(shape, dtype=dtype)
+
+        if len(bands) > 1 and len(set(dtypes)) == 1:
+            buf_obj = get_buffer((len(bands), tile.height, tile.width), dtypes[0])
+            data = src_ds.ReadAsArray(
+                tile.min_x,
+                tile.min_y,
+                tile.width,
+                tile.height,
+                buf_obj=buf_obj,
+                band_list=band_indexes,
             )
-        )
+            self.stats.count("bytes_read", data.nbytes)
+            return [data[i] for i in range(len(band_indexes))]
+
+        band_datas = []
+        for band, dtype in zip(bands, dtypes):
+            buf_obj = get_buffer((tile.height, tile.width), dtype)
+            band_datas.append(
+                band.ReadAsArray(
+                    tile.min_x, tile.min_y, tile.width, tile.height, buf_obj=buf_obj
+                )
+            )
+        self.stats.count("bytes_read", sum(data.nbytes for data in band_datas))
+        return band_datas
 
+    def _get_valid_mask(
+        self,
+        band: gdal.Band,
+        band_data: np.ndarray,
+        tile: Tile,
+        zeroed_nulls: bool = False,
+        lease: BufferLease | None = None,
+    ) -> np.ndarray | None:
+        """
+        Gets a boolean mask of the pixels of the band data that are valid
+        (not nodata). Returns None if all pixels are valid.
+        """
         # we need to mask the nodata values otherwise whatever value is used
         # for nodata will appear in the results
         # zeroed_nulls was included to specifically resolve the issue documented at
         # https://github.com/ausseabed/finder-grid-checks/issues/2
-        nodata = src_band.GetNoDataValue()
+        valid = None
+        if lease is not None:
+            valid = lease.acquire(band_data.shape, bool)
+
+        nodata: float | None = band.GetNoDataValue()
         if nodata is None:
-            # TODO; this should return a masked array like the other two cases
-            return band_data
+            if band.GetMaskFlags() & gdal.GMF_ALL_VALID:
+                return None
+            # the band has an explicit mask (eg; an alpha band, or an
+            # internal mask)
+            mask_band = band.GetMaskBand()
+            if mask_band is None:
+                raise RuntimeError(f"Could not get the mask band for {tile}")
+            mask_buffer = None
+            if lease is not None:
+                mask_buffer = lease.acquire(band_data.shape, np.uint8)
+            mask_data = mask_band.ReadAsArray(
+                tile.min_x, tile.min_y, tile.width, tile.height, buf_obj=mask_buffer
+            )
+            if mask_data is None:
+                raise RuntimeError(f"Could not read the mask band for {tile}")
+            self.stats.count("bytes_read", mask_data.nbytes)
+            valid = np.not_equal(mask_data, 0, out=valid)
         elif np.isnan(nodata):
             # we need a special case for when NaN is used as nodata because NaN != NaN
-            mask = np.isnan(band_data)
-            if zeroed_nulls:
-                band_data[mask] = 0
-            masked_band_data = ma.masked_where(mask, band_data)
-            return masked_band_data
+            valid = np.isnan(band_data, out=valid)
+            np.logical_not(valid, out=valid)
         else:
-            mask = band_data == nodata
-            if zeroed_nulls:
-                band_data[mask] = 0
-            masked_band_data = ma.masked_where(mask, band_data)
-            return masked_band_data
+            valid = np.not_equal(band_data, nodata, out=valid)
+
+        if zeroed_nulls:
+            np.copyto(band_data, 0, where=~valid)
+        return valid
 
-    def _load_data(self, ifd: InputFileDetails, tile: Tile):
+    def _is_tile_empty(self, ifd: InputFileDetails, tile: Tile) -> bool:
         """
-        Loads the 3 input bands for the given tile
+        Checks if the tile contains only nodata, without reading the data
+        bands. A tile is empty if GDAL reports that none of the blocks in the
+        tile have been written (sparse GeoTIFFs), or if the pink chart
+        (coverage area) does not cover any of the tile as the data bands are
+        set to nodata outside of the pink chart during preprocessing.
         """
-        depth_file, depth_band_idx = ifd.get_band(BandType.depth)
-        density_file, density_band_idx = ifd.get_band(BandType.density)
-        uncertainty_file, uncertainty_band_idx = ifd.get_band(BandType.uncertainty)
+        all_bands_empty = True
+        for filename, band_index, band_type in self._get_required_bands(ifd):
+            if band_type == BandType.pinkChart:
+                continue
+            band = self._datasets.open(filename).GetRasterBand(band_index)
+            if band.GetNoDataValue() is None:
+                # unwritten blocks would be read as zeros, which are not nodata
+                all_bands_empty = False
+                break
+            flags, _ = band.GetDataCoverageStatus(
+                tile.min_x, tile.min_y, tile.width, tile.height
+            )
+            if not (flags & gdal.GDAL_DATA_COVERAGE_STATUS_EMPTY) or (
+                flags & gdal.GDAL_DATA_COVERAGE_STATUS_DATA
+            ):
+                all_bands_empty = False
+                break
+        if all_bands_empty:
+            return True
+
         pinkchart_file, pinkchart_band_idx = ifd.get_band(BandType.pinkChart)
+        if pinkchart_file is None or pinkchart_band_idx is None:
+            return False
+        pinkchart_band = self._datasets.open(pinkchart_file).GetRasterBand(
+            pinkchart_band_idx
+        )
+        return not self._is_covered(pinkchart_band, tile)
 
-        depth_data = self._load_band_tile(depth_file, depth_band_idx, tile)
-        # makes sense for density to have null data of any value converted to zero
-        density_data = self._load_band_tile(density_file, density_band_idx, tile, True)
-        uncertainty_data = self._load_band_tile(
-            uncertainty_file, uncertainty_band_idx, tile
+    def _is_covered(self, pinkchart_band: gdal.Band, tile: Tile) -> bool:
+        """
+        Checks if any pixel of the tile is covered by the pink chart. The
+        pink chart is read a number of rows at a time (no more than
+        `PINKCHART_SCAN_PIXELS`), stopping at the first rows that are
+        covered, so the memory used is small compared to the tile and isn't
+        included in the memory estimate of a tile.
+        """
+        flags, _ = pinkchart_band.GetDataCoverageStatus(
+            tile.min_x, tile.min_y, tile.width, tile.height
         )
-        pinkchart_data = self._load_band_tile(pinkchart_file, pinkchart_band_idx, tile)
+        if (flags & gdal.GDAL_DATA_COVERAGE_STATUS_EMPTY) and not (
+            flags & gdal.GDAL_DATA_COVERAGE_STATUS_DATA
+        ):
+            # none of the blocks have been written, so are all zeros
+            return False
+
+        _, block_y = pinkchart_band.GetBlockSize()
+        rows = max(1, PINKCHART_SCAN_PIXELS // max(1, tile.width))
+        if rows > block_y:
+            # whole blocks are read at a time
+            rows -= rows % block_y
+        buffer = np.empty((min(rows, tile.height), tile.width), dtype=np.uint8)
+        for y in range(tile.min_y, tile.max_y, rows):
+            height = min(rows, tile.max_y - y)
+            chunk = pinkchart_band.ReadAsArray(
+                tile.min_x, y, tile.width, height, buf_obj=buffer[:height]
+            )
+            self.stats.count("bytes_read", chunk.nbytes)
+            if chunk.any():
+                return True
+        return False
+
+    def _empty_data(self, ifd: InputFileDetails):
+        """
+        Gets data for an empty tile. Checks treat these zero sized arrays in
+        the same way as a tile containing only nodata, and bands that were
+        not provided (or are not required) are still None. No validity masks
+        are needed for the zero sized arrays.
+        """
+        required_band_types = self._get_required_band_types(ifd)
+        empty_data: List[Any] = []
+        for band_type in [
+            BandType.depth,
+            BandType.density,
+            BandType.uncertainty,
+            BandType.pinkChart,
+        ]:
+            filename, band_index = ifd.get_band(band_type)
+            if (
+                filename is None
+                or band_index is None
+                or band_type not in required_band_types
+            ):
+                empty_data.append(None)
+                continue
+            if band_type == BandType.density:
+                dtype = DENSITY_DTYPES[0]
+            else:
+                band = self._datasets.open(filename).GetRasterBand(band_index)
+                dtype = gdal_array.GDALTypeCodeToNumericTypeCode(band.DataType)
+            empty_data.append(np.empty((0, 0), dtype=dtype))
+        empty_data.append({})
+        return tuple(empty_data)
+
+    def _load_data(
+        self, ifd: InputFileDetails, tile: Tile, lease: BufferLease | None = None
+    ):
+        """
+        Loads the input bands required by the checks for the given tile.
+        Bands that are stored in the same file are read together. If a lease
+        is given the bands are read into its buffers, so the data must not be
+        used once the lease is released.
+
+        The bands are returned as plain arrays, along with a dict of the
+        masks of their valid (not nodata) pixels. Bands where all pixels are
+        valid are not included in the dict.
+        """
+        if self.skip_empty_tiles and self._is_tile_empty(ifd, tile):
+            logger.debug(f"Skipping empty tile {tile}")
+            return self._empty_data(ifd)
+
+        # function may be called even when a band was not given as input
+        # by the user. In such cases None is returned in place of the
+        # band data. It's up to the checks later on to handle being given None
+        # instead of a numpy array. Bands that are not required by any of the
+        # checks are not read, and are also None.
+        band_types = self._get_required_band_types(ifd)
+
+        # group the bands that need to be read by the file they're stored in
+        file_bands: Dict[str, List[Tuple[BandType, int]]] = {}
+        for band_type in band_types:
+            filename, band_index = ifd.get_band(band_type)
+            if filename is None or band_index is None:
+                continue
+            file_bands.setdefault(filename, []).append((band_type, band_index))
+
+        loaded: Dict[BandType, np.ndarray] = {}
+        valid: Dict[BandType, np.ndarray] = {}
+        for filename, bands in file_bands.items():
+            src_ds = self._datasets.open(filename)
+            band_indexes = [band_index for _, band_index in bands]
+            # density bands of unsigned integer types are converted by GDAL
+            # as they are read, all other bands are read as they are stored
+            read_dtypes = [
+                (
+                    _get_density_read_dtype(src_ds.GetRasterBand(band_index).DataType)
+                    if band_type == BandType.density
+                    else None
+                )
+                for band_type, band_index in bands
+            ]
+            band_datas = self._read_tile_bands(
+                src_ds, band_indexes, tile, lease, read_dtypes
+            )
+            for (band_type, band_index), band_data in zip(bands, band_datas):
+                loaded[band_type] = band_data
+                # makes sense for density to have null data of any value
+                # converted to zero
+                band_valid = self._get_valid_mask(
+                    src_ds.GetRasterBand(band_index),
+                    band_data,
+                    tile,
+                    zeroed_nulls=band_type == BandType.density,
+                    lease=lease,
+                )
+                if band_valid is not None:
+                    valid[band_type] = band_valid
 
-        if density_data is not None:
-            density_data = density_data.astype(int)
+        depth_data = loaded.get(BandType.depth)
+        density_data = loaded.get(BandType.density)
+        uncertainty_data = loaded.get(BandType.uncertainty)
+        pinkchart_data = loaded.get(BandType.pinkChart)
 
-        return (depth_data, density_data, uncertainty_data, pinkchart_data)
+        if density_data is not None and density_data.dtype not in DENSITY_DTYPES:
+            # the nulls have been zeroed, so the density can now be converted
+            # to the smallest type that holds its values. Fractional values
+            # are truncated.
+            dtype = _get_density_dtype(density_data)
+            if lease is not None:
+                converted = lease.acquire(density_data.shape, dtype)
+                np.copyto(converted, density_data, casting="unsafe")
+                density_data = converted
+            else:
+                density_data = density_data.astype(dtype)
+
+        return (depth_data, density_data, uncertainty_data, pinkchart_data, valid)
 
     def _get_output_file_location(
         self, ifd: InputFileDetails, check: GridCheck
@@ -196,11 +793,15 @@ class Executor:
         density_data,
         uncertainty_data,
         pinkchart_data,
+        valid: Dict[BandType, np.ndarray],
+        *,
         is_stopped=None,
-    ):
+    ) -> List[Tuple[str, GridCheck]]:
         """
         Runs each of the checks assigned to each file (via the
-        InputFileDetails) on the loaded data arrays
+        InputFileDetails) on the loaded data arrays, and the masks of their
+        valid pixels. Returns the check instances run over this tile along
+        with their check ids.
         """
         # total number of check that will be run. Not all of them included in
         # the ifd.check_ids_and_params list will be run here as the checks
@@ -213,10 +814,11 @@ class Executor:
                 continue
             total_check_count += 1
 
+        tile_checks: List[Tuple[str, GridCheck]] = []
         count = 0
         for check_id, check_params in ifd.check_ids_and_params:
             if is_stopped is not None and is_stopped():
-                return
+                return tile_checks
 
             check_class = get_check(check_id, self.checks)
             if check_class is None:
@@ -228,17 +830,21 @@ class Executor:
             check.spatial_export = self.spatial_export
             check.spatial_export_location = self._get_output_file_location(ifd, check)
             check.spatial_qajson = self.spatial_qajson
+            check.defer_exports = self._defer_exports
+            check.stats = self.stats
 
             check.check_started()
             try:
-                check.run(
-                    ifd,
-                    tile,
-                    depth_data,
-                    density_data,
-                    uncertainty_data,
-                    pinkchart_data,
-                )
+                with check._stage("run", tile):
+                    check.run(
+                        ifd,
+                        tile,
+                        depth_data,
+                        density_data,
+                        uncertainty_data,
+                        pinkchart_data,
+                        valid=valid,
+                    )
                 check.check_ended()
             except Exception as e:
                 check.execution_status = "failed"
@@ -247,33 +853,264 @@ class Executor:
                 logger = logging.getLogger(__name__)
                 logger.error(e, exc_info=True)
 
-            # if this check has already been run on a different tile we need
-            # to merge the results together. Then when all tiles have been run
-            # we'll have a single entry for each check in `check_result_cache`
-            # that is the result of all tiles merged
-            src_ifd = ifd
-            if src_ifd.source is not None:
-                # make sure we're using the actual source input file details and
-                # not a clone. If we use the clone the qajson won't be updated
-                # correctly
-                src_ifd = src_ifd.source
-
-            if (src_ifd, check_id) in self.check_result_cache:
-                last_check = self.check_result_cache[(src_ifd, check_id)]
-                check.merge_results(last_check)
-            self.check_result_cache[(src_ifd, check_id)] = check
+            tile_checks.append((check_id, check))
 
             count += 1
             self.__update_tile_progress(0.2 + count / total_check_count * 0.8)
 
+        return tile_checks
+
+    def _merge_checks(
+        self, ifd: InputFileDetails, tile_checks: List[Tuple[str, GridCheck]]
+    ) -> None:
+        """
+        Merges the checks run over a single tile into the `check_result_cache`.
+        Tiles must be merged in the same order they were planned so that the
+        merged results do not depend on how the tiles were executed.
+        """
+        # if this check has already been run on a different tile we need
+        # to merge the results together. Then when all tiles have been run
+        # we'll have a single entry for each check in `check_result_cache`
+        # that is the result of all tiles merged
+        src_ifd = ifd
+        if src_ifd.source is not None:
+            # make sure we're using the actual source input file details and
+            # not a clone. If we use the clone the qajson won't be updated
+            # correctly
+            src_ifd = src_ifd.source
+
+        with self.stats.stage("merge"):
+            for check_id, check in tile_checks:
+                merged_check = self.check_result_cache.get((src_ifd, check_id))
+                if merged_check is None:
+                    # the check run over the first tile accumulates the
+                    # results of all following tiles
+                    self.check_result_cache[(src_ifd, check_id)] = check
+                else:
+                    merged_check.combine(check)
+
+    def _complete_tile(
+        self,
+        file_index: int,
+        ifd: InputFileDetails,
+        tile: Tile,
+        tile_checks: List[Tuple[str, GridCheck]],
+        bytes_read: int,
+    ) -> None:
+        """
+        Merges the checks run over a tile, and records that the tile has been
+        completed. Called for each tile in the order the tiles were planned.
+        """
+        src_ifd = ifd if ifd.source is None else ifd.source
+        record = None
+        if self._tile_callback is not None or self.cost_history_file is not None:
+            # the summaries are taken before merging, as the checks of the
+            # first tile accumulate the results of the following tiles
+            record = TileRecord(
+                src_ifd,
+                tile,
+                {check_id: check.get_summary() for check_id, check in tile_checks},
+            )
+        self._merge_checks(ifd, tile_checks)
+        self._progress.tile_done(tile.core_pixel_count, bytes_read)
+        self._completed_tile_counts[file_index] += 1
+        self._checkpoint_pending = True
+        if self.cost_history_file is not None:
+            assert record is not None
+            self._record_tile_cost(ifd, tile, record)
+        if self._tile_callback is not None:
+            assert record is not None
+            merged_checks = [
+                (check_id, self.check_result_cache[(src_ifd, check_id)])
+                for check_id, _ in tile_checks
+            ]
+            self._tile_callback(TileResult(src_ifd, tile, merged_checks, record))
+
+    def _get_cost_history(self) -> CostHistory:
+        """Gets the tile cost history, loading it when first used"""
+        if self._cost_history is None:
+            if self.cost_history_file is None:
+                self._cost_history = CostHistory()
+            else:
+                self._cost_history = CostHistory.load(self.cost_history_file)
+        return self._cost_history
+
+    def _record_tile_cost(
+        self, ifd: InputFileDetails, tile: Tile, record: TileRecord
+    ) -> None:
+        """
+        Records the fraction of valid and failed pixels of a completed tile
+        in the cost history. The fractions of the check that counted the
+        most pixels are used.
+        """
+        pixel_count = max(1, tile.core_pixel_count)
+        total_cell_count = 0
+        failed_cell_count = 0
+        for summary in record.checks.values():
+            total_cell_count = max(total_cell_count, summary.total_cell_count)
+            failed_cell_count = max(failed_cell_count, summary.failed_cell_count)
+        self._get_cost_history().record(
+            _get_input_key(ifd),
+            tile,
+            total_cell_count / pixel_count,
+            failed_cell_count / pixel_count,
+        )
+
+    def _probe_tile(
+        self, ifd: InputFileDetails, tile: Tile
+    ) -> Tuple[float, float | None]:
+        """
+        Estimates the fraction of valid pixels of a tile, and the fraction of
+        pixels that fail the checks, without reading the tile. The valid
+        fraction is the data coverage reported by GDAL (only known for
+        sparse files). If the bands have overviews the checks are run over a
+        decimated read of the tile, which GDAL takes from the overviews, to
+        give the failed fraction. Otherwise None is returned for the failed
+        fraction, as a decimated read would decode all blocks of the tile.
+        The fractions are of the core of the tile, as are its results.
+        """
+        core = tile.core
+        bands = []
+        for band_type in self._get_required_band_types(ifd):
+            filename, band_index = ifd.get_band(band_type)
+            if filename is None or band_index is None:
+                continue
+            src_ds = self._datasets.open(filename)
+            bands.append((band_type, src_ds.GetRasterBand(band_index)))
+        if len(bands) == 0:
+            return 0.0, None
+
+        valid_fraction = 1.0
+        for _, band in bands:
+            _, data_percent = band.GetDataCoverageStatus(
+                core.min_x, core.min_y, core.width, core.height
+            )
+            valid_fraction = min(valid_fraction, data_percent / 100.0)
+        if valid_fraction <= 0:
+            return 0.0, 0.0
+        if any(band.GetOverviewCount() == 0 for _, band in bands):
+            return valid_fraction, None
+
+        probe_x = min(core.width, PROBE_SIZE)
+        probe_y = min(core.height, PROBE_SIZE)
+        loaded: Dict[BandType, np.ndarray] = {}
+        valid: Dict[BandType, np.ndarray] = {}
+        for band_type, band in bands:
+            band_data = band.ReadAsArray(
+                core.min_x,
+                core.min_y,
+                core.width,
+                core.height,
+                buf_xsize=probe_x,
+                buf_ysize=probe_y,
+            )
+            nodata = band.GetNoDataValue()
+            if nodata is not None:
+                if np.isnan(nodata):
+                    valid[band_type] = ~np.isnan(band_data)
+                else:
+                    valid[band_type] = band_data != nodata
+                if band_type == BandType.density:
+                    band_data = np.where(valid[band_type], band_data, 0)
+            loaded[band_type] = band_data
+
+        # the checks are run without spatial outputs, only their counts of
+        # valid and failed pixels are used
+        probe_tile = Tile(0, 0, probe_x, probe_y)
+        pixel_count = probe_x * probe_y
+        valid_fraction = 0.0
+        failed_fraction = 0.0
+        for check_id, check_params in ifd.check_ids_and_params:
+            check_class = get_check(check_id, self.checks)
+            if check_class is None:
+                continue
+            check = check_class(check_params)
+            try:
+                check.run(
+                    ifd,
+                    probe_tile,
+                    loaded.get(BandType.depth),
+                    loaded.get(BandType.density),
+                    loaded.get(BandType.uncertainty),
+                    loaded.get(BandType.pinkChart),
+                    valid=valid,
+                )
+            except Exception as e:
+                # the probe is only an estimate, errors are reported when the
+                # tile is processed
+                logger.debug(f"Probe of tile {tile} failed: {e}")
+                continue
+            summary = check.get_summary()
+            valid_fraction = max(valid_fraction, summary.total_cell_count / pixel_count)
+            failed_fraction = max(
+                failed_fraction, summary.failed_cell_count / pixel_count
+            )
+        return valid_fraction, failed_fraction
+
+    def _estimate_tile_costs(
+        self, ifd: InputFileDetails, tiles: List[Tile]
+    ) -> List[float]:
+        """
+        Estimates the relative cost of processing each tile. The fractions
+        of valid and failed pixels recorded by past runs are used where
+        available, otherwise the tile is probed.
+        """
+        history = self._get_cost_history()
+        input_key = _get_input_key(ifd)
+        spatial = self.spatial_export or self.spatial_export_location is not None
+        costs = []
+        for tile in tiles:
+            signals: Tuple[float, float | None] | None = history.get(input_key, tile)
+            if signals is None:
+                signals = self._probe_tile(ifd, tile)
+            valid_fraction, failed_fraction = signals
+            costs.append(
+                estimate_tile_cost(tile, valid_fraction, failed_fraction, spatial)
+            )
+        return costs
+
+    def _schedule_tiles(self, ifd: InputFileDetails, tiles: List[Tile]) -> List[int]:
+        """
+        Gets the order the tiles are to be handed out to the workers in, as
+        indexes into `tiles`
+        """
+        if self.tile_schedule != "cost" or len(tiles) <= 1:
+            return list(range(len(tiles)))
+        with self.stats.stage("schedule_tiles"):
+            schedule = get_schedule(self._estimate_tile_costs(ifd, tiles))
+        return schedule
+
+    def _process_tile(
+        self, ifd: InputFileDetails, tile: Tile, is_stopped=None
+    ) -> List[Tuple[str, GridCheck]]:
+        """
+        Loads the data for a single tile and runs all checks over it. The
+        results are returned without being merged into the `check_result_cache`
+        as this function is also run within worker processes.
+        """
+        self.__update_tile_progress(0)
+
+        lease = self._buffers.lease()
+        try:
+            with self.stats.stage("load_data", tile):
+                data = self._load_data(ifd, tile, lease)
+
+            self.__update_tile_progress(0.2)
+
+            return self._run_checks(ifd, tile, *data, is_stopped=is_stopped)
+        finally:
+            # the checks don't keep any references to the data, so the
+            # buffers can be reused by the next tile
+            lease.release()
+
     def __update_progress(self, progress):
-        """Calls the progress callback directly. Passing a value of 1.0
+        """Calls the progress callbacks directly. Passing a value of 1.0
         to this function will set the progress bar to 100%
         """
-        if self._progress_callback is None:
-            return
-        else:
+        if self._progress_callback is not None:
             self._progress_callback(progress)
+        if self._progress_info_callback is not None:
+            self._progress_info_callback(self._progress.get_info(progress))
 
     def __update_tile_progress(self, progress):
         """Recalculates the progress so that it's between the `self._tile_start_progress`
@@ -281,99 +1118,969 @@ class Executor:
         to be the progress of processing a single tile. eg; progress of 1.0 means that tile
         has been completed (not all tiles)
         """
-        if self._progress_callback is None:
+        if self._progress_callback is None and self._progress_info_callback is None:
             return
         else:
             delta_prog = self._tile_end_progress - self._tile_start_progress
             adjusted_prog = delta_prog * progress + self._tile_start_progress
-            self._progress_callback(adjusted_prog)
+            self.__update_progress(adjusted_prog)
+
+    def _set_tile_progress_range(self, tile: Tile) -> None:
+        """
+        Sets the range of progress values covered by processing the tile. The
+        range is proportional to the number of pixels in the tile, so tiles
+        cut short by the edge of the raster are given less of the progress.
+        """
+        pixels_total = max(1, self._progress.pixels_total)
+        pixels_done = self._progress.pixels_done
+        self._tile_start_progress = 0.05 + pixels_done / pixels_total * 0.95
+        self._tile_end_progress = (
+            0.05 + (pixels_done + tile.core_pixel_count) / pixels_total * 0.95
+        )
+
+    def _get_bytes_read(self) -> int:
+        return self.stats.counters.get("bytes_read", 0)
+
+    def run(
+        self,
+        progress_callback=None,
+        qajson_update_callback=None,
+        is_stopped=None,
+        resume: bool = False,
+        progress_info_callback: Callable[[ProgressInfo], None] | None = None,
+        tile_callback: Callable[[TileResult], None] | None = None,
+    ):
+        """
+        Runs all checks over all tiles of the input files. If `resume` is set
+        the merged results saved in `checkpoint_dir` by a previous run are
+        loaded and only the remaining tiles are processed. A CheckpointError
+        is raised if the inputs or parameters have changed since the
+        checkpoint was saved.
+
+        The `progress_callback` is called with the progress as a float
+        between 0 and 1. The `progress_info_callback` is called at the same
+        times with a ProgressInfo that includes the tiles completed, the
+        throughput, and the estimated time remaining. The `tile_callback` is
+        called with a TileResult as each tile is completed.
+
+        The GDAL settings of `gdal_config` are applied for the duration of
+        the run.
+        """
+        if resume and self.checkpoint_dir is None:
+            raise CheckpointError("A checkpoint directory is required to resume")
+        if self.pipeline_depth > 0 and not self._uses_pipeline():
+            logger.warning(
+                "The pipeline is only used when tiles are processed by this "
+                "process, pipeline_depth is ignored with multiple workers or a "
+                "coordinator"
+            )
+        if self.track_memory and self._uses_pipeline():
+            raise ValueError(
+                "Memory can't be tracked when processing tiles with a pipeline, "
+                "set pipeline_depth to 0 to track memory"
+            )
 
-    def run(self, progress_callback=None, qajson_update_callback=None, is_stopped=None):
         logger.info(f"Processing with tile size {self.tile_size_x},{self.tile_size_y}")
 
         self._progress_callback = progress_callback
-        # preprocess the data
-        # - generate pink chart raster, and clip existing rasters to pink chart
+        self._progress_info_callback = progress_info_callback
+        self._tile_callback = tile_callback
+        self._progress.start()
         self.__update_progress(0)
-        validation_failed = False
-        for input_file_detail in self.input_file_details:
-            passed, messages = input_file_detail.validate()
-            if not passed:
-                validation_failed = True
-                for msg in messages:
-                    logger.error(msg)
-        if validation_failed:
-            raise InputFileDetailsError("Error occured during validation, check logs")
-
-        self.__update_progress(0.025)
-        self._preprocess()
-
-        self.__update_progress(0.05)
 
         # clear out any previously run checks
         self.check_result_cache = {}
+        self._cost_history = None
+        self.stats = RunStats(track_memory=self.track_memory)
+        run_start = time.perf_counter()
+        self.source_input_file_details = list(self.input_file_details)
+        start_tracing = self.track_memory and not tracemalloc.is_tracing()
+        if start_tracing:
+            tracemalloc.start()
+        gdal_config_previous = self.gdal_config.apply()
+
+        try:
+            self._start_checkpoint(resume)
+
+            if self.workers > 1 and self.coordinator is None:
+                # validation, preprocessing, and the tiles of each file are
+                # all run by the process pool
+                self._run_files_parallel(is_stopped)
+                self._stop_checkpoint()
+                return
+
+            # preprocess the data
+            # - generate pink chart raster, and clip existing rasters to pink chart
+            validation_failed = False
+            for input_file_detail in self.input_file_details:
+                with self.stats.stage("validate"):
+                    passed, messages = input_file_detail.validate()
+                if not passed:
+                    validation_failed = True
+                    for msg in messages:
+                        logger.error(msg)
+            if validation_failed:
+                raise InputFileDetailsError(
+                    "Error occured during validation, check logs"
+                )
+
+            self.__update_progress(0.025)
+            self._preprocess()
+
+            self.__update_progress(0.05)
+
+            # collect list of input files, and the list of tiles to be used for
+            # each of these input files
+            files_and_tiles = []
+
+            # build up a list of all files, and the tiles that need to be loaded
+            # and processed for each file
+            for input_file_detail in self.input_file_details:
+                with self.stats.stage("plan_tiles"):
+                    tiles = self._plan_tiles(input_file_detail)
+                files_and_tiles.append((input_file_detail, tiles))
+
+            self._run_tiles(files_and_tiles, is_stopped)
+            self._stop_checkpoint()
+        finally:
+            # all tiles have been read, so release the datasets and buffers
+            self._datasets.close()
+            self._buffers.clear()
+            self._checkpoint = None
+            self.stats.add("run", time.perf_counter() - run_start)
+            self.gdal_config.restore(gdal_config_previous)
+            if self.cost_history_file is not None and self._cost_history is not None:
+                try:
+                    self._cost_history.save(self.cost_history_file)
+                except OSError as e:
+                    logger.warning(f"Failed to save tile cost history: {e}")
+            if start_tracing:
+                tracemalloc.stop()
+
+    async def run_async(
+        self, resume: bool = False, queue_size: int = 100
+    ) -> AsyncIterator[ProgressInfo | TileRecord]:
+        """
+        Runs all checks over all tiles of the input files without blocking
+        the event loop. The run is made on a thread of the event loop's
+        default executor, and the progress (as ProgressInfo) and the results
+        of each tile (as TileRecord) are yielded as the run proceeds. The
+        merged results are in `check_result_cache` once the iterator is
+        exhausted.
+
+        At most `queue_size` events are queued, once full the run waits for
+        the events to be consumed.
+
+        Cancelling the task iterating over the run (or closing the iterator)
+        stops the run. As with `is_stopped` the run stops once the check
+        being run finishes, the iterator waits for this before returning.
+        """
+        loop = asyncio.get_running_loop()
+        events: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        stop_event = threading.Event()
+        end_of_run = object()
+
+        def put_event(event) -> None:
+            # blocks until there's room in the queue, unless stopped
+            future = asyncio.run_coroutine_threadsafe(events.put(event), loop)
+            while True:
+                try:
+                    future.result(timeout=0.5)
+                    return
+                except FutureTimeoutError:
+                    if stop_event.is_set():
+                        future.cancel()
+                        return
+
+        def run() -> None:
+            try:
+                # only the records are passed on, the checks of a TileResult
+                # are still being merged into by this thread
+                self.run(
+                    is_stopped=stop_event.is_set,
+                    resume=resume,
+                    progress_info_callback=put_event,
+                    tile_callback=lambda result: put_event(result.record),
+                )
+            except Exception as e:
+                put_event(e)
+            else:
+                put_event(end_of_run)
+
+        run_future = loop.run_in_executor(None, run)
+        try:
+            while True:
+                event = await events.get()
+                if event is end_of_run:
+                    return
+                if isinstance(event, Exception):
+                    raise event
+                yield event
+        finally:
+            stop_event.set()
+            await run_future
+
+    def iter_results(
+        self, resume: bool = False, queue_size: int = 100
+    ) -> Iterator[TileRecord]:
+        """
+        Runs all checks over all tiles of the input files, yielding a
+        TileRecord with the results of each tile as it is completed. Tiles
+        are yielded in the order they were planned. The merged results are
+        in `check_result_cache` once the iterator is exhausted.
+
+        At most `queue_size` records are queued, once full the run waits for
+        the records to be consumed.
+
+        The run is made on a separate thread. Closing the iterator stops the
+        run, as with `is_stopped` the run stops once the check being run
+        finishes and closing waits for this.
+        """
+        records: queue.Queue = queue.Queue(maxsize=queue_size)
+        stop_event = threading.Event()
+        end_of_run = object()
+
+        def put_record(record) -> None:
+            # blocks until there's room in the queue, unless stopped
+            while not stop_event.is_set():
+                try:
+                    records.put(record, timeout=0.5)
+                    return
+                except queue.Full:
+                    pass
+
+        def run() -> None:
+            try:
+                self.run(
+                    is_stopped=stop_event.is_set,
+                    resume=resume,
+                    tile_callback=lambda result: put_record(result.record),
+                )
+            except Exception as e:
+                put_record(e)
+            else:
+                put_record(end_of_run)
+
+        run_thread = threading.Thread(target=run, name="mbesgc-run")
+        run_thread.start()
+        try:
+            while True:
+                record = records.get()
+                if record is end_of_run:
+                    return
+                if isinstance(record, Exception):
+                    raise record
+                yield record
+        finally:
+            stop_event.set()
+            run_thread.join()
+
+    def _get_checkpoint_settings(self) -> Dict[str, Any]:
+        """
+        Gets the executor settings that change the results of a run, or how
+        the input files are broken into tiles
+        """
+        settings = {
+            "spatial_export": self.spatial_export,
+            "spatial_export_location": self.spatial_export_location,
+            "spatial_qajson": self.spatial_qajson,
+            "tile_size_x": self.tile_size_x,
+            "tile_size_y": self.tile_size_y,
+            "align_tiles": self.align_tiles,
+            "tile_order": self.tile_order,
+            "tile_halo": self.tile_halo,
+            "memory_budget": self.memory_budget,
+        }
+        if self.memory_budget is not None:
+            # the tile size for a memory budget depends on the number of
+            # tiles held in memory at once
+            settings["tiles_in_memory"] = self._get_tiles_in_memory()
+        return settings
+
+    def _start_checkpoint(self, resume: bool) -> None:
+        """
+        Sets up checkpointing of this run, and if resuming restores the merged
+        check results and completed tile counts of the previous run.
+        """
+        assert self.source_input_file_details is not None
+        # number of tiles of each input file that have been merged into the
+        # check results
+        self._completed_tile_counts = [0] * len(self.source_input_file_details)
+        if self.checkpoint_dir is None:
+            return
+
+        fingerprint = get_run_fingerprint(
+            self.source_input_file_details, self._get_checkpoint_settings()
+        )
+        self._checkpoint = RunCheckpoint(self.checkpoint_dir, fingerprint)
+        self._checkpoint_time = time.monotonic()
+        self._checkpoint_pending = False
+        if not resume:
+            return
+
+        checkpoint_state = self._checkpoint.load()
+        if checkpoint_state is None:
+            logger.info(f"No checkpoint found in {self.checkpoint_dir}, starting run")
+            return
+
+        completed_tile_counts, checks = checkpoint_state
+        for ifd_index, check_id, check in checks:
+            src_ifd = self.source_input_file_details[ifd_index]
+            self.check_result_cache[(src_ifd, check_id)] = check
+        self._completed_tile_counts = list(completed_tile_counts)
+        logger.info(f"Resuming run after {sum(completed_tile_counts)} completed tiles")
+
+    def _get_checkpoint_checks(self) -> List[Tuple[int, str, GridCheck]]:
+        """
+        Gets the merged checks to be saved in the checkpoint. The input file
+        details are replaced by their index as they are recreated when the
+        run is resumed.
+        """
+        assert self.source_input_file_details is not None
+        ifd_indexes = {
+            id(ifd): index for index, ifd in enumerate(self.source_input_file_details)
+        }
+        return [
+            (ifd_indexes[id(src_ifd)], check_id, check)
+            for (src_ifd, check_id), check in self.check_result_cache.items()
+        ]
+
+    def _dump_checkpoint(self) -> bytes:
+        assert self._checkpoint is not None
+        self._checkpoint_time = time.monotonic()
+        self._checkpoint_pending = False
+        return self._checkpoint.dumps(
+            list(self._completed_tile_counts), self._get_checkpoint_checks()
+        )
+
+    def _checkpoint_due(self, force: bool = False) -> bool:
+        """
+        Checks if tiles have been merged since the checkpoint was last saved,
+        and `checkpoint_interval` seconds have passed (unless forced)
+        """
+        if self._checkpoint is None or not self._checkpoint_pending:
+            return False
+        if force:
+            return True
+        elapsed = time.monotonic() - self._checkpoint_time
+        return elapsed >= self.checkpoint_interval
+
+    def _save_checkpoint(self) -> None:
+        if self._checkpoint_due():
+            assert self._checkpoint is not None
+            self._checkpoint.write(self._dump_checkpoint())
+
+    def _stop_checkpoint(self) -> None:
+        """
+        Saves the tiles merged since the checkpoint was last saved, and stops
+        saving checkpoints for the rest of the run. Called when the run is
+        stopped (before the checks of a tile that may not have all been run
+        are merged), and once all tiles have been completed.
+        """
+        if self._checkpoint_due(force=True):
+            assert self._checkpoint is not None
+            self._checkpoint.write(self._dump_checkpoint())
+        self._checkpoint = None
+
+    def _get_block_sizes(self, ifd: InputFileDetails) -> List[Tuple[int, int]]:
+        """Gets the block size of each band that will be read for the ifd"""
+        block_sizes = []
+        for filename, band_index, _ in self._get_required_bands(ifd):
+            band = self._datasets.open(filename).GetRasterBand(band_index)
+            block_x, block_y = band.GetBlockSize()
+            block_sizes.append((block_x, block_y))
+        return block_sizes
+
+    def _estimate_bytes_per_pixel(self, ifd: InputFileDetails) -> int:
+        """
+        Estimates the peak memory used per pixel of a tile when processing
+        the given input. This includes the loaded bands (and the masks and
+        copies made while loading them), and the temporary arrays of the most
+        memory hungry check.
+        """
+        bytes_per_pixel = 0
+        for filename, band_index, band_type in self._get_required_bands(ifd):
+            band = self._datasets.open(filename).GetRasterBand(band_index)
+            read_dtype = None
+            if band_type == BandType.density:
+                read_dtype = _get_density_read_dtype(band.DataType)
+            if read_dtype is not None:
+                data_type_size = read_dtype.itemsize
+            else:
+                data_type_size = gdal.GetDataTypeSize(band.DataType) // 8
+            # array read by gdal and its mask
+            bytes_per_pixel += data_type_size + 1
+            if band_type == BandType.density and read_dtype is None:
+                # density is converted to the smallest type that holds the
+                # values of each tile (int64 at most). The buffer arena keeps
+                # a buffer of each type that tiles have been converted to.
+                bytes_per_pixel += sum(dtype.itemsize for dtype in DENSITY_DTYPES)
+                bytes_per_pixel += np.dtype(np.int64).itemsize
+
+        check_bytes_per_pixel = 0
+        for check_id, _ in ifd.check_ids_and_params:
+            check_class = get_check(check_id, self.checks)
+            if check_class is None:
+                continue
+            check_bytes = check_class.bytes_per_pixel
+            if self.spatial_qajson or self.spatial_export:
+                check_bytes += check_class.spatial_bytes_per_pixel
+            check_bytes_per_pixel = max(check_bytes_per_pixel, check_bytes)
+
+        return bytes_per_pixel + check_bytes_per_pixel
+
+    def _uses_pipeline(self) -> bool:
+        """
+        Checks if tiles will be processed by the pipeline, which is only used
+        when tiles are processed by this process
+        """
+        return (
+            self.pipeline_depth > 0 and self.workers <= 1 and self.coordinator is None
+        )
+
+    def _get_tiles_in_memory(self) -> int:
+        """
+        Gets the maximum number of tiles that may be held in memory at once
+        """
+        if self.workers > 1:
+            return self.workers
+        elif self._uses_pipeline():
+            # queued for checking, being read, being checked, and queued
+            # for export. The buffer arena keeps the buffers of the tiles
+            # that have been read but not checked, so the tiles queued for
+            # export (which hold only the arrays of the checks) are counted
+            # in full to include these.
+            return 2 * self.pipeline_depth + 2
+        return 1
 
-        # collect list of input files, and the list of tiles to be used for
-        # each of these input files
-        files_and_tiles = []
-
-        # build up a list of all files, and the tiles that need to be loaded
-        # and processed for each file
-        total_tile_count = 0
-        for input_file_detail in self.input_file_details:
-            tiles = get_tiles(
-                min_x=0,
-                min_y=0,
-                max_x=input_file_detail.size_x,
-                max_y=input_file_detail.size_y,
-                size_x=self.tile_size_x,
-                size_y=self.tile_size_y,
+    def _plan_tiles(self, ifd: InputFileDetails) -> List[Tile]:
+        """
+        Breaks the input file down into the list of tiles that will be
+        processed, in the order they will be processed
+        """
+        tile_size_x = self.tile_size_x
+        tile_size_y = self.tile_size_y
+        if self.memory_budget is not None:
+            bytes_per_tile = self.memory_budget // self._get_tiles_in_memory()
+            max_pixels = bytes_per_tile // max(1, self._estimate_bytes_per_pixel(ifd))
+            tile_size_x, tile_size_y = get_budget_tile_size(
+                tile_size_x, tile_size_y, ifd.size_x, ifd.size_y, max_pixels
+            )
+            if self.tile_halo > 0:
+                # the budget is for the data read, which includes the halo
+                tile_size_x = max(1, tile_size_x - 2 * self.tile_halo)
+                tile_size_y = max(1, tile_size_y - 2 * self.tile_halo)
+            logger.info(
+                f"Tile size for memory budget of {self.memory_budget} bytes is "
+                f"{tile_size_x},{tile_size_y}"
             )
-            total_tile_count += len(tiles)
-            file_and_tile = (input_file_detail, tiles)
-            files_and_tiles.append(file_and_tile)
+        if self.align_tiles:
+            aligned_size = get_aligned_tile_size(
+                tile_size_x,
+                tile_size_y,
+                ifd.size_x,
+                ifd.size_y,
+                self._get_block_sizes(ifd),
+            )
+            if aligned_size != (tile_size_x, tile_size_y):
+                logger.info(
+                    f"Tile size {tile_size_x},{tile_size_y} aligned to raster "
+                    f"blocks is {aligned_size[0]},{aligned_size[1]}"
+                )
+            tile_size_x, tile_size_y = aligned_size
 
-        total_file_and_tile_count = 0
-        for ifd, tiles in files_and_tiles:
-            for _, tile in enumerate(tiles):
-                total_file_and_tile_count += 1
+        tiles = get_tiles(
+            min_x=0,
+            min_y=0,
+            max_x=ifd.size_x,
+            max_y=ifd.size_y,
+            size_x=tile_size_x,
+            size_y=tile_size_y,
+            halo=self.tile_halo,
+        )
+
+        tile_order = self.tile_order
+        if tile_order == "auto":
+            tile_order = get_tile_order(ifd.size_x, self._get_block_sizes(ifd))
+            logger.info(f"Processing tiles in {tile_order} order")
+        return order_tiles(tiles, tile_order)
+
+    def _run_tiles(
+        self,
+        files_and_tiles: List[Tuple[InputFileDetails, List[Tile]]],
+        is_stopped=None,
+    ) -> None:
+        """
+        Processes all the tiles of all input files using either the
+        coordinator, the pipeline, or serially depending on how the executor
+        has been configured. Tiles
+        that have already been processed (by the run being resumed) are
+        skipped.
+        """
+        for (ifd, tiles), completed_count in zip(
+            files_and_tiles, self._completed_tile_counts
+        ):
+            self._progress.add_planned(
+                len(tiles),
+                sum(tile.core_pixel_count for tile in tiles),
+                completed_count,
+                sum(tile.core_pixel_count for tile in tiles[:completed_count]),
+            )
+        self._progress.total_known = True
         self._tile_start_progress = 0.05
 
-        processed_tile_count = 0
+        completed_tile_count = sum(self._completed_tile_counts)
+        if completed_tile_count > 0:
+            files_and_tiles = [
+                (ifd, tiles[completed_count:])
+                for (ifd, tiles), completed_count in zip(
+                    files_and_tiles, self._completed_tile_counts
+                )
+            ]
+            self.__update_progress(0.05 + self._progress.fraction * 0.95)
+
+        if self.coordinator is not None:
+            self._run_tiles_distributed(files_and_tiles, is_stopped)
+        elif self._uses_pipeline():
+            self._run_tiles_pipelined(files_and_tiles, is_stopped)
+        else:
+            self._run_tiles_serial(files_and_tiles, is_stopped)
+
+    def _run_tiles_serial(
+        self,
+        files_and_tiles: List[Tuple[InputFileDetails, List[Tile]]],
+        is_stopped=None,
+    ) -> None:
+        """
+        Processes all tiles in this process, one after another
+        """
         # loop over each input file
-        for ifd, tiles in files_and_tiles:
+        for file_index, (ifd, tiles) in enumerate(files_and_tiles):
+            # the buffers of the previous file may not match the data types
+            # of this file
+            self._buffers.clear()
             # and for each input file loop over the necessary tiles
             # It's much more performant do only load the data for each tile
             # once, and then run all the checks over the loaded tile
             # before moving onto the next
             for _, tile in enumerate(tiles):
                 # we use this to help calculate progress info in the __update_tile_progress function
-                self._tile_start_progress = (
-                    0.05 + processed_tile_count / total_file_and_tile_count * 0.95
-                )
-                self._tile_end_progress = (
-                    0.05 + (processed_tile_count + 1) / total_file_and_tile_count * 0.95
-                )
+                self._set_tile_progress_range(tile)
                 if is_stopped is not None and is_stopped():
                     return
 
-                self.__update_tile_progress(0)
+                bytes_read = self._get_bytes_read()
+                tile_checks = self._process_tile(ifd, tile, is_stopped)
+                bytes_read = self._get_bytes_read() - bytes_read
+                if is_stopped is not None and is_stopped():
+                    # the checks of this tile may not have all been run
+                    self._stop_checkpoint()
+                self._complete_tile(file_index, ifd, tile, tile_checks, bytes_read)
+                self._save_checkpoint()
 
-                depth_data, density_data, uncertainty_data, pinkchart_data = (
-                    self._load_data(ifd, tile)
-                )
+                self.__update_progress(self._tile_end_progress)
 
-                self.__update_tile_progress(0.2)
+    def _get_worker_settings(self) -> Dict[str, Any]:
+        """
+        Gets the settings that are passed to each worker process
+        """
+        return {
+            "spatial_export": self.spatial_export,
+            "spatial_export_location": self.spatial_export_location,
+            "spatial_qajson": self.spatial_qajson,
+            "skip_empty_tiles": self.skip_empty_tiles,
+            # used by the workers to plan the tiles of each input file
+            "tile_size_x": self.tile_size_x,
+            "tile_size_y": self.tile_size_y,
+            "align_tiles": self.align_tiles,
+            "tile_order": self.tile_order,
+            "tile_halo": self.tile_halo,
+            "memory_budget": self.memory_budget,
+            "workers": self.workers,
+            "track_memory": self.track_memory,
+            "gdal_config": self.gdal_config,
+            "tile_schedule": self.tile_schedule,
+            "cost_history_file": self.cost_history_file,
+        }
+
+    def _run_tiles_distributed(
+        self,
+        files_and_tiles: List[Tuple[InputFileDetails, List[Tile]]],
+        is_stopped=None,
+    ) -> None:
+        """
+        Hands out all tiles to the workers connected to the coordinator. Each
+        worker loads the data and runs the checks for a tile, the results are
+        then merged here in the same order as they would be when run
+        serially so the outputs match.
+        """
+        assert self.coordinator is not None
+        logger.info(f"Distributing tiles to workers of {self.coordinator.address}")
+
+        tasks: List[Tuple[int, InputFileDetails, Tile]] = []
+        # order the tasks are handed out in, the tasks of each file are
+        # ordered by the tile schedule
+        schedule: List[int] = []
+        for file_index, (ifd, tiles) in enumerate(files_and_tiles):
+            schedule.extend(
+                len(tasks) + tile_index
+                for tile_index in self._schedule_tiles(ifd, tiles)
+            )
+            for tile in tiles:
+                tasks.append((file_index, ifd, tile))
+
+        self.coordinator.start(
+            {"check_classes": self.checks, "settings": self._get_worker_settings()}
+        )
+        try:
+            # workers take the next task as they finish each one, so idle
+            # workers pick up the remaining tasks rather than waiting
+            for task_id in schedule:
+                _, ifd, tile = tasks[task_id]
+                self.coordinator.put_task(task_id, (ifd, tile))
+
+            # results that have been returned ahead of the tiles before them
+            results: Dict[int, Tuple[List[Tuple[str, GridCheck]], RunStats]] = {}
+            for task_id, (file_index, ifd, tile) in enumerate(tasks):
+                while task_id not in results:
+                    if is_stopped is not None and is_stopped():
+                        return
+                    try:
+                        result_id, result, error = self.coordinator.get_result(
+                            timeout=0.5
+                        )
+                    except queue.Empty:
+                        continue
+                    if result_id < task_id:
+                        # a task that was given to another worker after its
+                        # first worker was lost, and has already been merged
+                        continue
+                    if error is not None:
+                        raise RuntimeError(
+                            f"Processing of tile {tasks[result_id][2]} failed "
+                            f"on worker\n{error}"
+                        )
+                    results[result_id] = result
 
-                self._run_checks(
+                tile_checks, tile_stats = results.pop(task_id)
+                self.stats.merge(tile_stats)
+                self._complete_tile(
+                    file_index,
                     ifd,
                     tile,
-                    depth_data,
-                    density_data,
-                    uncertainty_data,
-                    pinkchart_data,
-                    is_stopped,
+                    tile_checks,
+                    tile_stats.counters.get("bytes_read", 0),
                 )
-                processed_tile_count += 1
+                self._save_checkpoint()
+
+                self.__update_progress(0.05 + self._progress.fraction * 0.95)
+        finally:
+            self.coordinator.stop()
+
+    def _get_files_progress(self, planned_tiles: List[List[Tile] | None]) -> float:
+        """
+        Gets the progress of a run where the input files are processed
+        concurrently. Each file contributes equally to the progress as the
+        number of tiles in the files that have not been prepared is not known.
+        """
+        files_progress = 0.0
+        for tiles, completed_count in zip(planned_tiles, self._completed_tile_counts):
+            if tiles is None:
+                continue
+            files_progress += completed_count / len(tiles) if len(tiles) > 0 else 1.0
+        return 0.05 + files_progress / max(1, len(planned_tiles)) * 0.95
+
+    def _run_files_parallel(self, is_stopped=None) -> None:
+        """
+        Validates, preprocesses, and processes the tiles of all input files
+        using a single pool of `self.workers` processes, so the number of
+        processes is limited regardless of how many input files there are.
+
+        Each input file is prepared (validated, preprocessed, and broken into
+        tiles) by a worker, and its tiles are submitted to the pool as soon as
+        that's done. This overlaps the preparation of later files with the
+        processing of tiles from earlier files. At most `self.workers` files
+        are prepared ahead of the tiles that are being merged.
+
+        The tile results are merged here in the same order as they would be
+        when run serially so the outputs match.
+        """
+        logger.info(f"Processing with {self.workers} worker processes")
+
+        file_count = len(self.input_file_details)
+        # tiles of each file, None until the file has been prepared
+        planned_tiles: List[List[Tile] | None] = [None] * file_count
+        # futures of the tiles of each file that have not been merged
+        tile_futures: List[Deque[Future]] = [deque() for _ in range(file_count)]
+        prepare_futures: Dict[Future, int] = {}
+        next_prepare_index = 0
+        next_merge_index = 0
+
+        self.__update_progress(0.05)
+
+        pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_worker,
+            initargs=(self.checks, self._get_worker_settings()),
+        )
+        try:
+            while next_merge_index < file_count:
+                if is_stopped is not None and is_stopped():
+                    return
+
+                while (
+                    next_prepare_index < file_count
+                    and len(prepare_futures) < self.workers
+                ):
+                    future = pool.submit(
+                        _prepare_input_in_worker,
+                        self.input_file_details[next_prepare_index],
+                        self._completed_tile_counts[next_prepare_index],
+                    )
+                    prepare_futures[future] = next_prepare_index
+                    next_prepare_index += 1
+
+                # wait for a file to be prepared, or for the next tile to be
+                # merged, checking periodically if the user has asked for
+                # processing to stop
+                waiting = list(prepare_futures)
+                if len(tile_futures[next_merge_index]) > 0:
+                    waiting.append(tile_futures[next_merge_index][0])
+                wait(waiting, timeout=0.5, return_when=FIRST_COMPLETED)
+
+                for future in [f for f in prepare_futures if f.done()]:
+                    file_index = prepare_futures.pop(future)
+                    (
+                        passed,
+                        messages,
+                        processed_ifd,
+                        temp_dirs,
+                        tiles,
+                        schedule,
+                        prepare_stats,
+                    ) = future.result()
+                    self.stats.merge(prepare_stats)
+                    self.temp_dirs.extend(temp_dirs)
+                    if not passed:
+                        for msg in messages:
+                            logger.error(msg)
+                        raise InputFileDetailsError(
+                            "Error occured during validation, check logs"
+                        )
+
+                    ifd = self.input_file_details[file_index]
+                    if processed_ifd.source is None:
+                        # no preprocessing was required. The results must be
+                        # stored against this ifd, not the copy made by the
+                        # worker, so the qajson is updated correctly
+                        processed_ifd = ifd
+                    else:
+                        processed_ifd.source = ifd
+                    self.input_file_details[file_index] = processed_ifd
+                    planned_tiles[file_index] = tiles
+
+                    completed_count = self._completed_tile_counts[file_index]
+                    self._progress.add_planned(
+                        len(tiles),
+                        sum(tile.core_pixel_count for tile in tiles),
+                        completed_count,
+                        sum(tile.core_pixel_count for tile in tiles[:completed_count]),
+                    )
+                    self._progress.total_known = all(
+                        tiles is not None for tiles in planned_tiles
+                    )
+                    # tiles are submitted in the order of the schedule, and
+                    # idle workers take the next tile submitted. The futures
+                    # are kept in the planned order they're merged in.
+                    remaining_tiles = tiles[completed_count:]
+                    scheduled: List[Future | None] = [None] * len(remaining_tiles)
+                    for tile_index in schedule:
+                        scheduled[tile_index] = pool.submit(
+                            _process_tile_in_worker,
+                            processed_ifd,
+                            remaining_tiles[tile_index],
+                        )
+                    for tile_future in scheduled:
+                        assert tile_future is not None
+                        tile_futures[file_index].append(tile_future)
+
+                # merge the tiles that have completed, in order
+                while (
+                    next_merge_index < file_count
+                    and planned_tiles[next_merge_index] is not None
+                ):
+                    futures = tile_futures[next_merge_index]
+                    merge_tiles = planned_tiles[next_merge_index]
+                    assert merge_tiles is not None
+                    while len(futures) > 0 and futures[0].done():
+                        ifd = self.input_file_details[next_merge_index]
+                        tile_checks, tile_stats = futures.popleft().result()
+                        self.stats.merge(tile_stats)
+                        self._complete_tile(
+                            next_merge_index,
+                            ifd,
+                            merge_tiles[self._completed_tile_counts[next_merge_index]],
+                            tile_checks,
+                            tile_stats.counters.get("bytes_read", 0),
+                        )
+                        self._save_checkpoint()
+                        self.__update_progress(self._get_files_progress(planned_tiles))
+                    if len(futures) > 0:
+                        break
+                    next_merge_index += 1
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def _run_tiles_pipelined(
+        self,
+        files_and_tiles: List[Tuple[InputFileDetails, List[Tile]]],
+        is_stopped=None,
+    ) -> None:
+        """
+        Processes all tiles as a three stage pipeline. A reader thread loads
+        the data for upcoming tiles, the checks are run over each tile on
+        this thread, and an exporter thread writes the spatial outputs. The
+        stages are connected by queues holding at most `self.pipeline_depth`
+        tiles, so the reader is blocked rather than loading more tiles into
+        memory than this.
+        """
+        logger.info(f"Processing tiles with pipeline depth {self.pipeline_depth}")
+
+        # used to mark the end of the tiles in each of the queues
+        end_of_tiles = object()
+        stop_event = threading.Event()
+        read_queue: queue.Queue = queue.Queue(maxsize=self.pipeline_depth)
+        export_queue: queue.Queue = queue.Queue(maxsize=self.pipeline_depth)
+        # errors raised by the spatial export of a check, these are applied to
+        # the merged check results once the exporter has finished. Checkpoints
+        # are also written by the exporter (with a key of None) so that they
+        # are only saved once the exports of all tiles they include are done.
+        export_errors: Dict[Tuple[InputFileDetails, str], Exception] = {}
+
+        def put(q: queue.Queue, item) -> bool:
+            # blocks until there's room in the queue, unless stopped
+            while not stop_event.is_set():
+                try:
+                    q.put(item, timeout=0.5)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def reader():
+            try:
+                for file_index, (ifd, tiles) in enumerate(files_and_tiles):
+                    # the buffers of the previous file may not match the
+                    # data types of this file
+                    self._buffers.clear()
+                    for tile in tiles:
+                        # only this thread reads data, so the bytes read
+                        # since the last tile are those read for this tile
+                        bytes_read = self._get_bytes_read()
+                        lease = self._buffers.lease()
+                        with self.stats.stage("load_data", tile):
+                            data = self._load_data(ifd, tile, lease)
+                        bytes_read = self._get_bytes_read() - bytes_read
+                        item = (file_index, ifd, tile, data, lease, bytes_read)
+                        if not put(read_queue, item):
+                            lease.release()
+                            return
+            except Exception as e:
+                put(read_queue, e)
+                return
+            put(read_queue, end_of_tiles)
+
+        def exporter():
+            while True:
+                item = export_queue.get()
+                if item is end_of_tiles:
+                    return
+                key, exports = item
+                for export in exports:
+                    try:
+                        export()
+                    except Exception as e:
+                        logger.error(e, exc_info=True)
+                        if key is not None:
+                            export_errors[key] = e
+
+        def queue_checkpoint(force: bool = False) -> None:
+            # the merged results are captured now, but written once the
+            # exporter has finished with the tiles before this
+            if not self._checkpoint_due(force):
+                return
+            assert self._checkpoint is not None
+            checkpoint_data = self._dump_checkpoint()
+            write = functools.partial(self._checkpoint.write, checkpoint_data)
+            put(export_queue, (None, [write]))
+
+        reader_thread = threading.Thread(target=reader, name="mbesgc-reader")
+        exporter_thread = threading.Thread(target=exporter, name="mbesgc-exporter")
+        reader_thread.start()
+        exporter_thread.start()
+
+        self._defer_exports = True
+        try:
+            while True:
+                if is_stopped is not None and is_stopped():
+                    return
+
+                try:
+                    item = read_queue.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+                if item is end_of_tiles:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+
+                file_index, ifd, tile, data, lease, bytes_read = item
+                self._set_tile_progress_range(tile)
+                self.__update_tile_progress(0.2)
+
+                try:
+                    tile_checks = self._run_checks(
+                        ifd, tile, *data, is_stopped=is_stopped
+                    )
+                finally:
+                    # the queued exports only hold arrays derived from the
+                    # tile data, so its buffers can be reused by the reader
+                    data = None
+                    item = None
+                    lease.release()
+                if is_stopped is not None and is_stopped():
+                    # the checks of this tile may not have all been run
+                    queue_checkpoint(force=True)
+                    self._checkpoint = None
+
+                src_ifd = ifd if ifd.source is None else ifd.source
+                for check_id, check in tile_checks:
+                    if len(check.pending_exports) == 0:
+                        continue
+                    exports = check.pending_exports
+                    check.pending_exports = []
+                    # blocks if the exporter has fallen behind
+                    put(export_queue, ((src_ifd, check_id), exports))
+
+                self._complete_tile(file_index, ifd, tile, tile_checks, bytes_read)
+                queue_checkpoint()
 
                 self.__update_progress(self._tile_end_progress)
+        finally:
+            self._defer_exports = False
+            stop_event.set()
+            # the exporter always finishes writing the exports it's been given
+            export_queue.put(end_of_tiles)
+            reader_thread.join()
+            exporter_thread.join()
+            # return the buffers of the tiles read but not checked
+            while not read_queue.empty():
+                item = read_queue.get_nowait()
+                if isinstance(item, tuple):
+                    item[4].release()
+
+            for key, e in export_errors.items():
+                if key in self.check_result_cache:
+                    check = self.check_result_cache[key]
+                    check.execution_status = "failed"
+                    check.error_message = str(e)
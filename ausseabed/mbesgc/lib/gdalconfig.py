@@ -0,0 +1,106 @@
+"""
+GDAL settings that affect the performance of reading, writing, and warping
+rasters
+"""
+
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator
+
+from osgeo import gdal
+
+
+class GdalConfig:
+    """
+    GDAL performance settings for a run. Settings that are None are left as
+    they are, so GDAL's defaults (or the values set in the environment) are
+    used.
+
+    GDAL's configuration is process wide, so the settings are applied for
+    the duration of a run with `applied` and the previous values restored
+    afterwards. While applied they also affect anything else in the process
+    that uses GDAL.
+    """
+
+    def __init__(
+        self,
+        cache_max: int | None = None,
+        num_threads: int | str | None = None,
+        vsi_cache: bool | None = None,
+        vsi_cache_size: int | None = None,
+        warp_memory: int | None = None,
+    ):
+        # size of the block cache in bytes (GDAL_CACHEMAX)
+        self.cache_max = cache_max
+        # number of threads used to decompress blocks, and to warp rasters.
+        # May be `ALL_CPUS` (GDAL_NUM_THREADS)
+        self.num_threads = num_threads
+        # cache reads of the underlying files, and the size of this cache in
+        # bytes (VSI_CACHE, VSI_CACHE_SIZE)
+        self.vsi_cache = vsi_cache
+        self.vsi_cache_size = vsi_cache_size
+        # memory in bytes used by warp operations
+        self.warp_memory = warp_memory
+
+    def get_config_options(self) -> Dict[str, str]:
+        """
+        Gets the GDAL config options set by these settings. The block cache
+        is not included as it's set with `gdal.SetCacheMax`, GDAL only reads
+        GDAL_CACHEMAX when the cache is first used.
+        """
+        options = {}
+        if self.num_threads is not None:
+            options["GDAL_NUM_THREADS"] = str(self.num_threads)
+        if self.vsi_cache is not None:
+            options["VSI_CACHE"] = "TRUE" if self.vsi_cache else "FALSE"
+        if self.vsi_cache_size is not None:
+            options["VSI_CACHE_SIZE"] = str(self.vsi_cache_size)
+        return options
+
+    def get_warp_options(self) -> Dict[str, Any]:
+        """Gets the keyword arguments of `gdal.WarpOptions` for these settings"""
+        options: Dict[str, Any] = {}
+        if self.warp_memory is not None:
+            options["warpMemoryLimit"] = self.warp_memory
+        if self.num_threads is not None:
+            # the number of threads is taken from GDAL_NUM_THREADS
+            options["multithread"] = True
+        return options
+
+    def apply(self) -> Dict[str, Any]:
+        """
+        Applies the settings, returning the previous values that are passed
+        to `restore` to undo them
+        """
+        previous: Dict[str, Any] = {"options": {}}
+        if self.cache_max is not None:
+            previous["cache_max"] = gdal.GetCacheMax()
+            gdal.SetCacheMax(self.cache_max)
+        for name, value in self.get_config_options().items():
+            previous["options"][name] = gdal.GetConfigOption(name)
+            gdal.SetConfigOption(name, value)
+        return previous
+
+    def restore(self, previous: Dict[str, Any]) -> None:
+        """Restores the settings that were in place before `apply`"""
+        for name, value in previous["options"].items():
+            # a value of None unsets the option
+            gdal.SetConfigOption(name, value)
+        if "cache_max" in previous:
+            gdal.SetCacheMax(previous["cache_max"])
+
+    @contextmanager
+    def applied(self) -> Iterator[None]:
+        """Context manager that applies the settings for the duration of its body"""
+        previous = self.apply()
+        try:
+            yield
+        finally:
+            self.restore(previous)
+
+    def __repr__(self) -> str:
+        return (
+            f"GdalConfig(cache_max={self.cache_max}, "
+            f"num_threads={self.num_threads}, vsi_cache={self.vsi_cache}, "
+            f"vsi_cache_size={self.vsi_cache_size}, "
+            f"warp_memory={self.warp_memory})"
+        )
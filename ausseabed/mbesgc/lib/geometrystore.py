@@ -0,0 +1,181 @@
+"""
+Storage for the failure geometry accumulated by the checks over a run
+"""
+
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List
+import json
+import tempfile
+
+# number of polygons kept in memory before they are written to disk
+DEFAULT_SPILL_COUNT = 1000
+
+# size of the chunks the spilled polygons are copied in
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+def _copy_bytes(src: BinaryIO, dest: BinaryIO, length: int) -> None:
+    """Copies `length` bytes from the current position of `src` to `dest`"""
+    while length > 0:
+        chunk = src.read(min(length, COPY_CHUNK_SIZE))
+        if len(chunk) == 0:
+            raise EOFError("Spilled geometry is shorter than expected")
+        dest.write(chunk)
+        length -= len(chunk)
+
+
+class GeometryStore:
+    """
+    Accumulates the polygons of the areas that failed a check. Polygons are
+    given as the coordinates of a GeoJSON Polygon, and are kept in memory
+    until there are `spill_count` of them, at which point they are appended
+    to a temporary file on disk (one JSON array per line). This keeps the
+    memory used by a check bounded regardless of the number of failures
+    found over a run, the polygons are only streamed back when they are
+    iterated over (eg; to produce the QAJSON map).
+
+    The polygons are iterated in the order they were added. Polygons must
+    not be added while the store is being iterated over.
+
+    When pickled (eg; to return the checks of a tile from a worker process)
+    the spilled polygons are included as the raw bytes of the file, they are
+    not read back into memory. Checkpoints copy the spilled polygons to the
+    run directory instead, see `RunCheckpoint`.
+    """
+
+    def __init__(self, spill_count: int = DEFAULT_SPILL_COUNT) -> None:
+        self._reset(spill_count)
+
+    def _reset(self, spill_count: int) -> None:
+        """Sets up an empty store, used when created and when unpickled"""
+        self.spill_count = spill_count
+        # polygons that have not been written to disk
+        self._polygons: List[Any] = []
+        # temporary file the polygons are spilled to, created when first
+        # needed. It's removed when closed.
+        self._file: BinaryIO | None = None
+        self._spilled_count = 0
+        self._spilled_bytes = 0
+
+    @classmethod
+    def from_spilled(
+        cls,
+        spilled: BinaryIO,
+        length: int,
+        spilled_count: int,
+        polygons: List[Any],
+        spill_count: int = DEFAULT_SPILL_COUNT,
+    ) -> "GeometryStore":
+        """
+        Creates a store from `length` bytes of spilled polygons read from the
+        current position of `spilled`, followed by the `polygons` held in
+        memory
+        """
+        store = cls(spill_count)
+        if spilled_count > 0:
+            store._file = store._create_file()
+            _copy_bytes(spilled, store._file, length)
+            store._spilled_count = spilled_count
+            store._spilled_bytes = length
+        store._polygons = list(polygons)
+        return store
+
+    def append(self, coordinates: Any) -> None:
+        """Adds the coordinates of a polygon to the store"""
+        self._polygons.append(coordinates)
+        if len(self._polygons) >= self.spill_count:
+            self._spill()
+
+    def extend(self, polygons: Iterable[Any]) -> None:
+        """Adds all polygons of another store (or any iterable) to this store"""
+        for coordinates in polygons:
+            self.append(coordinates)
+
+    def _create_file(self) -> BinaryIO:
+        return tempfile.TemporaryFile(mode="w+b", prefix="mbesgc_geometry_")
+
+    def _spill(self) -> None:
+        """Writes the polygons held in memory to disk"""
+        if self._file is None:
+            self._file = self._create_file()
+        for coordinates in self._polygons:
+            line = json.dumps(coordinates, separators=(",", ":")) + "\n"
+            self._spilled_bytes += self._file.write(line.encode("utf-8"))
+        self._spilled_count += len(self._polygons)
+        self._polygons = []
+
+    @property
+    def spilled_count(self) -> int:
+        """Number of polygons that have been written to disk"""
+        return self._spilled_count
+
+    @property
+    def spilled_bytes(self) -> int:
+        """Size in bytes of the polygons that have been written to disk"""
+        return self._spilled_bytes
+
+    @property
+    def memory_polygons(self) -> List[Any]:
+        """The polygons that are held in memory, following those spilled"""
+        return list(self._polygons)
+
+    def copy_spilled(self, dest: BinaryIO, start: int = 0) -> int:
+        """
+        Copies the spilled polygons from byte offset `start` to `dest`, in
+        chunks. As polygons are only ever appended the bytes before `start`
+        are unchanged since they were last copied. Returns the offset of the
+        end of the spilled polygons.
+        """
+        if self._file is None:
+            return 0
+        self._file.flush()
+        self._file.seek(start)
+        _copy_bytes(self._file, dest, self._spilled_bytes - start)
+        self._file.seek(0, 2)
+        return self._spilled_bytes
+
+    def __len__(self) -> int:
+        return self._spilled_count + len(self._polygons)
+
+    def __iter__(self) -> Iterator[Any]:
+        if self._file is not None:
+            self._file.flush()
+            self._file.seek(0)
+            for _ in range(self._spilled_count):
+                yield json.loads(self._file.readline())
+            # following polygons are appended to the end of the file
+            self._file.seek(0, 2)
+        yield from self._polygons
+
+    def close(self) -> None:
+        """Removes the polygons that have been spilled to disk"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._spilled_count = 0
+        self._spilled_bytes = 0
+        self._polygons = []
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # the temporary file is local to this process, so its contents are
+        # included as bytes rather than being parsed back into polygons
+        spilled = b""
+        if self._file is not None:
+            self._file.flush()
+            self._file.seek(0)
+            spilled = self._file.read(self._spilled_bytes)
+            self._file.seek(0, 2)
+        return {
+            "spill_count": self.spill_count,
+            "spilled": spilled,
+            "spilled_count": self._spilled_count,
+            "polygons": self._polygons,
+        }
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self._reset(state["spill_count"])
+        if state.get("spilled_count", 0) > 0:
+            self._file = self._create_file()
+            self._file.write(state["spilled"])
+            self._spilled_count = state["spilled_count"]
+            self._spilled_bytes = len(state["spilled"])
+        self._polygons = list(state["polygons"])
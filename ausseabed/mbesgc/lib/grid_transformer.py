@@ -2,10 +2,9 @@ from osgeo import gdal, gdal_array
 from typing import Tuple, Callable, List
 import numpy as np
 
+from .gdalconfig import GdalConfig
 from .tiling import get_tiles, Tile
 
-gdal.SetCacheMax(1000000000)
-
 
 def _default_progress_callback(progress):
     """Default progress callback function. Prints % complete to stdout."""
@@ -18,13 +17,18 @@ class GridTransformer:
     band raster including density, depth, and uncertainty (all 32-bit floats).
     """
 
-    def __init__(self):
+    def __init__(self, gdal_config: GdalConfig | None = None):
+        # GDAL settings applied while processing, by default a large block
+        # cache is used
+        if gdal_config is None:
+            gdal_config = GdalConfig(cache_max=1000000000)
+        self.gdal_config = gdal_config
         self.output_datatype = gdal.GDT_Float32
         # set output nodata to -3.4028235e+38
         self.output_nodata = np.finfo(np.float32).min.item()
         # data is chunked by tiles with this size
-        self.error_messages = []
-        self.warning_messages = []
+        self.error_messages: List[str] = []
+        self.warning_messages: List[str] = []
 
     def _validate_sizes(
         self, density: gdal.Dataset, depth: gdal.Dataset, uncertainty: gdal.Dataset
@@ -77,10 +81,8 @@ class GridTransformer:
         data type. Returns a numpy array
         """
 
-        band_data = np.array(
-            band.ReadAsArray(
-                tile.min_x, tile.min_y, tile.max_x - tile.min_x, tile.max_y - tile.min_y
-            )
+        band_data = band.ReadAsArray(
+            tile.min_x, tile.min_y, tile.max_x - tile.min_x, tile.max_y - tile.min_y
         )
 
         np_out_dt = gdal_array.GDALTypeCodeToNumericTypeCode(self.output_datatype)
@@ -166,7 +168,8 @@ class GridTransformer:
     ) -> bool:
         """
         Runs the conversion process from 3 input files containing a single band each to
-        one file containing 3 bands.
+        one file containing 3 bands. The GDAL settings of `gdal_config` are applied
+        while the conversion is running.
 
         Args:
             depth: Tuple(str, int): tuple with full file path and the index of the
@@ -191,6 +194,30 @@ class GridTransformer:
             True if the process was successful, False if not.
 
         """
+        with self.gdal_config.applied():
+            return self._process(
+                depth,
+                density,
+                uncertainty,
+                output,
+                progress_callback,
+                is_stopped,
+                completed_callback,
+                message_callback,
+            )
+
+    def _process(
+        self,
+        depth: Tuple[str, int],
+        density: Tuple[str, int],
+        uncertainty: Tuple[str, int],
+        output: str,
+        progress_callback: Callable | None = None,
+        is_stopped: Callable | None = None,
+        completed_callback: Callable | None = None,
+        message_callback: Callable | None = None,
+    ) -> bool:
+        """Runs the conversion process, see `process`"""
         self.error_messages = []
         self.warning_messages = []
         self.message_callback = message_callback
@@ -3,21 +3,45 @@ Definition of Grid Checks implemented in mbesgc
 """
 
 from __future__ import annotations
+from contextlib import nullcontext
 from datetime import datetime
 from enum import Enum
 from pathlib import PurePath
 from tempfile import TemporaryDirectory
+import functools
 import shutil
-from typing import List, Any, ClassVar
+from typing import List, Any, Callable, ClassVar, ContextManager, Dict, Tuple
 from ausseabed.qajson.model import QajsonParam, QajsonOutputs
-from .data import InputFileDetails
+from .data import BandType, InputFileDetails
+from .profiling import RunStats
 from .tiling import Tile
 
 import os
+import numpy as np
+import numpy.ma as ma
 import scipy.ndimage as ndimage
 from osgeo import ogr
 
 
+def get_band_data(
+    data: np.ndarray,
+    valid: Dict[BandType, np.ndarray] | None,
+    band_type: BandType,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Gets the data of a band given to `GridCheck.run`, along with a mask of
+    its valid (not nodata) pixels. The executor gives the bands as plain
+    arrays with their validity masks in `valid`, but a band may also be
+    given as a masked array. All pixels of a band without a nodata value are
+    valid.
+    """
+    if isinstance(data, ma.MaskedArray):
+        return data.data, ~ma.getmaskarray(data)
+    if valid is not None and band_type in valid:
+        return data, valid[band_type]
+    return data, np.ones(data.shape, dtype=bool)
+
+
 class GridCheckState(str, Enum):
     cs_pass = "pass"
     cs_warning = "warning"
@@ -38,6 +62,42 @@ class GridCheckResult:
         self.messages = messages
 
 
+class CheckSummary:
+    """
+    Summary of the results of a check run over a single tile. Unlike the
+    check itself the summary is not merged with the results of other tiles,
+    so it can be handed to callers as each tile is completed.
+    """
+
+    def __init__(
+        self,
+        execution_status: str,
+        failed_cell_count: int = 0,
+        total_cell_count: int = 0,
+        density_histogram: Dict[int, int] | None = None,
+        failure_geometry: List[Any] | None = None,
+    ):
+        self.execution_status = execution_status
+        # number of cells that failed the check, and the number of (not
+        # nodata) cells that were checked
+        self.failed_cell_count = failed_cell_count
+        self.total_cell_count = total_cell_count
+        # count of nodes by their number of soundings, for checks of density
+        self.density_histogram = density_histogram
+        # polygons (in WGS84) of the failed areas, as the coordinates of a
+        # GeoJSON MultiPolygon
+        self.failure_geometry = failure_geometry if failure_geometry else []
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "execution_status": self.execution_status,
+            "failed_cell_count": self.failed_cell_count,
+            "total_cell_count": self.total_cell_count,
+            "density_histogram": self.density_histogram,
+            "failure_geometry": self.failure_geometry,
+        }
+
+
 class GridCheck:
     """
     Base class for all grid checks
@@ -49,6 +109,24 @@ class GridCheck:
     input_params: list[QajsonParam] = []
     parameter_help_link: ClassVar[str] = ""
 
+    # approximate peak memory (in bytes per pixel of the tile) used by the
+    # temporary arrays this check creates, and the additional memory used
+    # when spatial outputs are generated. Used to size tiles to fit within a
+    # memory budget.
+    bytes_per_pixel: ClassVar[int] = 0
+    spatial_bytes_per_pixel: ClassVar[int] = 0
+
+    # the input bands this check uses, only these bands are read for the
+    # tiles this check is run on. Bands that are not required by any of the
+    # checks run on a tile are passed to `run` as None. Subclasses should
+    # narrow this to the bands they use.
+    band_types: ClassVar[List[BandType]] = [
+        BandType.depth,
+        BandType.density,
+        BandType.uncertainty,
+        BandType.pinkChart,
+    ]
+
     def __init__(self, input_params: List[QajsonParam]):
         self.input_params = input_params
 
@@ -69,6 +147,16 @@ class GridCheck:
         self.temp_base_dir: str | None = None
         self.temp_dir_all: list[TemporaryDirectory] = []
 
+        # when set the spatial export of each tile is not performed as part
+        # of `run`, instead it is added to `pending_exports` so that the caller
+        # can perform it later (eg; on a separate thread)
+        self.defer_exports = False
+        self.pending_exports: list[Callable[[], None]] = []
+
+        # the time spent in each stage of the check is added to these stats,
+        # if they are set
+        self.stats: RunStats | None = None
+
     def check_started(self):
         """
         to be called before first call to checkc `run` function. Initialises
@@ -91,8 +179,47 @@ class GridCheck:
             self.start_time = datetime.now().strftime("%Y-%m-%dT%H:%M:%S.%f")
         self.execution_status = "running"
 
-    def _merge_temp_dirs(self, last_check: GridCheck):
-        self.temp_dir_all.extend(last_check.temp_dir_all)
+    def __getstate__(self) -> dict:
+        # checks are pickled when they're returned from a worker process. The
+        # temporary directories are local to the process that created them
+        # (and their contents have already been copied to the spatial export
+        # location) so they are not carried across.
+        state = self.__dict__.copy()
+        state["temp_dir"] = None
+        state["temp_dir_all"] = []
+        state["pending_exports"] = []
+        state["stats"] = None
+        return state
+
+    def _stage(self, name: str, tile: Tile | None = None) -> ContextManager:
+        """
+        Context manager that times a stage of this check, the stage is
+        recorded under the name of the check. The memory used by the stage
+        is also recorded (if tracked) when the tile is given.
+        """
+        if self.stats is None:
+            return nullcontext()
+        return self.stats.stage(f"{self.name}/{name}", tile)
+
+    def _export(
+        self, export_func: Callable, ifd: InputFileDetails, tile: Tile, *args
+    ) -> None:
+        """
+        Runs the spatial export function for a tile, or queues it in
+        `pending_exports` if exports are deferred. The export function is
+        called with the ifd, tile, and any other args.
+        """
+        export = functools.partial(self._timed_export, export_func, ifd, tile, *args)
+        if self.defer_exports:
+            self.pending_exports.append(export)
+        else:
+            export()
+
+    def _timed_export(
+        self, export_func: Callable, ifd: InputFileDetails, tile: Tile, *args
+    ) -> None:
+        with self._stage("export", tile):
+            export_func(ifd, tile, *args)
 
     def _get_tmp_file(self, name: str, extension: str, tile: Tile) -> str:
         n = f"{name}_{tile.min_x}_{tile.min_y}.{extension}"
@@ -139,6 +266,7 @@ class GridCheck:
         uncertainty,
         pinkchart,
         progress_callback=None,
+        valid: Dict[BandType, np.ndarray] | None = None,
     ):
         """
         Abstract function definition for how each check should implement its
@@ -155,6 +283,9 @@ class GridCheck:
             pinkchart (numpy): Pink Chart data
             progress_callback (function): optional callback function to
                 indicate progress to caller
+            valid (dict): boolean masks of the valid (not nodata) pixels of
+                each band, by band type. Use `get_band_data` to get the data
+                and validity of a band.
 
         Returns:
             nothing?
@@ -162,17 +293,40 @@ class GridCheck:
         """
         raise NotImplementedError
 
-    def merge_results(self, last_check: GridCheck) -> None:
+    def combine(self, other: GridCheck) -> None:
         """
-        Abstract function definition for how each check should merge results.
+        Combines the results of `other` into this check.
 
         Checks are run on a tile by tile (chunck of input data) basis. To get
-        the complete results the results from each chunk need to be merged.
-        This merging needs to be implemented within this function.
+        the complete results the results from each chunk need to be combined.
+        The check run over the first tile accumulates the results of all the
+        tiles that follow it, so `other` holds the results of tiles that come
+        after those of this check. Combining must be associative, so that the
+        results of groups of tiles can be combined before being combined
+        with each other. The cost of combining should depend only on the
+        size of `other`, not on the results accumulated by this check.
+
+        Must be overwritten by child classes, which must also call this
+        implementation to combine the state common to all checks.
+        """
+        if self.start_time is None:
+            self.start_time = other.start_time
+        if other.end_time is not None:
+            self.end_time = other.end_time
+        # the execution status is that of the last tile
+        self.execution_status = other.execution_status
+        self.error_message = other.error_message
+        self.temp_dir_all.extend(other.temp_dir_all)
+
+    def get_summary(self) -> CheckSummary:
+        """
+        Gets a summary of the results of this check. Called on the check run
+        over a single tile, before it is combined with the other tiles.
 
-        Must be overwritten by child classes
+        Child classes should overwrite this to include the counts and
+        geometry of their results.
         """
-        raise NotImplementedError
+        return CheckSummary(self.execution_status)
 
     def get_outputs(self) -> QajsonOutputs:
         """
@@ -185,10 +339,11 @@ class GridCheck:
         Creates a simplified layer from an input layer using GDAL's
         simplify function
         """
-        for in_feat in in_lyr:
-            geom = in_feat.GetGeometryRef()
-            simple_geom = geom.SimplifyPreserveTopology(simplify_distance)
-            self.__add_geom(simple_geom, out_lyr)
+        with self._stage("simplify"):
+            for in_feat in in_lyr:
+                geom = in_feat.GetGeometryRef()
+                simple_geom = geom.SimplifyPreserveTopology(simplify_distance)
+                self.__add_geom(simple_geom, out_lyr)
 
     def __add_geom(self, geom, out_lyr):
         feature_def = out_lyr.GetLayerDefn()
@@ -206,8 +361,9 @@ class GridCheck:
         def test_func(values):
             return values.max()
 
-        return ndimage.generic_filter(
-            data_array,
-            test_func,
-            size=(pixel_growth, pixel_growth),
-        )
+        with self._stage("grow_pixels"):
+            return ndimage.generic_filter(
+                data_array,
+                test_func,
+                size=(pixel_growth, pixel_growth),
+            )
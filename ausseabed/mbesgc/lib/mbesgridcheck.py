@@ -1,22 +1,32 @@
 from typing import List, Any
 from ausseabed.qajson.model import QajsonParam, QajsonOutputs, QajsonExecution
-from ausseabed.mbesgc.lib.data import InputFileDetails
+from ausseabed.mbesgc.lib.data import BandType, InputFileDetails
 from ausseabed.mbesgc.lib.tiling import Tile
 
 import collections
 import logging
 import numpy as np
-import numpy.ma as ma
 import geojson
 from geojson import MultiPolygon
 from osgeo import gdal, ogr, osr
 from affine import Affine
 
-from .gridcheck import GridCheck, GridCheckState
+from .geometrystore import GeometryStore
+from .gridcheck import CheckSummary, GridCheck, GridCheckState, get_band_data
 
 logger = logging.getLogger(__name__)
 
 
+def _to_multipolygon(geometry: GeometryStore) -> MultiPolygon:
+    """
+    Reads the polygons of a geometry store into a MultiPolygon. The
+    coordinates are set directly as the MultiPolygon constructor rounds them.
+    """
+    multipolygon = MultiPolygon()
+    multipolygon.coordinates = list(geometry)
+    return multipolygon
+
+
 class DensityCheck(GridCheck):
     """
     Performs check based on density data and input arrays. This looks to
@@ -33,6 +43,11 @@ class DensityCheck(GridCheck):
         QajsonParam("Minimum Soundings per node percentage", 95.0),
     ]
     parameter_help_link = "user_manual_qax_MBESGC.html#mbesgc-density-params"
+    band_types = [BandType.density]
+    # unique counts sorts a copy of the density data, sized for the widest
+    # type density may be converted to (int64)
+    bytes_per_pixel = 24
+    spatial_bytes_per_pixel = 2
 
     def __init__(self, input_params: List[QajsonParam]):
         super().__init__(input_params)
@@ -42,7 +57,9 @@ class DensityCheck(GridCheck):
         self._min_spn = self.get_param("Minimum Soundings per node")
         self._min_spn_p = self.get_param("Minimum Soundings per node percentage")
 
-        self.tiles_geojson = MultiPolygon()
+        # polygons of the failed areas, these are spilled to disk as they
+        # accumulate over the run
+        self.failure_geometry = GeometryStore()
         self.extents_geojson = MultiPolygon()
 
         # amount of padding to place around failing pixels
@@ -64,6 +81,7 @@ class DensityCheck(GridCheck):
         uncertainty,
         pinkchart,
         progress_callback=None,
+        valid=None,
     ):
 
         assert ifd.geotransform is not None
@@ -78,7 +96,13 @@ class DensityCheck(GridCheck):
             # we cant run the check so return
             return
 
-        self.total_cell_count = int(density.count())
+        density, density_valid = get_band_data(density, valid, BandType.density)
+
+        # results are only counted for the core of the tile, the halo is
+        # counted by the neighbouring tiles
+        core_density = density[tile.core_slices]
+        core_valid = density_valid[tile.core_slices]
+        self.total_cell_count = int(np.count_nonzero(core_valid))
         # skip processing this chunk of data if it contains only nodata
         if self.total_cell_count == 0:
             self.density_histogram = {}
@@ -88,13 +112,13 @@ class DensityCheck(GridCheck):
         # unique_vals will be the soundings per node
         # unique_counts is the total number of times the unique_val soundings
         # count was found.
-        unique_vals, unique_counts = np.unique(density, return_counts=True)
+        unique_vals, unique_counts = np.unique(
+            core_density[core_valid], return_counts=True
+        )
         hist = {}
         for val, count in zip(unique_vals, unique_counts):
-            if isinstance(val, ma.core.MaskedConstant):
-                continue
             # following gets serialized to JSON and as numpy types are not
-            # supported by default we convert the float32 and int64 types to
+            # supported by default we convert the unsigned int types to
             # plain python ints
             hist[int(val)] = int(count)
 
@@ -105,13 +129,16 @@ class DensityCheck(GridCheck):
             # need to do any further processing
             return
 
+        # nodata is never a bad cell
         bad_cells_mask = density < self._min_spn
-        bad_cells_mask.fill_value = False
-        bad_cells_mask = bad_cells_mask.filled()
-        bad_cells_mask_int8 = bad_cells_mask.astype(np.int8)
+        bad_cells_mask &= density_valid
+        # a zero copy view of the mask, as written to the Byte rasters
+        bad_cells_mask_uint8 = bad_cells_mask.view(np.uint8)
 
+        # spatial outputs are generated for the core of the tile
+        core_tile = tile.core
         src_affine = Affine.from_gdal(*ifd.geotransform)
-        tile_affine = src_affine * Affine.translation(tile.min_x, tile.min_y)
+        tile_affine = src_affine * Affine.translation(core_tile.min_x, core_tile.min_y)
 
         # there are similarities in how the qajson spatial outputs are generated
         # and how the exported files are generated, however as it is possible
@@ -123,17 +150,19 @@ class DensityCheck(GridCheck):
 
             tile_ds = gdal.GetDriverByName("MEM").Create(
                 "",
-                tile.max_x - tile.min_x,
-                tile.max_y - tile.min_y,
+                core_tile.width,
+                core_tile.height,
                 1,
                 gdal.GDT_Byte,
             )
 
             # grow out failed pixels to make them more obvious. We've already
             # calculated the pass/fail stats so this won't impact results.
-            bad_cells_mask_int8_grow = self._grow_pixels(
-                bad_cells_mask_int8, self.pixel_growth
-            )
+            # Pixels are grown over the whole tile so failed pixels in the
+            # halo grow into the core.
+            bad_cells_mask_uint8_grow = self._grow_pixels(
+                bad_cells_mask_uint8, self.pixel_growth
+            )[tile.core_slices]
 
             # simplify distance is calculated as the distance pixels are grown out
             # `ifd.geotransform[1]` is pixel size
@@ -143,7 +172,7 @@ class DensityCheck(GridCheck):
             tile_ds.SetGeoTransform(tile_affine.to_gdal())
 
             tile_band = tile_ds.GetRasterBand(1)
-            tile_band.WriteArray(bad_cells_mask_int8_grow, 0, 0)
+            tile_band.WriteArray(bad_cells_mask_uint8_grow, 0, 0)
             tile_band.SetNoDataValue(0)
             tile_band.FlushCache()
             tile_ds.SetProjection(ifd.projection)
@@ -158,14 +187,15 @@ class DensityCheck(GridCheck):
             # used the input raster data 'tile_band' as the input and mask, if not
             # used as a mask then a feature that outlines the entire dataset is
             # also produced
-            gdal.Polygonize(
-                tile_band,
-                tile_band,
-                ogr_layer,
-                -1,
-                [],
-                callback=None,
-            )
+            with self._stage("polygonize"):
+                gdal.Polygonize(
+                    tile_band,
+                    tile_band,
+                    ogr_layer,
+                    -1,
+                    [],
+                    callback=None,
+                )
 
             ogr_simple_driver = ogr.GetDriverByName("MEM")
             ogr_simple_dataset = ogr_simple_driver.CreateDataSource("failed_poly")
@@ -181,82 +211,118 @@ class DensityCheck(GridCheck):
             ogr_srs_out.ImportFromEPSG(4326)
             transform = osr.CoordinateTransformation(ogr_srs, ogr_srs_out)
 
-            for feature in ogr_simple_layer:
-                transformed = feature.GetGeometryRef()
-                transformed.Transform(transform)
+            with self._stage("geojson"):
+                for feature in ogr_simple_layer:
+                    transformed = feature.GetGeometryRef()
+                    transformed.Transform(transform)
 
-                geojson_feature = geojson.loads(feature.ExportToJson())
-                self.tiles_geojson.coordinates.append(
-                    geojson_feature.geometry.coordinates
-                )
+                    geojson_feature = geojson.loads(feature.ExportToJson())
+                    self.failure_geometry.append(geojson_feature.geometry.coordinates)
 
             ogr_simple_dataset.Destroy()
             ogr_dataset.Destroy()
 
         if self.spatial_export:
-            tf = self._get_tmp_file("density_failed", "tif", tile)
-            tile_ds = gdal.GetDriverByName("GTiff").Create(
-                tf,
-                tile.max_x - tile.min_x,
-                tile.max_y - tile.min_y,
-                1,
-                gdal.GDT_Byte,
-                options=["COMPRESS=DEFLATE"],
+            self._export(
+                self._export_tile,
+                ifd,
+                core_tile,
+                tile_affine,
+                bad_cells_mask_uint8[tile.core_slices],
             )
 
-            tile_ds.SetGeoTransform(tile_affine.to_gdal())
+        # # includes only the tile boundaries, used for debug
+        # tile_geojson = tile.to_geojson(ifd.projection, ifd.geotransform)
+        # self.failure_geometry.append(tile_geojson.coordinates)
 
-            tile_band = tile_ds.GetRasterBand(1)
-            tile_band.WriteArray(bad_cells_mask_int8, 0, 0)
-            tile_band.SetNoDataValue(0)
-            tile_band.FlushCache()
-            tile_ds.SetProjection(ifd.projection)
+    def _export_tile(
+        self,
+        ifd: InputFileDetails,
+        tile: Tile,
+        tile_affine: Affine,
+        bad_cells_mask_uint8,
+    ):
+        """
+        Writes the failed cells of a tile to the spatial export location as
+        a raster and a shapefile
+        """
+        tf = self._get_tmp_file("density_failed", "tif", tile)
+        tile_ds = gdal.GetDriverByName("GTiff").Create(
+            tf,
+            tile.max_x - tile.min_x,
+            tile.max_y - tile.min_y,
+            1,
+            gdal.GDT_Byte,
+            options=["COMPRESS=DEFLATE"],
+        )
 
-            ogr_srs = osr.SpatialReference()
-            ogr_srs.ImportFromWkt(ifd.projection)
+        tile_ds.SetGeoTransform(tile_affine.to_gdal())
 
-            sf = self._get_tmp_file("density_failed", "shp", tile)
-            ogr_driver = ogr.GetDriverByName("ESRI Shapefile")
-            ogr_dataset = ogr_driver.CreateDataSource(sf)
-            ogr_layer = ogr_dataset.CreateLayer("density_failed", srs=ogr_srs)
+        tile_band = tile_ds.GetRasterBand(1)
+        tile_band.WriteArray(bad_cells_mask_uint8, 0, 0)
+        tile_band.SetNoDataValue(0)
+        tile_band.FlushCache()
+        tile_ds.SetProjection(ifd.projection)
 
-            # used the input raster data 'tile_band' as the input and mask, if not
-            # used as a mask then a feature that outlines the entire dataset is
-            # also produced
-            gdal.Polygonize(
-                tile_band,
-                tile_band,
-                ogr_layer,
-                -1,
-                [],
-                callback=None,
-            )
+        ogr_srs = osr.SpatialReference()
+        ogr_srs.ImportFromWkt(ifd.projection)
 
-            tile_ds = None
-            ogr_dataset.Destroy()
+        sf = self._get_tmp_file("density_failed", "shp", tile)
+        ogr_driver = ogr.GetDriverByName("ESRI Shapefile")
+        ogr_dataset = ogr_driver.CreateDataSource(sf)
+        ogr_layer = ogr_dataset.CreateLayer("density_failed", srs=ogr_srs)
+
+        # used the input raster data 'tile_band' as the input and mask, if not
+        # used as a mask then a feature that outlines the entire dataset is
+        # also produced
+        gdal.Polygonize(
+            tile_band,
+            tile_band,
+            ogr_layer,
+            -1,
+            [],
+            callback=None,
+        )
 
-            self._move_tmp_dir()
+        tile_ds = None
+        ogr_dataset.Destroy()
 
-        # # includes only the tile boundaries, used for debug
-        # tile_geojson = tile.to_geojson(ifd.projection, ifd.geotransform)
-        # self.tiles_geojson.coordinates.append(tile_geojson.coordinates)
+        self._move_tmp_dir()
 
-    def merge_results(self, last_check: GridCheck):
+    def combine(self, other: GridCheck):
         """
-        merge the density histogram of the last_check into the current check
+        combine the density histogram of the other check into this check
         """
-        self.start_time = last_check.start_time
-        assert isinstance(last_check, DensityCheck)
+        assert isinstance(other, DensityCheck)
+        super().combine(other)
+        self.missing_density = other.missing_density
 
-        for soundings_count, last_count in last_check.density_histogram.items():
+        for soundings_count, other_count in other.density_histogram.items():
             if soundings_count in self.density_histogram:
-                self.density_histogram[soundings_count] += last_count
+                self.density_histogram[soundings_count] += other_count
             else:
-                self.density_histogram[soundings_count] = last_count
-
-        self.tiles_geojson.coordinates.extend(last_check.tiles_geojson.coordinates)
-
-        self._merge_temp_dirs(last_check)
+                self.density_histogram[soundings_count] = other_count
+
+        self.failure_geometry.extend(other.failure_geometry)
+        if len(other.extents_geojson.coordinates) > 0:
+            # extents are of the whole input file, but only set by tiles
+            # that contain data
+            self.extents_geojson = other.extents_geojson
+
+    def get_summary(self) -> CheckSummary:
+        # nodes with fewer soundings than the minimum are counted as failed
+        failed_cell_count = sum(
+            count
+            for soundings_count, count in self.density_histogram.items()
+            if soundings_count < self._min_spn
+        )
+        return CheckSummary(
+            self.execution_status,
+            failed_cell_count=failed_cell_count,
+            total_cell_count=sum(self.density_histogram.values()),
+            density_histogram=dict(self.density_histogram),
+            failure_geometry=list(self.failure_geometry),
+        )
 
     def get_outputs(self) -> QajsonOutputs:
 
@@ -332,7 +398,8 @@ class DensityCheck(GridCheck):
         }
 
         if self.spatial_qajson:
-            data["map"] = self.tiles_geojson
+            # the failed areas are only read back into memory here
+            data["map"] = _to_multipolygon(self.failure_geometry)
             data["extents"] = self.extents_geojson
 
         data["summary"] = {
@@ -371,6 +438,11 @@ class TvuCheck(GridCheck):
         QajsonParam("Acceptable Area Percentage", 100.0),
     ]
     parameter_help_link = "user_manual_qax_MBESGC.html#mbesgc-tvu-params"
+    band_types = [BandType.depth, BandType.uncertainty]
+    # abs uncertainty, and the allowable uncertainty and its temporaries
+    # in double precision
+    bytes_per_pixel = 28
+    spatial_bytes_per_pixel = 12
 
     def __init__(self, input_params: List[QajsonParam]):
         super().__init__(input_params)
@@ -379,7 +451,9 @@ class TvuCheck(GridCheck):
         self._depth_error_factor = self.get_param("Factor of Depth Dependent Errors")
         self._area_percentage = self.get_param("Acceptable Area Percentage")
 
-        self.tiles_geojson = MultiPolygon()
+        # polygons of the failed areas, these are spilled to disk as they
+        # accumulate over the run
+        self.failure_geometry = GeometryStore()
         self.extents_geojson = MultiPolygon()
 
         # amount of padding to place around failing pixels
@@ -393,16 +467,20 @@ class TvuCheck(GridCheck):
         self.missing_depth: bool = False
         self.missing_uncertainty: bool = False
 
-    def merge_results(self, last_check: GridCheck):
-        assert isinstance(last_check, TvuCheck)
-        self.start_time = last_check.start_time
-
-        self.total_cell_count += last_check.total_cell_count
-        self.failed_cell_count += last_check.failed_cell_count
+    def combine(self, other: GridCheck):
+        assert isinstance(other, TvuCheck)
+        super().combine(other)
+        self.missing_depth = other.missing_depth
+        self.missing_uncertainty = other.missing_uncertainty
 
-        self.tiles_geojson.coordinates.extend(last_check.tiles_geojson.coordinates)
+        self.total_cell_count += other.total_cell_count
+        self.failed_cell_count += other.failed_cell_count
 
-        self._merge_temp_dirs(last_check)
+        self.failure_geometry.extend(other.failure_geometry)
+        if len(other.extents_geojson.coordinates) > 0:
+            # extents are of the whole input file, but only set by tiles
+            # that contain data
+            self.extents_geojson = other.extents_geojson
 
     def run(
         self,
@@ -413,6 +491,7 @@ class TvuCheck(GridCheck):
         uncertainty,
         pinkchart,
         progress_callback=None,
+        valid=None,
     ):
         # run check on tile data
         assert ifd.geotransform is not None
@@ -440,39 +519,59 @@ class TvuCheck(GridCheck):
         a = self._depth_error
         b = self._depth_error_factor
 
+        depth, depth_valid = get_band_data(depth, valid, BandType.depth)
+        uncertainty, uncertainty_valid = get_band_data(
+            uncertainty, valid, BandType.uncertainty
+        )
+
         # some tools produce negative uncertainty values which will cause
         # problems with the threshold check. So calculate the abs values
         # and use this to check against.
         uncertainty = np.absolute(uncertainty)
 
-        # count of all cells/nodes/pixels that are not NaN in the uncertainty
-        # array
-        self.total_cell_count = int(uncertainty.count())
+        # count of all cells/nodes/pixels that are not nodata in the
+        # uncertainty array. Only the core of the tile is counted, the halo is
+        # counted by the neighbouring tiles.
+        self.total_cell_count = int(
+            np.count_nonzero(uncertainty_valid[tile.core_slices])
+        )
 
         # skip processing this chunk of data if it contains only nodata
         if self.total_cell_count == 0:
             self.failed_cell_count = 0
             return
 
-        # calculate allowable uncertainty based on equation and depth data
-        allowable_uncertainty = np.sqrt(a**2 + (b * depth) ** 2)
+        # calculate allowable uncertainty based on equation and depth data,
+        # this is done in double precision so nodes close to the allowable
+        # uncertainty don't change result with the precision of the depth
+        allowable_uncertainty = np.sqrt(
+            a**2 + np.multiply(b, depth, dtype=np.float64) ** 2
+        )
 
+        # comparisons with NaN are false, so nodes with a NaN depth or
+        # uncertainty (that isn't nodata) don't fail
         failed_uncertainty = uncertainty > allowable_uncertainty
-
-        failed_uncertainty.fill_value = False
-        failed_uncertainty = failed_uncertainty.filled()
-        failed_uncertainty_int8 = failed_uncertainty.astype(np.int8)
+        failed_uncertainty &= uncertainty_valid
+        failed_uncertainty &= depth_valid
+        # a zero copy view of the mask, as written to the Byte rasters
+        failed_uncertainty_uint8 = failed_uncertainty.view(np.uint8)
 
         # count of cells that failed the check
-        self.failed_cell_count = int(failed_uncertainty.sum())
+        self.failed_cell_count = int(failed_uncertainty[tile.core_slices].sum())
 
         if not (self.spatial_export or self.spatial_export_location):
             # if we don't generate spatial outputs, then there's no
             # need to do any further processing
             return
 
+        # the allowable uncertainty is 0 (the nodata value of the spatial
+        # outputs) where it could not be calculated
+        allowable_uncertainty[~(depth_valid & np.isfinite(allowable_uncertainty))] = 0
+
+        # spatial outputs are generated for the core of the tile
+        core_tile = tile.core
         src_affine = Affine.from_gdal(*ifd.geotransform)
-        tile_affine = src_affine * Affine.translation(tile.min_x, tile.min_y)
+        tile_affine = src_affine * Affine.translation(core_tile.min_x, core_tile.min_y)
 
         ogr_srs = osr.SpatialReference()
         ogr_srs.ImportFromWkt(ifd.projection)
@@ -484,9 +583,9 @@ class TvuCheck(GridCheck):
 
             # grow out failed pixels to make them more obvious. We've already
             # calculated the pass/fail stats so this won't impact results.
-            failed_uncertainty_int8_grow = self._grow_pixels(
-                failed_uncertainty_int8, self.pixel_growth
-            )
+            failed_uncertainty_uint8_grow = self._grow_pixels(
+                failed_uncertainty_uint8, self.pixel_growth
+            )[tile.core_slices]
 
             # simplify distance is calculated as the distance pixels are grown out
             # `ifd.geotransform[1]` is pixel size
@@ -495,30 +594,30 @@ class TvuCheck(GridCheck):
 
             tile_ds = gdal.GetDriverByName("MEM").Create(
                 "",
-                tile.max_x - tile.min_x,
-                tile.max_y - tile.min_y,
+                core_tile.width,
+                core_tile.height,
                 1,
                 gdal.GDT_Float32,
             )
             tile_ds.SetGeoTransform(tile_affine.to_gdal())
 
             tile_band = tile_ds.GetRasterBand(1)
-            tile_band.WriteArray(allowable_uncertainty, 0, 0)
+            tile_band.WriteArray(allowable_uncertainty[tile.core_slices], 0, 0)
             tile_band.SetNoDataValue(0)
             tile_band.FlushCache()
             tile_ds.SetProjection(ifd.projection)
 
             tile_failed_ds = gdal.GetDriverByName("MEM").Create(
                 "",
-                tile.max_x - tile.min_x,
-                tile.max_y - tile.min_y,
+                core_tile.width,
+                core_tile.height,
                 1,
                 gdal.GDT_Byte,
             )
             tile_failed_ds.SetGeoTransform(tile_affine.to_gdal())
 
             tile_failed_band = tile_failed_ds.GetRasterBand(1)
-            tile_failed_band.WriteArray(failed_uncertainty_int8_grow, 0, 0)
+            tile_failed_band.WriteArray(failed_uncertainty_uint8_grow, 0, 0)
             tile_failed_band.SetNoDataValue(0)
             tile_failed_band.FlushCache()
             tile_failed_ds.SetProjection(ifd.projection)
@@ -530,14 +629,15 @@ class TvuCheck(GridCheck):
             # used the input raster data 'tile_band' as the input and mask, if not
             # used as a mask then a feature that outlines the entire dataset is
             # also produced
-            gdal.Polygonize(
-                tile_failed_band,
-                tile_failed_band,
-                ogr_layer,
-                -1,
-                [],
-                callback=None,
-            )
+            with self._stage("polygonize"):
+                gdal.Polygonize(
+                    tile_failed_band,
+                    tile_failed_band,
+                    ogr_layer,
+                    -1,
+                    [],
+                    callback=None,
+                )
 
             ogr_simple_driver = ogr.GetDriverByName("MEM")
             ogr_simple_dataset = ogr_simple_driver.CreateDataSource("failed_poly")
@@ -549,77 +649,108 @@ class TvuCheck(GridCheck):
             ogr_srs_out.ImportFromEPSG(4326)
             transform = osr.CoordinateTransformation(ogr_srs, ogr_srs_out)
 
-            for feature in ogr_simple_layer:
-                # transform feature into epsg:4326 before export to geojson
-                transformed = feature.GetGeometryRef()
-                transformed.Transform(transform)
+            with self._stage("geojson"):
+                for feature in ogr_simple_layer:
+                    # transform feature into epsg:4326 before export to geojson
+                    transformed = feature.GetGeometryRef()
+                    transformed.Transform(transform)
 
-                geojson_feature = geojson.loads(feature.ExportToJson())
+                    geojson_feature = geojson.loads(feature.ExportToJson())
 
-                self.tiles_geojson.coordinates.append(
-                    geojson_feature.geometry.coordinates
-                )
+                    self.failure_geometry.append(geojson_feature.geometry.coordinates)
 
             ogr_simple_dataset.Destroy()
             ogr_dataset.Destroy()
 
         if self.spatial_export:
-            au = self._get_tmp_file("allowable_uncertainty", "tif", tile)
-            tile_ds = gdal.GetDriverByName("GTiff").Create(
-                au,
-                tile.max_x - tile.min_x,
-                tile.max_y - tile.min_y,
-                1,
-                gdal.GDT_Float32,
-                options=["COMPRESS=DEFLATE"],
-            )
-            tile_ds.SetGeoTransform(tile_affine.to_gdal())
-
-            tile_band = tile_ds.GetRasterBand(1)
-            tile_band.WriteArray(allowable_uncertainty, 0, 0)
-            tile_band.SetNoDataValue(0)
-            tile_band.FlushCache()
-            tile_ds.SetProjection(ifd.projection)
-
-            tf = self._get_tmp_file("failed_uncertainty", "tif", tile)
-            tile_failed_ds = gdal.GetDriverByName("GTiff").Create(
-                tf,
-                tile.max_x - tile.min_x,
-                tile.max_y - tile.min_y,
-                1,
-                gdal.GDT_Byte,
-                options=["COMPRESS=DEFLATE"],
+            self._export(
+                self._export_tile,
+                ifd,
+                core_tile,
+                tile_affine,
+                allowable_uncertainty[tile.core_slices],
+                failed_uncertainty_uint8[tile.core_slices],
             )
-            tile_failed_ds.SetGeoTransform(tile_affine.to_gdal())
 
-            tile_failed_band = tile_failed_ds.GetRasterBand(1)
-            tile_failed_band.WriteArray(failed_uncertainty_int8, 0, 0)
-            tile_failed_band.SetNoDataValue(0)
-            tile_failed_band.FlushCache()
-            tile_failed_ds.SetProjection(ifd.projection)
+    def _export_tile(
+        self,
+        ifd: InputFileDetails,
+        tile: Tile,
+        tile_affine: Affine,
+        allowable_uncertainty,
+        failed_uncertainty_uint8,
+    ):
+        """
+        Writes the allowable uncertainty and failed cells of a tile to the
+        spatial export location as rasters and a shapefile
+        """
+        ogr_srs = osr.SpatialReference()
+        ogr_srs.ImportFromWkt(ifd.projection)
 
-            sf = self._get_tmp_file("failed_uncertainty", "shp", tile)
-            ogr_driver = ogr.GetDriverByName("ESRI Shapefile")
-            ogr_dataset = ogr_driver.CreateDataSource(sf)
-            ogr_layer = ogr_dataset.CreateLayer("failed_uncertainty", srs=ogr_srs)
+        au = self._get_tmp_file("allowable_uncertainty", "tif", tile)
+        tile_ds = gdal.GetDriverByName("GTiff").Create(
+            au,
+            tile.max_x - tile.min_x,
+            tile.max_y - tile.min_y,
+            1,
+            gdal.GDT_Float32,
+            options=["COMPRESS=DEFLATE"],
+        )
+        tile_ds.SetGeoTransform(tile_affine.to_gdal())
+
+        tile_band = tile_ds.GetRasterBand(1)
+        tile_band.WriteArray(allowable_uncertainty, 0, 0)
+        tile_band.SetNoDataValue(0)
+        tile_band.FlushCache()
+        tile_ds.SetProjection(ifd.projection)
+
+        tf = self._get_tmp_file("failed_uncertainty", "tif", tile)
+        tile_failed_ds = gdal.GetDriverByName("GTiff").Create(
+            tf,
+            tile.max_x - tile.min_x,
+            tile.max_y - tile.min_y,
+            1,
+            gdal.GDT_Byte,
+            options=["COMPRESS=DEFLATE"],
+        )
+        tile_failed_ds.SetGeoTransform(tile_affine.to_gdal())
+
+        tile_failed_band = tile_failed_ds.GetRasterBand(1)
+        tile_failed_band.WriteArray(failed_uncertainty_uint8, 0, 0)
+        tile_failed_band.SetNoDataValue(0)
+        tile_failed_band.FlushCache()
+        tile_failed_ds.SetProjection(ifd.projection)
+
+        sf = self._get_tmp_file("failed_uncertainty", "shp", tile)
+        ogr_driver = ogr.GetDriverByName("ESRI Shapefile")
+        ogr_dataset = ogr_driver.CreateDataSource(sf)
+        ogr_layer = ogr_dataset.CreateLayer("failed_uncertainty", srs=ogr_srs)
+
+        # used the input raster data 'tile_band' as the input and mask, if not
+        # used as a mask then a feature that outlines the entire dataset is
+        # also produced
+        gdal.Polygonize(
+            tile_failed_band,
+            tile_failed_band,
+            ogr_layer,
+            -1,
+            [],
+            callback=None,
+        )
 
-            # used the input raster data 'tile_band' as the input and mask, if not
-            # used as a mask then a feature that outlines the entire dataset is
-            # also produced
-            gdal.Polygonize(
-                tile_failed_band,
-                tile_failed_band,
-                ogr_layer,
-                -1,
-                [],
-                callback=None,
-            )
+        tile_ds = None
+        tile_failed_ds = None
+        ogr_dataset.Destroy()
 
-            tile_ds = None
-            tile_failed_ds = None
-            ogr_dataset.Destroy()
+        self._move_tmp_dir()
 
-            self._move_tmp_dir()
+    def get_summary(self) -> CheckSummary:
+        return CheckSummary(
+            self.execution_status,
+            failed_cell_count=self.failed_cell_count,
+            total_cell_count=self.total_cell_count,
+            failure_geometry=list(self.failure_geometry),
+        )
 
     def get_outputs(self) -> QajsonOutputs:
 
@@ -652,7 +783,8 @@ class TvuCheck(GridCheck):
             }
 
             if self.spatial_qajson:
-                data["map"] = self.tiles_geojson
+                # the failed areas are only read back into memory here
+                data["map"] = _to_multipolygon(self.failure_geometry)
                 data["extents"] = self.extents_geojson
 
         if self.execution_status == "aborted" or self.execution_status == "failed":
@@ -729,6 +861,11 @@ class ResolutionCheck(GridCheck):
         QajsonParam("Below Threshold FDS Depth Constant", 0.0),
     ]
     parameter_help_link = "user_manual_qax_MBESGC.html#mbesgc-resolution-params"
+    band_types = [BandType.depth]
+    # abs depth, piecewise conditions, and the fds and allowable grid size
+    # in double precision
+    bytes_per_pixel = 28
+    spatial_bytes_per_pixel = 12
 
     def __init__(self, input_params: List[QajsonParam]):
         super().__init__(input_params)
@@ -751,7 +888,9 @@ class ResolutionCheck(GridCheck):
             "Below Threshold FDS Depth Constant"
         )
 
-        self.tiles_geojson = MultiPolygon()
+        # polygons of the failed areas, these are spilled to disk as they
+        # accumulate over the run
+        self.failure_geometry = GeometryStore()
         self.extents_geojson = MultiPolygon()
 
         # amount of padding to place around failing pixels
@@ -764,16 +903,19 @@ class ResolutionCheck(GridCheck):
 
         self.missing_depth = False
 
-    def merge_results(self, last_check: GridCheck):
-        assert isinstance(last_check, ResolutionCheck)
-        self.start_time = last_check.start_time
+    def combine(self, other: GridCheck):
+        assert isinstance(other, ResolutionCheck)
+        super().combine(other)
+        self.missing_depth = other.missing_depth
 
-        self.total_cell_count += last_check.total_cell_count
-        self.failed_cell_count += last_check.failed_cell_count
+        self.total_cell_count += other.total_cell_count
+        self.failed_cell_count += other.failed_cell_count
 
-        self.tiles_geojson.coordinates.extend(last_check.tiles_geojson.coordinates)
-
-        self._merge_temp_dirs(last_check)
+        self.failure_geometry.extend(other.failure_geometry)
+        if len(other.extents_geojson.coordinates) > 0:
+            # extents are of the whole input file, but only set by tiles
+            # that contain data
+            self.extents_geojson = other.extents_geojson
 
     def run(
         self,
@@ -784,6 +926,7 @@ class ResolutionCheck(GridCheck):
         uncertainty,
         pinkchart,
         progress_callback=None,
+        valid=None,
     ):
         # run check on tile data
 
@@ -802,8 +945,10 @@ class ResolutionCheck(GridCheck):
         self.grid_resolution = ifd.geotransform[1]
 
         # count of all cells/nodes/pixels that are not NaN in the uncertainty
-        # array
-        self.total_cell_count = int(depth.count())
+        # array. Only the core of the tile is counted, the halo is counted by
+        # the neighbouring tiles.
+        depth, depth_valid = get_band_data(depth, valid, BandType.depth)
+        self.total_cell_count = int(np.count_nonzero(depth_valid[tile.core_slices]))
 
         # skip processing this chunk of data if it contains only nodata
         if self.total_cell_count == 0:
@@ -813,7 +958,9 @@ class ResolutionCheck(GridCheck):
         abs_depth = np.abs(depth)
         abs_threshold_depth = abs(self._threshold_depth)
 
-        # refer to docs at top of class defn, this is described there
+        # refer to docs at top of class defn, this is described there. The
+        # fds is calculated in double precision, and stored with the
+        # precision of the depth.
         fds = np.piecewise(
             abs_depth,
             [
@@ -821,34 +968,43 @@ class ResolutionCheck(GridCheck):
                 abs_depth >= abs_threshold_depth,
             ],
             [
-                lambda d: self._a_fds_depth_multiplier * d + self._a_fds_depth_constant,
-                lambda d: self._b_fds_depth_multiplier * d + self._b_fds_depth_constant,
+                lambda d: (
+                    np.multiply(self._a_fds_depth_multiplier, d, dtype=np.float64)
+                    + self._a_fds_depth_constant
+                ),
+                lambda d: (
+                    np.multiply(self._b_fds_depth_multiplier, d, dtype=np.float64)
+                    + self._b_fds_depth_constant
+                ),
             ],
         )
 
-        fds = np.ma.masked_where(np.ma.getmask(depth), fds)
-        allowable_grid_size = fds * self._fds_multiplier
+        allowable_grid_size = np.multiply(fds, self._fds_multiplier, dtype=np.float64)
 
         # The idea of the standard here is that the deeper the water gets the
         # less ability you have to pick up features on the seafloor and also
         # features become less important the deeper the water gets as under
         # keel clearance for ships becomes less of an issue.
         failed_resolution = allowable_grid_size < self.grid_resolution
-
-        failed_resolution.fill_value = False
-        failed_resolution = failed_resolution.filled()
-        failed_resolution_int8 = failed_resolution.astype(np.int8)
+        failed_resolution &= depth_valid
+        # a zero copy view of the mask, as written to the Byte rasters
+        failed_resolution_uint8 = failed_resolution.view(np.uint8)
 
         # count of cells that failed the check
-        self.failed_cell_count = int(failed_resolution.sum())
+        self.failed_cell_count = int(failed_resolution[tile.core_slices].sum())
 
         if not (self.spatial_export or self.spatial_export_location):
             # if we don't generate spatial outputs, then there's no
             # need to do any further processing
             return
 
+        # nodata of the exported allowable resolution
+        allowable_grid_size[~depth_valid] = -9999.0
+
+        # spatial outputs are generated for the core of the tile
+        core_tile = tile.core
         src_affine = Affine.from_gdal(*ifd.geotransform)
-        tile_affine = src_affine * Affine.translation(tile.min_x, tile.min_y)
+        tile_affine = src_affine * Affine.translation(core_tile.min_x, core_tile.min_y)
 
         ogr_srs = osr.SpatialReference()
         ogr_srs.ImportFromWkt(ifd.projection)
@@ -860,9 +1016,9 @@ class ResolutionCheck(GridCheck):
 
             # grow out failed pixels to make them more obvious. We've already
             # calculated the pass/fail stats so this won't impact results.
-            failed_resolution_int8_grow = self._grow_pixels(
-                failed_resolution_int8, self.pixel_growth
-            )
+            failed_resolution_uint8_grow = self._grow_pixels(
+                failed_resolution_uint8, self.pixel_growth
+            )[tile.core_slices]
 
             # simplify distance is calculated as the distance pixels are grown out
             # `ifd.geotransform[1]` is pixel size
@@ -871,15 +1027,15 @@ class ResolutionCheck(GridCheck):
 
             tile_failed_ds = gdal.GetDriverByName("MEM").Create(
                 "",
-                tile.max_x - tile.min_x,
-                tile.max_y - tile.min_y,
+                core_tile.width,
+                core_tile.height,
                 1,
                 gdal.GDT_Byte,
             )
             tile_failed_ds.SetGeoTransform(tile_affine.to_gdal())
 
             tile_failed_band = tile_failed_ds.GetRasterBand(1)
-            tile_failed_band.WriteArray(failed_resolution_int8_grow, 0, 0)
+            tile_failed_band.WriteArray(failed_resolution_uint8_grow, 0, 0)
             tile_failed_band.SetNoDataValue(0)
             tile_failed_band.FlushCache()
             tile_failed_ds.SetProjection(ifd.projection)
@@ -891,14 +1047,15 @@ class ResolutionCheck(GridCheck):
             # used the input raster data 'tile_band' as the input and mask, if not
             # used as a mask then a feature that outlines the entire dataset is
             # also produced
-            gdal.Polygonize(
-                tile_failed_band,
-                tile_failed_band,
-                ogr_layer,
-                -1,
-                [],
-                callback=None,
-            )
+            with self._stage("polygonize"):
+                gdal.Polygonize(
+                    tile_failed_band,
+                    tile_failed_band,
+                    ogr_layer,
+                    -1,
+                    [],
+                    callback=None,
+                )
 
             ogr_simple_driver = ogr.GetDriverByName("MEM")
             ogr_simple_dataset = ogr_simple_driver.CreateDataSource("failed_poly")
@@ -914,79 +1071,107 @@ class ResolutionCheck(GridCheck):
             ogr_srs_out.ImportFromEPSG(4326)
             transform = osr.CoordinateTransformation(ogr_srs, ogr_srs_out)
 
-            for feature in ogr_simple_layer:
-                # transform feature into epsg:4326 before export to geojson
-                transformed = feature.GetGeometryRef()
-                transformed.Transform(transform)
+            with self._stage("geojson"):
+                for feature in ogr_simple_layer:
+                    # transform feature into epsg:4326 before export to geojson
+                    transformed = feature.GetGeometryRef()
+                    transformed.Transform(transform)
 
-                geojson_feature = geojson.loads(feature.ExportToJson())
+                    geojson_feature = geojson.loads(feature.ExportToJson())
 
-                self.tiles_geojson.coordinates.append(
-                    geojson_feature.geometry.coordinates
-                )
+                    self.failure_geometry.append(geojson_feature.geometry.coordinates)
 
             ogr_simple_dataset.Destroy()
             ogr_dataset.Destroy()
 
         if self.spatial_export:
-            allowable_grid_size.fill_value = -9999.0
-            allowable_grid_size = allowable_grid_size.filled()
-
-            ar = self._get_tmp_file("allowable_resolution", "tif", tile)
-            tile_ds = gdal.GetDriverByName("GTiff").Create(
-                ar,
-                tile.max_x - tile.min_x,
-                tile.max_y - tile.min_y,
-                1,
-                gdal.GDT_Float32,
-                options=["COMPRESS=DEFLATE"],
+            self._export(
+                self._export_tile,
+                ifd,
+                core_tile,
+                tile_affine,
+                allowable_grid_size[tile.core_slices],
+                failed_resolution_uint8[tile.core_slices],
             )
-            tile_ds.SetGeoTransform(tile_affine.to_gdal())
-
-            tile_band = tile_ds.GetRasterBand(1)
-            tile_band.WriteArray(allowable_grid_size, 0, 0)
-            tile_band.SetNoDataValue(-9999.0)
-            tile_band.FlushCache()
-            tile_ds.SetProjection(ifd.projection)
 
-            tf = self._get_tmp_file("failed_resolution", "tif", tile)
-            tile_failed_ds = gdal.GetDriverByName("GTiff").Create(
-                tf,
-                tile.max_x - tile.min_x,
-                tile.max_y - tile.min_y,
-                1,
-                gdal.GDT_Byte,
-                options=["COMPRESS=DEFLATE"],
-            )
-            tile_failed_ds.SetGeoTransform(tile_affine.to_gdal())
-
-            tile_failed_band = tile_failed_ds.GetRasterBand(1)
-            tile_failed_band.WriteArray(failed_resolution_int8, 0, 0)
-            tile_failed_band.SetNoDataValue(0)
-            tile_failed_band.FlushCache()
-            tile_failed_ds.SetProjection(ifd.projection)
-
-            sf = self._get_tmp_file("failed_resolution", "shp", tile)
-            ogr_driver = ogr.GetDriverByName("ESRI Shapefile")
-            ogr_dataset = ogr_driver.CreateDataSource(sf)
-            ogr_layer = ogr_dataset.CreateLayer("failed_resolution", srs=ogr_srs)
-
-            # used the input raster data 'tile_band' as the input and mask, if not
-            # used as a mask then a feature that outlines the entire dataset is
-            # also produced
-            gdal.Polygonize(
-                tile_failed_band,
-                tile_failed_band,
-                ogr_layer,
-                -1,
-                [],
-                callback=None,
-            )
-            tile_ds = None
-            tile_failed_ds = None
-            ogr_dataset.Destroy()
+    def _export_tile(
+        self,
+        ifd: InputFileDetails,
+        tile: Tile,
+        tile_affine: Affine,
+        allowable_grid_size,
+        failed_resolution_uint8,
+    ):
+        """
+        Writes the allowable resolution and failed cells of a tile to the
+        spatial export location as rasters and a shapefile
+        """
+        ogr_srs = osr.SpatialReference()
+        ogr_srs.ImportFromWkt(ifd.projection)
 
-            self._move_tmp_dir()
+        ar = self._get_tmp_file("allowable_resolution", "tif", tile)
+        tile_ds = gdal.GetDriverByName("GTiff").Create(
+            ar,
+            tile.max_x - tile.min_x,
+            tile.max_y - tile.min_y,
+            1,
+            gdal.GDT_Float32,
+            options=["COMPRESS=DEFLATE"],
+        )
+        tile_ds.SetGeoTransform(tile_affine.to_gdal())
+
+        tile_band = tile_ds.GetRasterBand(1)
+        tile_band.WriteArray(allowable_grid_size, 0, 0)
+        tile_band.SetNoDataValue(-9999.0)
+        tile_band.FlushCache()
+        tile_ds.SetProjection(ifd.projection)
+
+        tf = self._get_tmp_file("failed_resolution", "tif", tile)
+        tile_failed_ds = gdal.GetDriverByName("GTiff").Create(
+            tf,
+            tile.max_x - tile.min_x,
+            tile.max_y - tile.min_y,
+            1,
+            gdal.GDT_Byte,
+            options=["COMPRESS=DEFLATE"],
+        )
+        tile_failed_ds.SetGeoTransform(tile_affine.to_gdal())
+
+        tile_failed_band = tile_failed_ds.GetRasterBand(1)
+        tile_failed_band.WriteArray(failed_resolution_uint8, 0, 0)
+        tile_failed_band.SetNoDataValue(0)
+        tile_failed_band.FlushCache()
+        tile_failed_ds.SetProjection(ifd.projection)
+
+        sf = self._get_tmp_file("failed_resolution", "shp", tile)
+        ogr_driver = ogr.GetDriverByName("ESRI Shapefile")
+        ogr_dataset = ogr_driver.CreateDataSource(sf)
+        ogr_layer = ogr_dataset.CreateLayer("failed_resolution", srs=ogr_srs)
+
+        # used the input raster data 'tile_band' as the input and mask, if not
+        # used as a mask then a feature that outlines the entire dataset is
+        # also produced
+        gdal.Polygonize(
+            tile_failed_band,
+            tile_failed_band,
+            ogr_layer,
+            -1,
+            [],
+            callback=None,
+        )
+        tile_ds = None
+        tile_failed_ds = None
+        ogr_dataset.Destroy()
+
+        self._move_tmp_dir()
+
+    def get_summary(self) -> CheckSummary:
+        return CheckSummary(
+            self.execution_status,
+            failed_cell_count=self.failed_cell_count,
+            total_cell_count=self.total_cell_count,
+            failure_geometry=list(self.failure_geometry),
+        )
 
     def get_outputs(self) -> QajsonOutputs:
 
@@ -1020,7 +1205,8 @@ class ResolutionCheck(GridCheck):
             }
 
             if self.spatial_qajson:
-                data["map"] = self.tiles_geojson
+                # the failed areas are only read back into memory here
+                data["map"] = _to_multipolygon(self.failure_geometry)
                 data["extents"] = self.extents_geojson
 
         if self.execution_status == "aborted" or self.execution_status == "failed":
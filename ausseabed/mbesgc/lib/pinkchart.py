@@ -9,6 +9,7 @@ from osgeo import ogr
 from osgeo import osr
 from typing import List
 
+from .gdalconfig import GdalConfig
 from .tiling import get_tiles
 
 logger = logging.getLogger(__name__)
@@ -68,6 +69,7 @@ class PinkChartProcessor:
         source_pinkchart: Path,
         output_rasters: List[Path],
         output_pinkchart_raster: Path,
+        gdal_config: GdalConfig | None = None,
     ) -> None:
         """
         Requires a paths to `source_rasters` that includes the bathymetry data, more
@@ -80,6 +82,7 @@ class PinkChartProcessor:
         source raster has been aligned with the rasterised version of the pinkchart.
         The `output_pinkchart_raster` is path to where a rasterised version of the
         pink chart will be created.
+        The `gdal_config` settings are applied while processing.
         """
         self.raster_files = source_rasters
         self.output_raster_files = output_rasters
@@ -93,6 +96,8 @@ class PinkChartProcessor:
 
         self.geotransform: list[float] | None = None
 
+        self.gdal_config = GdalConfig() if gdal_config is None else gdal_config
+
     def _calc_ideal_value(
         self, res: float, source_val: float, target_val: float, is_min: bool
     ) -> float:
@@ -204,14 +209,18 @@ class PinkChartProcessor:
             aband: gdal.Band = out_raster.GetRasterBand(band_index)
             aband.SetNoDataValue(nodata)
 
+        warp_options = self.gdal_config.get_warp_options()
         if cutline_dataset_name is None or cutline_layer_name is None:
-            options = gdal.WarpOptions(srcNodata=nodata, dstNodata=nodata)
+            options = gdal.WarpOptions(
+                srcNodata=nodata, dstNodata=nodata, **warp_options
+            )
         else:
             options = gdal.WarpOptions(
                 srcNodata=nodata,
                 dstNodata=nodata,
                 cutlineDSName=cutline_dataset_name,
                 cutlineLayer=cutline_layer_name,
+                **warp_options,
             )
         gdal.Warp(out_raster, source, options=options)
 
@@ -229,6 +238,10 @@ class PinkChartProcessor:
         versions of the source raster data that lines up with the pinkchart
         raster
         """
+        with self.gdal_config.applied():
+            self._process()
+
+    def _process(self) -> None:
         # Open up one of the source raster files to get some details about the
         # dataset, we use these later to calculate extents for the pinkchart raster
         # that align with this raster
@@ -0,0 +1,319 @@
+"""
+Timing of the stages involved in running the checks, used to identify where
+the time is spent processing a grid. Optionally the peak memory used by each
+stage is also recorded, used to identify the tiles and checks that drive the
+memory requirements of a run.
+"""
+
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows
+    resource = None  # type: ignore
+
+
+def get_rss() -> int | None:
+    """
+    Gets the current resident set size (in bytes) of this process. Returns
+    None if it can't be determined on this platform.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def get_peak_rss() -> int | None:
+    """
+    Gets the largest resident set size (in bytes) this process has reached.
+    Returns None if it can't be determined on this platform.
+    """
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # reported in bytes on macOS, and kilobytes everywhere else
+    if sys.platform == "darwin":
+        return max_rss
+    return max_rss * 1024
+
+
+class StageTiming:
+    """
+    The number of times a stage was run, and the time it took. If memory is
+    tracked the peak memory of the single largest run of the stage is
+    recorded, along with the tile it was run on.
+    """
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.memory_tracked = False
+        # largest amount of memory traced by tracemalloc during a run of
+        # this stage, this includes the memory allocated before the stage
+        # started that was still in use
+        self.peak_traced = 0
+        self.peak_tile: str | None = None
+        # largest resident set size of the process during a run of this stage
+        self.peak_rss = 0
+
+    def add(self, seconds: float, count: int = 1) -> None:
+        self.count += count
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def add_memory(self, traced: int, rss: int | None, tile: str | None) -> None:
+        self.memory_tracked = True
+        if traced > self.peak_traced:
+            self.peak_traced = traced
+            self.peak_tile = tile
+        if rss is not None:
+            self.peak_rss = max(self.peak_rss, rss)
+
+    def merge(self, other: "StageTiming") -> None:
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        if other.memory_tracked:
+            self.add_memory(other.peak_traced, other.peak_rss, other.peak_tile)
+
+    def to_dict(self) -> Dict[str, Any]:
+        timing: Dict[str, Any] = {
+            "count": self.count,
+            "total": self.total,
+            "mean": self.total / self.count if self.count > 0 else 0.0,
+            "max": self.max,
+        }
+        if self.memory_tracked:
+            timing["peak_traced"] = self.peak_traced
+            timing["peak_rss"] = self.peak_rss
+            timing["peak_tile"] = self.peak_tile
+        return timing
+
+
+class _MemoryFrame:
+    """Memory tracking state of a stage that is in progress"""
+
+    def __init__(self, peak_rss: int | None) -> None:
+        # peak traced memory of the nested stages that have completed,
+        # tracemalloc's peak is reset at the start of each nested stage
+        self.carried_peak = 0
+        self.start_peak_rss = peak_rss
+
+
+class RunStats:
+    """
+    Accumulates the wall clock time spent in each named stage of a run. Most
+    stages are run once per tile (eg; loading the data), or once per tile
+    for each check (eg; `Density Check/polygonize`), so the `max` of a stage
+    is the time taken by the slowest tile.
+
+    If `track_memory` is set, and tracemalloc is tracing, the peak memory of
+    the stages that are given a tile is also recorded. Two measures are
+    recorded as neither one is complete; tracemalloc traces the memory
+    allocated by Python and numpy (but not GDAL), while the resident set
+    size includes all memory but can only be sampled when a stage ends, or
+    when the process reaches a new peak. Both measures are for the whole
+    process, and the traced peak is reset as each stage starts. So memory
+    should only be tracked when the stages are run by a single thread, when
+    stages run at the same time on different threads (as in the pipeline)
+    their peaks are cut short by each other.
+
+    Counts of the work done (eg; the number of bytes read) are also
+    accumulated, these can be divided by the time of a stage to give its
+    throughput.
+
+    Stages may be timed from multiple threads at once. The stats collected by
+    worker processes are merged into those of the executor with `merge`.
+    """
+
+    def __init__(self, track_memory: bool = False) -> None:
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.track_memory = track_memory
+        self.stages: Dict[str, StageTiming] = {}
+        self.counters: Dict[str, int] = {}
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        del state["_lock"]
+        del state["_local"]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @contextmanager
+    def stage(self, name: str, tile: Any = None) -> Iterator[None]:
+        """
+        Context manager that adds the time taken by its body to a stage. The
+        memory used by the stage is recorded if a tile is given.
+        """
+        track_memory = (
+            tile is not None and self.track_memory and tracemalloc.is_tracing()
+        )
+        if track_memory:
+            self._start_memory()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+            if track_memory:
+                self._end_memory(name, str(tile))
+
+    def _memory_frames(self) -> List[_MemoryFrame]:
+        frames = getattr(self._local, "frames", None)
+        if frames is None:
+            frames = []
+            self._local.frames = frames
+        return frames
+
+    def _start_memory(self) -> None:
+        frames = self._memory_frames()
+        if len(frames) > 0:
+            # keep the peak the enclosing stage has reached so far, as it's
+            # about to be reset
+            _, peak = tracemalloc.get_traced_memory()
+            frames[-1].carried_peak = max(frames[-1].carried_peak, peak)
+        tracemalloc.reset_peak()
+        frames.append(_MemoryFrame(get_peak_rss()))
+
+    def _end_memory(self, name: str, tile: str) -> None:
+        frames = self._memory_frames()
+        frame = frames.pop()
+        _, peak = tracemalloc.get_traced_memory()
+        peak = max(peak, frame.carried_peak)
+        if len(frames) > 0:
+            frames[-1].carried_peak = max(frames[-1].carried_peak, peak)
+
+        rss = get_rss()
+        peak_rss = get_peak_rss()
+        if (
+            peak_rss is not None
+            and frame.start_peak_rss is not None
+            and peak_rss > frame.start_peak_rss
+        ):
+            # the process reached a new peak during this stage
+            rss = max(rss or 0, peak_rss)
+
+        with self._lock:
+            self.stages[name].add_memory(peak, rss, tile)
+
+    def add(self, name: str, seconds: float) -> None:
+        with self._lock:
+            timing = self.stages.get(name)
+            if timing is None:
+                timing = StageTiming()
+                self.stages[name] = timing
+            timing.add(seconds)
+
+    def count(self, name: str, value: int = 1) -> None:
+        """Adds to the count of some work done during the run"""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def merge(self, other: "RunStats") -> None:
+        with self._lock:
+            for name, value in other.counters.items():
+                self.counters[name] = self.counters.get(name, 0) + value
+            for name, other_timing in other.stages.items():
+                timing = self.stages.get(name)
+                if timing is None:
+                    timing = StageTiming()
+                    self.stages[name] = timing
+                timing.merge(other_timing)
+
+    def get_peak_memory(self) -> Dict[str, Any] | None:
+        """
+        Gets the stage and tile that used the most memory, or None if memory
+        was not tracked. As stages are nested (eg; `Density Check/run`
+        includes `Density Check/polygonize`) the innermost stage that reached
+        the peak is given. The name of a check's stages starts with the name
+        of the check, so this identifies the check that drove the peak.
+        """
+        with self._lock:
+            tracked = [
+                (name, timing)
+                for name, timing in self.stages.items()
+                if timing.memory_tracked
+            ]
+        if len(tracked) == 0:
+            return None
+        # longest name first, so the innermost stage is found when the
+        # peaks are equal
+        tracked.sort(key=lambda item: len(item[0]), reverse=True)
+        name, timing = max(tracked, key=lambda item: item[1].peak_traced)
+        return {
+            "stage": name,
+            "tile": timing.peak_tile,
+            "traced": timing.peak_traced,
+            "rss": max(t.peak_rss for _, t in tracked),
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            stats: Dict[str, Any] = {
+                "stages": {
+                    name: timing.to_dict() for name, timing in self.stages.items()
+                }
+            }
+            if len(self.counters) > 0:
+                stats["counters"] = dict(self.counters)
+        peak_memory = self.get_peak_memory()
+        if peak_memory is not None:
+            stats["peak_memory"] = peak_memory
+        return stats
+
+    def format_table(self) -> str:
+        """Formats the stage timings as a table, slowest stage first"""
+        with self._lock:
+            stages = sorted(
+                self.stages.items(), key=lambda item: item[1].total, reverse=True
+            )
+            counters = sorted(self.counters.items())
+        memory_tracked = any(timing.memory_tracked for _, timing in stages)
+        name_width = max([len("stage")] + [len(name) for name, _ in stages])
+        header = (
+            f"{'stage':<{name_width}}  {'count':>7}  {'total (s)':>10}  "
+            f"{'mean (s)':>10}  {'max (s)':>10}"
+        )
+        if memory_tracked:
+            header += f"  {'traced (MB)':>12}  {'rss (MB)':>10}"
+        lines = [header]
+        for name, timing in stages:
+            timing_dict = timing.to_dict()
+            line = (
+                f"{name:<{name_width}}  {timing.count:>7}  {timing.total:>10.3f}  "
+                f"{timing_dict['mean']:>10.3f}  {timing.max:>10.3f}"
+            )
+            if timing.memory_tracked:
+                line += (
+                    f"  {timing.peak_traced / 1e6:>12.1f}  "
+                    f"{timing.peak_rss / 1e6:>10.1f}"
+                )
+            lines.append(line)
+
+        for name, value in counters:
+            lines.append(f"{name}: {value}")
+
+        peak_memory = self.get_peak_memory()
+        if peak_memory is not None:
+            lines.append(
+                f"peak memory of {peak_memory['traced'] / 1e6:.1f} MB (traced) "
+                f"in {peak_memory['stage']} of tile {peak_memory['tile']}, "
+                f"peak rss {peak_memory['rss'] / 1e6:.1f} MB"
+            )
+        return "\n".join(lines)
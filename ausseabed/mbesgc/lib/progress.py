@@ -0,0 +1,188 @@
+"""
+Tracking of the work done by a run, used to report throughput and estimate
+the time remaining
+"""
+
+from typing import Any, Dict
+import threading
+import time
+
+
+class ProgressInfo:
+    """
+    Extended progress of a run, passed to the progress info callback of the
+    Executor. The `progress` is the same value (between 0 and 1) that is given
+    to the float progress callback.
+    """
+
+    def __init__(
+        self,
+        progress: float,
+        tiles_done: int,
+        tiles_total: int,
+        pixels_done: int,
+        pixels_total: int,
+        bytes_read: int,
+        elapsed: float,
+        pixels_per_second: float | None,
+        bytes_per_second: float | None,
+        eta: float | None,
+    ):
+        self.progress = progress
+        self.tiles_done = tiles_done
+        self.tiles_total = tiles_total
+        self.pixels_done = pixels_done
+        self.pixels_total = pixels_total
+        self.bytes_read = bytes_read
+        # seconds since the run started
+        self.elapsed = elapsed
+        # smoothed throughput of the recently completed tiles, None until the
+        # first tile is completed
+        self.pixels_per_second = pixels_per_second
+        self.bytes_per_second = bytes_per_second
+        # estimated seconds until all tiles are completed, None if not known
+        self.eta = eta
+
+    @property
+    def mpix_per_second(self) -> float | None:
+        if self.pixels_per_second is None:
+            return None
+        return self.pixels_per_second / 1e6
+
+    @property
+    def mb_per_second(self) -> float | None:
+        if self.bytes_per_second is None:
+            return None
+        return self.bytes_per_second / 1e6
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "progress": self.progress,
+            "tiles_done": self.tiles_done,
+            "tiles_total": self.tiles_total,
+            "pixels_done": self.pixels_done,
+            "pixels_total": self.pixels_total,
+            "bytes_read": self.bytes_read,
+            "elapsed": self.elapsed,
+            "pixels_per_second": self.pixels_per_second,
+            "bytes_per_second": self.bytes_per_second,
+            "eta": self.eta,
+        }
+
+    def __str__(self) -> str:
+        parts = [f"{self.tiles_done}/{self.tiles_total} tiles"]
+        if self.mpix_per_second is not None and self.mb_per_second is not None:
+            parts.append(f"{self.mpix_per_second:.2f} MPix/s")
+            parts.append(f"{self.mb_per_second:.2f} MB/s")
+        if self.eta is not None:
+            minutes, seconds = divmod(int(round(self.eta)), 60)
+            hours, minutes = divmod(minutes, 60)
+            parts.append(f"eta {hours:02d}:{minutes:02d}:{seconds:02d}")
+        return ", ".join(parts)
+
+
+class ProgressTracker:
+    """
+    Tracks the tiles, pixels, and bytes completed by a run. The throughput is
+    smoothed with an exponential moving average of the pixels (and bytes)
+    completed and the time taken between completed tiles. Averaging the
+    amounts and times separately (rather than averaging the rate of each
+    tile) keeps the rate steady when tiles complete in bursts, as they do
+    when processed by multiple workers.
+
+    Tiles are added to the total as the input files are planned, the time
+    remaining is only estimated once all input files have been planned.
+    """
+
+    def __init__(self, smoothing: float = 0.2):
+        # weight given to the most recently completed tile
+        self.smoothing = smoothing
+        self._lock = threading.Lock()
+        self.start()
+
+    def start(self) -> None:
+        """Resets the tracker for the start of a run"""
+        self.tiles_done = 0
+        self.tiles_total = 0
+        self.pixels_done = 0
+        self.pixels_total = 0
+        self.bytes_read = 0
+        # set once the tiles of all input files have been added to the totals
+        self.total_known = False
+        self._start_time = time.perf_counter()
+        self._last_time = self._start_time
+        self._avg_pixels: float | None = None
+        self._avg_bytes = 0.0
+        self._avg_seconds = 0.0
+
+    def add_planned(
+        self,
+        tile_count: int,
+        pixel_count: int,
+        tiles_done: int = 0,
+        pixels_done: int = 0,
+    ) -> None:
+        """
+        Adds the planned tiles of an input file to the totals. Tiles already
+        completed by a run that's being resumed are included in the done
+        counts, but not in the throughput.
+        """
+        with self._lock:
+            if self._avg_pixels is None:
+                # no tiles have been completed yet, so the time taken by the
+                # first tile is measured from when its file was planned
+                self._last_time = time.perf_counter()
+            self.tiles_total += tile_count
+            self.pixels_total += pixel_count
+            self.tiles_done += tiles_done
+            self.pixels_done += pixels_done
+
+    def tile_done(self, pixel_count: int, bytes_read: int) -> None:
+        """Records a completed tile"""
+        with self._lock:
+            now = time.perf_counter()
+            seconds = now - self._last_time
+            self._last_time = now
+            self.tiles_done += 1
+            self.pixels_done += pixel_count
+            self.bytes_read += bytes_read
+
+            if self._avg_pixels is None:
+                self._avg_pixels = float(pixel_count)
+                self._avg_bytes = float(bytes_read)
+                self._avg_seconds = seconds
+            else:
+                a = self.smoothing
+                self._avg_pixels = a * pixel_count + (1 - a) * self._avg_pixels
+                self._avg_bytes = a * bytes_read + (1 - a) * self._avg_bytes
+                self._avg_seconds = a * seconds + (1 - a) * self._avg_seconds
+
+    @property
+    def fraction(self) -> float:
+        """Fraction of the planned pixels that have been completed"""
+        if self.pixels_total == 0:
+            return 0.0
+        return self.pixels_done / self.pixels_total
+
+    def get_info(self, progress: float) -> ProgressInfo:
+        with self._lock:
+            pixels_per_second = None
+            bytes_per_second = None
+            eta = None
+            if self._avg_pixels is not None and self._avg_seconds > 0:
+                pixels_per_second = self._avg_pixels / self._avg_seconds
+                bytes_per_second = self._avg_bytes / self._avg_seconds
+                if self.total_known and pixels_per_second > 0:
+                    eta = (self.pixels_total - self.pixels_done) / pixels_per_second
+            return ProgressInfo(
+                progress=progress,
+                tiles_done=self.tiles_done,
+                tiles_total=self.tiles_total,
+                pixels_done=self.pixels_done,
+                pixels_total=self.pixels_total,
+                bytes_read=self.bytes_read,
+                elapsed=time.perf_counter() - self._start_time,
+                pixels_per_second=pixels_per_second,
+                bytes_per_second=bytes_per_second,
+                eta=eta,
+            )
@@ -0,0 +1,138 @@
+"""
+Scheduling of tiles across workers by their estimated processing cost
+
+The time taken to process a tile varies by orders of magnitude. A tile of
+nodata is skipped, a tile where all nodes pass is read and compared, while a
+tile full of failures also has its failed areas grown, polygonized,
+simplified, and exported. When tiles are processed by a number of workers
+in the order they were planned, a costly tile handed out near the end of the
+run leaves the other workers idle while it completes. Handing out the tiles
+estimated to be the most costly first (longest processing time first) keeps
+all workers busy until the end of the run.
+"""
+
+from typing import Dict, List, Tuple
+import json
+import logging
+import os
+
+from .tiling import Tile
+
+logger = logging.getLogger(__name__)
+
+# `planned` hands out tiles in the order they were planned (see TILE_ORDERS),
+# `cost` hands out the tiles with the largest estimated cost first
+TILE_SCHEDULES = ["planned", "cost"]
+
+# relative cost per pixel of reading a tile, of running the checks over each
+# valid pixel, of growing the failed pixels (when spatial outputs are
+# generated), and of the polygonizing, simplification, and export of each
+# failed pixel
+READ_COST = 1.0
+CHECK_COST = 1.0
+GROW_COST = 4.0
+FAILURE_COST = 50.0
+
+# fraction of the pixels of a tile assumed to fail when it's not known
+DEFAULT_FAILED_FRACTION = 0.0
+
+# maximum size (in pixels) of the decimated read of a tile used to probe the
+# fraction of its pixels that fail the checks
+PROBE_SIZE = 64
+
+
+def estimate_tile_cost(
+    tile: Tile,
+    valid_fraction: float,
+    failed_fraction: float | None,
+    spatial: bool,
+) -> float:
+    """
+    Estimates the relative cost of processing a tile from the fraction of its
+    pixels that are valid (not nodata), and the fraction that fail the
+    checks. The failures only add to the cost when spatial outputs are
+    generated. The cost is of the core of the tile, as the results (and
+    progress) of a tile only include its core.
+    """
+    pixel_count = tile.core_pixel_count
+    if valid_fraction <= 0:
+        # tiles of only nodata are skipped without being read
+        return 0.0
+    if failed_fraction is None:
+        failed_fraction = DEFAULT_FAILED_FRACTION
+    cost = READ_COST + valid_fraction * CHECK_COST
+    if spatial:
+        cost += valid_fraction * GROW_COST + failed_fraction * FAILURE_COST
+    return pixel_count * cost
+
+
+def get_schedule(costs: List[float]) -> List[int]:
+    """
+    Gets the order the tiles are handed out in, as indexes into `costs`. The
+    most costly tiles are first, tiles of the same cost are kept in the order
+    they were planned.
+    """
+    return sorted(range(len(costs)), key=lambda i: -costs[i])
+
+
+def _tile_key(tile: Tile) -> str:
+    return f"{tile.min_x},{tile.min_y},{tile.max_x},{tile.max_y}"
+
+
+class CostHistory:
+    """
+    The fraction of valid and failed pixels of each tile found by past runs,
+    by input and tile. These are exact, so are used in place of the
+    estimates of a probe for tiles that have been processed before. Tiles
+    are identified by their window, so the history is not used when the tile
+    size changes.
+    """
+
+    def __init__(self) -> None:
+        # tile signals (valid fraction, failed fraction) by input, then tile
+        self._inputs: Dict[str, Dict[str, Tuple[float, float]]] = {}
+
+    @classmethod
+    def load(cls, path: str) -> "CostHistory":
+        """
+        Loads the history saved to `path`, a missing or unreadable file gives
+        an empty history
+        """
+        history = cls()
+        if not os.path.exists(path):
+            return history
+        try:
+            with open(path) as f:
+                inputs = json.load(f)
+            history._inputs = {
+                input_key: {
+                    tile_key: (float(valid), float(failed))
+                    for tile_key, (valid, failed) in tiles.items()
+                }
+                for input_key, tiles in inputs.items()
+            }
+        except (OSError, ValueError, TypeError) as e:
+            logger.warning(f"Ignoring tile cost history {path}: {e}")
+        return history
+
+    def save(self, path: str) -> None:
+        # written to a temporary file first so that a failed write does not
+        # lose the previous history
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._inputs, f)
+        os.replace(tmp_path, path)
+
+    def get(self, input_key: str, tile: Tile) -> Tuple[float, float] | None:
+        """Gets the valid and failed fraction of a tile, if it's been recorded"""
+        return self._inputs.get(input_key, {}).get(_tile_key(tile))
+
+    def record(
+        self,
+        input_key: str,
+        tile: Tile,
+        valid_fraction: float,
+        failed_fraction: float,
+    ) -> None:
+        tiles = self._inputs.setdefault(input_key, {})
+        tiles[_tile_key(tile)] = (valid_fraction, failed_fraction)
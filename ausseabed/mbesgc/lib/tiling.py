@@ -1,14 +1,40 @@
 from affine import Affine
 from geojson import Polygon
 from osgeo import osr
+from typing import List, Tuple
+import math
 
 
 class Tile:
-    def __init__(self, min_x, min_y, max_x, max_y):
+    """
+    A window of pixels within a raster. The min and max values are the read
+    window, the extents of the data loaded for the tile. A tile may also have
+    a smaller core window; the pixels between the core and read windows (the
+    halo) are included so that neighbourhood operations near the edge of the
+    core give the same result as they would with a larger tile. The results
+    for a tile only include the core, as the halo is part of the core of the
+    neighbouring tiles. By default the core is the whole read window.
+    """
+
+    def __init__(
+        self,
+        min_x,
+        min_y,
+        max_x,
+        max_y,
+        core_min_x=None,
+        core_min_y=None,
+        core_max_x=None,
+        core_max_y=None,
+    ):
         self.min_x = min_x
         self.min_y = min_y
         self.max_x = max_x
         self.max_y = max_y
+        self.core_min_x = min_x if core_min_x is None else core_min_x
+        self.core_min_y = min_y if core_min_y is None else core_min_y
+        self.core_max_x = max_x if core_max_x is None else core_max_x
+        self.core_max_y = max_y if core_max_y is None else core_max_y
 
     @property
     def width(self):
@@ -18,6 +44,38 @@ class Tile:
     def height(self):
         return self.max_y - self.min_y
 
+    @property
+    def core_width(self):
+        return self.core_max_x - self.core_min_x
+
+    @property
+    def core_height(self):
+        return self.core_max_y - self.core_min_y
+
+    @property
+    def core_pixel_count(self) -> int:
+        return self.core_width * self.core_height
+
+    @property
+    def has_halo(self) -> bool:
+        return (self.core_width, self.core_height) != (self.width, self.height)
+
+    @property
+    def core(self) -> "Tile":
+        """Gets the core window of this tile as a tile without a halo"""
+        return Tile(self.core_min_x, self.core_min_y, self.core_max_x, self.core_max_y)
+
+    @property
+    def core_slices(self) -> Tuple[slice, slice]:
+        """
+        Gets the slices (rows, columns) that select the core window from the
+        data loaded for the read window
+        """
+        return (
+            slice(self.core_min_y - self.min_y, self.core_max_y - self.min_y),
+            slice(self.core_min_x - self.min_x, self.core_max_x - self.min_x),
+        )
+
     def to_geojson(self, projection, geotransform):
         fwd = Affine.from_gdal(*geotransform)
 
@@ -49,14 +107,29 @@ class Tile:
         return Polygon(coordinates=coordinates)
 
     def __repr__(self):
-        return f"({self.min_x}, {self.min_y}) ({self.max_x}, {self.max_y})"
+        window = f"({self.min_x}, {self.min_y}) ({self.max_x}, {self.max_y})"
+        if not self.has_halo:
+            return window
+        return (
+            f"{window} core ({self.core_min_x}, {self.core_min_y}) "
+            f"({self.core_max_x}, {self.core_max_y})"
+        )
 
 
-def get_tiles(min_x, min_y, max_x, max_y, size_x, size_y):
+def get_tiles(min_x, min_y, max_x, max_y, size_x, size_y, halo=0):
     """
     Breaks the given extents down into a number of tiles based on a tile size.
     Edge tiles will have a smaller dimension if the extents are not divisible
     by the size.
+
+    If a halo is given the tile size is the size of the core of each tile,
+    and the read window of each tile extends `halo` pixels beyond its core
+    (without going beyond the extents). Only the cores of the tiles are
+    aligned to the block layout of the raster. The halo of a read window
+    reaches into the neighbouring blocks, so the blocks along the edges of
+    each tile are read (and decompressed) by both of the tiles that share
+    the edge. This is the cost of the checks giving the same results at tile
+    edges, so the halo should be kept as small as the checks allow.
     """
     assert min_x < max_x
     assert min_y < max_y
@@ -77,7 +150,173 @@ def get_tiles(min_x, min_y, max_x, max_y, size_x, size_y):
         for x in range(int(min_x), int(max_x), int(size_x)):
             next_x = x + int(size_x)
             next_x = max_x if next_x > max_x else next_x
-            tile = Tile(x, y, next_x, next_y)
+            tile = Tile(
+                max(x - halo, min_x),
+                max(y - halo, min_y),
+                min(next_x + halo, max_x),
+                min(next_y + halo, max_y),
+                x,
+                y,
+                next_x,
+                next_y,
+            )
             tiles.append(tile)
 
     return tiles
+
+
+# orders the tiles of a raster can be processed in
+TILE_ORDERS = ["auto", "rows", "hilbert", "zorder"]
+
+
+def get_tile_order(raster_size_x: int, block_sizes: List[Tuple[int, int]]) -> str:
+    """
+    Gets the order tiles should be processed in for the block layout of the
+    bands that will be read.
+
+    Striped rasters (blocks that span the full raster width) are processed a
+    row of tiles at a time, so all tiles that read a strip are processed
+    together while the strip is in GDAL's block cache. Tiled rasters are
+    processed in Hilbert curve order, so blocks that are shared by
+    neighbouring tiles (above and below, as well as left and right) are
+    likely to still be cached when the neighbouring tile is read.
+    """
+    if len(block_sizes) > 0 and all(bx >= raster_size_x for bx, _ in block_sizes):
+        return "rows"
+    return "hilbert"
+
+
+def _hilbert_index(n: int, x: int, y: int) -> int:
+    """
+    Gets the distance along the Hilbert curve that fills a n by n grid (n is
+    a power of 2) of the cell at x, y
+    """
+    d = 0
+    s = n // 2
+    while s > 0:
+        rx = 1 if (x & s) > 0 else 0
+        ry = 1 if (y & s) > 0 else 0
+        d += s * s * ((3 * rx) ^ ry)
+        # rotate the quadrant so the curve is continuous
+        if ry == 0:
+            if rx == 1:
+                x = n - 1 - x
+                y = n - 1 - y
+            x, y = y, x
+        s //= 2
+    return d
+
+
+def _zorder_index(x: int, y: int) -> int:
+    """Interleaves the bits of x and y to get the Z-order (Morton) index"""
+    d = 0
+    bit = 0
+    while (x >> bit) > 0 or (y >> bit) > 0:
+        d |= ((x >> bit) & 1) << (2 * bit)
+        d |= ((y >> bit) & 1) << (2 * bit + 1)
+        bit += 1
+    return d
+
+
+def order_tiles(tiles: List[Tile], order: str) -> List[Tile]:
+    """
+    Orders a grid of tiles (as returned by `get_tiles`). The order is one of
+    `rows` (row by row, as returned by `get_tiles`), `hilbert`, or `zorder`.
+    """
+    if order == "rows":
+        return list(tiles)
+    if order not in ("hilbert", "zorder"):
+        raise ValueError(f"Unknown tile order ({order})")
+
+    # position of each tile in the grid of tiles
+    columns = {x: i for i, x in enumerate(sorted({t.core_min_x for t in tiles}))}
+    rows = {y: i for i, y in enumerate(sorted({t.core_min_y for t in tiles}))}
+
+    def grid_position(tile: Tile) -> Tuple[int, int]:
+        return columns[tile.core_min_x], rows[tile.core_min_y]
+
+    if order == "hilbert":
+        n = 1
+        while n < max(len(columns), len(rows)):
+            n *= 2
+        return sorted(tiles, key=lambda tile: _hilbert_index(n, *grid_position(tile)))
+    return sorted(tiles, key=lambda tile: _zorder_index(*grid_position(tile)))
+
+
+def get_aligned_tile_size(
+    size_x: int,
+    size_y: int,
+    raster_size_x: int,
+    raster_size_y: int,
+    block_sizes: List[Tuple[int, int]],
+) -> Tuple[int, int]:
+    """
+    Adjusts a tile size so that tile edges fall on the block boundaries of
+    all the bands that will be read. As tiles start at the raster origin,
+    tiles that are a multiple of the block size also start on a block
+    boundary, so each block is only decoded by the one tile that contains it.
+
+    For striped rasters (blocks that span the full raster width) the tiles
+    are made full width, keeping roughly the same number of pixels per tile.
+    If the bands have mismatched block sizes whose common multiple is larger
+    than the tile, the tile is aligned to the largest block size instead. The
+    requested size is kept for any dimension where the blocks are larger
+    than the tile.
+    """
+    if len(block_sizes) == 0:
+        return size_x, size_y
+
+    # blocks that cover the full width of the raster are treated as being
+    # exactly the raster width
+    block_xs = [min(bx, raster_size_x) for bx, _ in block_sizes]
+    block_ys = [min(by, raster_size_y) for _, by in block_sizes]
+
+    if all(bx == raster_size_x for bx in block_xs):
+        # striped raster, a tile that doesn't span the full width would
+        # decode each strip once for every tile across the raster
+        strip_y = math.lcm(*block_ys)
+        tile_rows = (size_x * size_y) // raster_size_x
+        tile_rows = max(strip_y, tile_rows // strip_y * strip_y)
+        return raster_size_x, min(tile_rows, raster_size_y)
+
+    def align(size: int, raster_size: int, blocks: List[int]) -> int:
+        common = math.lcm(*blocks)
+        if common > size:
+            # mismatched blocks, align to the largest block that fits
+            common = max(blocks)
+        if common > size:
+            return size
+        return min(size // common * common, raster_size)
+
+    return (
+        align(size_x, raster_size_x, block_xs),
+        align(size_y, raster_size_y, block_ys),
+    )
+
+
+def get_budget_tile_size(
+    size_x: int,
+    size_y: int,
+    raster_size_x: int,
+    raster_size_y: int,
+    max_pixels: int,
+) -> Tuple[int, int]:
+    """
+    Gets the largest tile size, no larger than the given size, that contains
+    at most `max_pixels` pixels. If the tile already spans the full width (or
+    height) of the raster it is kept that way and only the other dimension is
+    reduced, otherwise the tile keeps its aspect ratio.
+    """
+    size_x = min(size_x, raster_size_x)
+    size_y = min(size_y, raster_size_y)
+    max_pixels = max(1, max_pixels)
+    if size_x * size_y <= max_pixels:
+        return size_x, size_y
+
+    if size_x == raster_size_x and size_x <= max_pixels:
+        return size_x, max_pixels // size_x
+    if size_y == raster_size_y and size_y <= max_pixels:
+        return max_pixels // size_y, size_y
+
+    scale = math.sqrt(max_pixels / (size_x * size_y))
+    return max(1, int(size_x * scale)), max(1, int(size_y * scale))
@@ -0,0 +1,59 @@
+import numpy as np
+import unittest
+
+from ausseabed.mbesgc.lib.buffers import BufferArena
+
+
+class TestBufferArena(unittest.TestCase):
+    def test_buffers_reused(self):
+        arena = BufferArena()
+        lease = arena.lease()
+        a = lease.acquire((4, 5), np.float32)
+        b = lease.acquire((4, 5), bool)
+        self.assertEqual(a.shape, (4, 5))
+        self.assertEqual(a.dtype, np.float32)
+        self.assertEqual(b.dtype, bool)
+        self.assertEqual(arena.allocated_bytes, 4 * 5 * 4 + 4 * 5)
+        lease.release()
+        self.assertEqual(arena.free_count, 2)
+
+        # a smaller array is a view of the same buffer
+        lease = arena.lease()
+        c = lease.acquire((3, 5), np.float32)
+        self.assertTrue(np.shares_memory(a, c))
+        self.assertTrue(c.flags.c_contiguous)
+        self.assertEqual(arena.allocated_bytes, 4 * 5 * 4 + 4 * 5)
+
+        # buffers that are leased are not handed out again
+        d = arena.lease().acquire((3, 5), np.float32)
+        self.assertFalse(np.shares_memory(c, d))
+        lease.release()
+
+    def test_buffers_grow(self):
+        arena = BufferArena()
+        lease = arena.lease()
+        lease.acquire((2, 2), np.float32)
+        lease.release()
+
+        lease = arena.lease()
+        a = lease.acquire((10, 10), np.float32)
+        self.assertEqual(a.shape, (10, 10))
+        # the smaller buffer is replaced, not kept alongside the larger one
+        self.assertEqual(arena.allocated_bytes, 10 * 10 * 4)
+        lease.release()
+        self.assertEqual(arena.free_count, 1)
+
+    def test_clear(self):
+        arena = BufferArena()
+        lease = arena.lease()
+        lease.acquire((2, 2), np.float32)
+        lease.release()
+        leased = arena.lease()
+        leased.acquire((3, 3), np.uint8)
+
+        arena.clear()
+        self.assertEqual(arena.free_count, 0)
+        # the leased buffer is still counted, and is kept once released
+        self.assertEqual(arena.allocated_bytes, 3 * 3)
+        leased.release()
+        self.assertEqual(arena.free_count, 1)
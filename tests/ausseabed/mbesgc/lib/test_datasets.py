@@ -0,0 +1,52 @@
+import os
+import tempfile
+import threading
+import unittest
+
+from osgeo import gdal
+
+from ausseabed.mbesgc.lib.datasets import DatasetPool
+
+
+class TestDatasetPool(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.temp_dir.name, "pool.tif")
+        ds = gdal.GetDriverByName("GTiff").Create(self.filename, 4, 4, 1)
+        ds = None
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_reuses_dataset(self):
+        pool = DatasetPool()
+        ds_a = pool.open(self.filename)
+        ds_b = pool.open(self.filename)
+        self.assertIs(ds_a, ds_b)
+        self.assertEqual(pool.open_count, 1)
+
+        pool.close()
+        self.assertEqual(pool.open_count, 0)
+
+    def test_dataset_per_thread(self):
+        pool = DatasetPool()
+        ds_main = pool.open(self.filename)
+
+        thread_datasets = []
+
+        def open_in_thread():
+            thread_datasets.append(pool.open(self.filename))
+
+        thread = threading.Thread(target=open_in_thread)
+        thread.start()
+        thread.join()
+
+        self.assertIsNot(ds_main, thread_datasets[0])
+        self.assertEqual(pool.open_count, 2)
+        pool.close()
+        self.assertEqual(pool.open_count, 0)
+
+    def test_missing_file(self):
+        pool = DatasetPool()
+        with self.assertRaises(RuntimeError):
+            pool.open(os.path.join(self.temp_dir.name, "missing.tif"))
@@ -0,0 +1,126 @@
+from multiprocessing.connection import Client
+import multiprocessing
+import queue
+import unittest
+
+from ausseabed.mbesgc.lib.distributed import (
+    Coordinator,
+    CoordinatorError,
+    parse_address,
+    run_worker,
+)
+
+AUTHKEY = b"test-authkey"
+
+
+def init_job(job):
+    global _multiplier
+    _multiplier = job["multiplier"]
+
+
+def process_task(value):
+    if value < 0:
+        raise ValueError("negative value")
+    return value * _multiplier
+
+
+def start_worker(address):
+    # workers that start after the coordinator has stopped give up quickly
+    process = multiprocessing.Process(
+        target=run_worker,
+        args=(address, AUTHKEY, init_job, process_task),
+        kwargs={"connect_timeout": 1.0},
+    )
+    process.start()
+    return process
+
+
+class TestDistributed(unittest.TestCase):
+    def get_results(self, coordinator, count):
+        results = {}
+        while len(results) < count:
+            task_id, result, error = coordinator.get_result(timeout=30)
+            results[task_id] = (result, error)
+        return results
+
+    def wait_for_error(self, coordinator):
+        with self.assertRaises(CoordinatorError):
+            while True:
+                try:
+                    coordinator.get_result(timeout=0.1)
+                except queue.Empty:
+                    continue
+
+    def test_parse_address(self):
+        self.assertEqual(parse_address("localhost:5050"), ("localhost", 5050))
+        self.assertEqual(parse_address("::1:5050"), ("::1", 5050))
+        with self.assertRaises(ValueError):
+            parse_address("localhost")
+
+    def test_workers_process_tasks(self):
+        coordinator = Coordinator(("127.0.0.1", 0), AUTHKEY)
+        workers = [start_worker(coordinator.address) for _ in range(3)]
+        coordinator.start({"multiplier": 3})
+        for task_id in range(20):
+            coordinator.put_task(task_id, task_id)
+
+        results = self.get_results(coordinator, 20)
+        coordinator.stop()
+        for worker in workers:
+            worker.join(timeout=30)
+            self.assertFalse(worker.is_alive())
+
+        self.assertEqual(
+            results, {task_id: (task_id * 3, None) for task_id in range(20)}
+        )
+
+    def test_task_error(self):
+        coordinator = Coordinator(("127.0.0.1", 0), AUTHKEY)
+        worker = start_worker(coordinator.address)
+        coordinator.start({"multiplier": 2})
+        coordinator.put_task(0, -1)
+        coordinator.put_task(1, 1)
+
+        results = self.get_results(coordinator, 2)
+        coordinator.stop()
+        worker.join(timeout=30)
+
+        self.assertIsNone(results[0][0])
+        self.assertIn("negative value", results[0][1])
+        self.assertEqual(results[1], (2, None))
+
+    def test_stop_without_workers(self):
+        coordinator = Coordinator(("127.0.0.1", 0), AUTHKEY)
+        coordinator.start({"multiplier": 1})
+        coordinator.stop()
+        with self.assertRaises(queue.Empty):
+            coordinator.get_result(timeout=0.1)
+
+    def test_start_after_stop(self):
+        coordinator = Coordinator(("127.0.0.1", 0), AUTHKEY)
+        coordinator.start({"multiplier": 1})
+        coordinator.stop()
+        with self.assertRaises(CoordinatorError):
+            coordinator.start({"multiplier": 1})
+
+    def test_connect_timeout(self):
+        coordinator = Coordinator(("127.0.0.1", 0), AUTHKEY, connect_timeout=0.2)
+        coordinator.start({"multiplier": 1})
+        coordinator.put_task(0, 1)
+        # no workers connect, so the result never arrives
+        self.wait_for_error(coordinator)
+        coordinator.stop()
+
+    def test_task_timeout(self):
+        coordinator = Coordinator(("127.0.0.1", 0), AUTHKEY, task_timeout=0.2)
+        coordinator.start({"multiplier": 1})
+        coordinator.put_task(0, 1)
+
+        # a worker that takes a task, but never returns its result
+        conn = Client(coordinator.address, authkey=AUTHKEY)
+        conn.recv()
+        conn.send(None)
+        self.assertEqual(conn.recv(), (0, 1))
+        self.wait_for_error(coordinator)
+        conn.close()
+        coordinator.stop()
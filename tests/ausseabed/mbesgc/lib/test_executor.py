@@ -1,11 +1,97 @@
+import asyncio
+import multiprocessing
+import numpy as np
+import os
+import tempfile
+import time
+import tracemalloc
 import unittest
+from unittest import mock
 import json
 
+from osgeo import gdal, osr
+
 from ausseabed.mbesgc.lib.allchecks import all_checks
 from ausseabed.qajson.model import QajsonCheck
 
-from ausseabed.mbesgc.lib.data import inputs_from_qajson_checks
-from ausseabed.mbesgc.lib.executor import Executor
+from ausseabed.mbesgc.lib.data import (
+    inputs_from_qajson_checks,
+    get_input_details,
+    InputFileDetails,
+    InputFileDetailsError,
+    BandType,
+)
+from ausseabed.mbesgc.lib.checkpoint import CheckpointError, RunCheckpoint
+from ausseabed.mbesgc.lib.distributed import Coordinator
+from ausseabed.mbesgc.lib.executor import (
+    Executor,
+    TileRecord,
+    run_tile_worker,
+)
+from ausseabed.mbesgc.lib.mbesgridcheck import DensityCheck, ResolutionCheck, TvuCheck
+from ausseabed.mbesgc.lib.progress import ProgressInfo
+from ausseabed.mbesgc.lib.tiling import Tile, get_tiles, order_tiles
+
+
+def create_test_grid(filename: str, size_x: int = 50, size_y: int = 40) -> None:
+    """
+    Creates a 3 band (depth, density, uncertainty) GeoTIFF filled with
+    random data, and a block of nodata, that can be run through the checks
+    """
+    rng = np.random.default_rng(42)
+    nodata = -9999.0
+
+    depth = rng.uniform(-120.0, -10.0, (size_y, size_x)).astype(np.float32)
+    density = rng.integers(0, 20, (size_y, size_x)).astype(np.float32)
+    uncertainty = rng.uniform(0.0, 2.0, (size_y, size_x)).astype(np.float32)
+    for band_data in (depth, density, uncertainty):
+        band_data[: size_y // 4, : size_x // 3] = nodata
+
+    srs = osr.SpatialReference()
+    srs.ImportFromEPSG(32755)
+
+    ds = gdal.GetDriverByName("GTiff").Create(
+        filename,
+        size_x,
+        size_y,
+        3,
+        gdal.GDT_Float32,
+        options=["TILED=YES", "BLOCKXSIZE=16", "BLOCKYSIZE=16"],
+    )
+    ds.SetGeoTransform([500000.0, 2.0, 0.0, 5800000.0, 0.0, -2.0])
+    ds.SetProjection(srs.ExportToWkt())
+    for band_index, (name, band_data) in enumerate(
+        [("depth", depth), ("density", density), ("uncertainty", uncertainty)],
+        start=1,
+    ):
+        band = ds.GetRasterBand(band_index)
+        band.SetDescription(name)
+        band.SetNoDataValue(nodata)
+        band.WriteArray(band_data)
+    ds.FlushCache()
+    ds = None
+
+
+def get_test_inputs(filename: str):
+    """Gets the input file details for a test grid, with all checks assigned"""
+    inputs = get_input_details([filename])
+    for ifd in inputs:
+        ifd.check_ids_and_params = [
+            (check_class.id, check_class.input_params) for check_class in all_checks
+        ]
+    return inputs
+
+
+def get_comparable_outputs(exe: Executor):
+    """Gets the outputs of all checks excluding the execution times"""
+    outputs = []
+    for (_, check_id), check in exe.check_result_cache.items():
+        output = check.get_outputs().to_dict()
+        output["execution"].pop("start", None)
+        output["execution"].pop("end", None)
+        outputs.append((check_id, json.dumps(output)))
+    return outputs
+
 
 check01_str = """
 {
@@ -117,3 +203,883 @@ class TestExecutor(unittest.TestCase):
 
         exe = Executor(inputs, all_checks)
         exe._preprocess()
+
+
+class TestExecutorParallel(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.grid_file = os.path.join(self.temp_dir.name, "test_grid.tif")
+        create_test_grid(self.grid_file)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_parallel_matches_serial(self):
+        serial = Executor(get_test_inputs(self.grid_file), all_checks)
+        serial.tile_size_x = 16
+        serial.tile_size_y = 16
+        serial.run()
+
+        parallel = Executor(get_test_inputs(self.grid_file), all_checks, workers=3)
+        parallel.tile_size_x = 16
+        parallel.tile_size_y = 16
+        parallel.run()
+
+        self.assertEqual(len(serial.check_result_cache), len(all_checks))
+        self.assertEqual(
+            get_comparable_outputs(serial), get_comparable_outputs(parallel)
+        )
+
+        # the stage timings recorded by the workers are returned with the
+        # results of each tile
+        serial_stages = serial.stats.to_dict()["stages"]
+        parallel_stages = parallel.stats.to_dict()["stages"]
+        self.assertEqual(serial_stages.keys(), parallel_stages.keys())
+        for name in ["load_data", "merge", "Density Check/run"]:
+            self.assertEqual(
+                serial_stages[name]["count"], parallel_stages[name]["count"]
+            )
+
+    def test_cost_schedule_matches_serial(self):
+        serial = Executor(get_test_inputs(self.grid_file), all_checks)
+        serial.tile_size_x = 16
+        serial.tile_size_y = 16
+        serial.run()
+
+        cost_history_file = os.path.join(self.temp_dir.name, "costs.json")
+        for _ in range(2):
+            # the second run schedules the tiles using the history saved by
+            # the first
+            parallel = Executor(get_test_inputs(self.grid_file), all_checks, workers=3)
+            parallel.tile_size_x = 16
+            parallel.tile_size_y = 16
+            parallel.tile_schedule = "cost"
+            parallel.cost_history_file = cost_history_file
+            parallel.run()
+            self.assertEqual(
+                get_comparable_outputs(serial), get_comparable_outputs(parallel)
+            )
+            self.assertTrue(os.path.exists(cost_history_file))
+
+        ifd = parallel.input_file_details[0]
+        tiles = parallel._plan_tiles(ifd)
+        history = parallel._get_cost_history()
+        for tile in tiles:
+            # tiles are recorded against the files of the input
+            valid_fraction, failed_fraction = history.get(
+                os.path.abspath(self.grid_file), tile
+            )
+            self.assertGreater(valid_fraction, 0.0)
+            self.assertLessEqual(failed_fraction, valid_fraction)
+        schedule = parallel._schedule_tiles(ifd, tiles)
+        self.assertEqual(sorted(schedule), list(range(len(tiles))))
+
+    def test_probe_tile(self):
+        ifd = get_test_inputs(self.grid_file)[0]
+        exe = Executor([ifd], all_checks)
+        tile = Tile(0, 0, 32, 32)
+
+        # without overviews the failures of the tile are not known
+        self.assertEqual(exe._probe_tile(ifd, tile), (1.0, None))
+        exe._datasets.close()
+
+        ds = gdal.Open(self.grid_file, gdal.GA_Update)
+        ds.BuildOverviews("NEAREST", [2, 4])
+        ds = None
+        valid_fraction, failed_fraction = exe._probe_tile(ifd, tile)
+        # the top left of the test grid is nodata
+        self.assertLess(valid_fraction, 1.0)
+        self.assertGreater(valid_fraction, 0.0)
+        self.assertIsNotNone(failed_fraction)
+        self.assertLessEqual(failed_fraction, valid_fraction)
+        exe._datasets.close()
+
+    def test_parallel_multiple_files(self):
+        grid_files = [self.grid_file]
+        for size_x, size_y in [(30, 20), (70, 35)]:
+            grid_file = os.path.join(self.temp_dir.name, f"grid_{size_x}.tif")
+            create_test_grid(grid_file, size_x, size_y)
+            grid_files.append(grid_file)
+
+        def get_inputs():
+            inputs = []
+            for grid_file in grid_files:
+                inputs.extend(get_test_inputs(grid_file))
+            return inputs
+
+        serial = Executor(get_inputs(), all_checks)
+        serial.tile_size_x = 16
+        serial.tile_size_y = 16
+        serial.run()
+
+        parallel_inputs = get_inputs()
+        parallel = Executor(list(parallel_inputs), all_checks, workers=2)
+        parallel.tile_size_x = 16
+        parallel.tile_size_y = 16
+        parallel.run()
+
+        self.assertEqual(len(parallel.check_result_cache), 3 * len(all_checks))
+        # results are stored against the input file details given to the
+        # executor, not the copies made for the worker processes
+        for src_ifd, _ in parallel.check_result_cache.keys():
+            self.assertTrue(any(src_ifd is ifd for ifd in parallel_inputs))
+        self.assertEqual(
+            get_comparable_outputs(serial), get_comparable_outputs(parallel)
+        )
+
+
+class TestExecutorDistributed(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.grid_file = os.path.join(self.temp_dir.name, "test_grid.tif")
+        create_test_grid(self.grid_file)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_distributed_matches_serial(self):
+        serial = Executor(get_test_inputs(self.grid_file), all_checks)
+        serial.tile_size_x = 16
+        serial.tile_size_y = 16
+        serial.run()
+
+        authkey = b"test-authkey"
+        coordinator = Coordinator(("127.0.0.1", 0), authkey)
+        # local processes stand in for the worker hosts
+        workers = [
+            multiprocessing.Process(
+                target=run_tile_worker,
+                args=(coordinator.address, authkey),
+                kwargs={"connect_timeout": 1.0},
+            )
+            for _ in range(2)
+        ]
+        for worker in workers:
+            worker.start()
+
+        distributed = Executor(
+            get_test_inputs(self.grid_file), all_checks, coordinator=coordinator
+        )
+        distributed.tile_size_x = 16
+        distributed.tile_size_y = 16
+        distributed.run()
+
+        for worker in workers:
+            worker.join(timeout=30)
+            self.assertFalse(worker.is_alive())
+
+        self.assertEqual(
+            get_comparable_outputs(serial), get_comparable_outputs(distributed)
+        )
+
+
+class TestExecutorPipeline(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.grid_file = os.path.join(self.temp_dir.name, "test_grid.tif")
+        create_test_grid(self.grid_file)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _run(self, export_location: str, pipeline_depth: int) -> Executor:
+        exe = Executor(
+            get_test_inputs(self.grid_file),
+            all_checks,
+            pipeline_depth=pipeline_depth,
+        )
+        exe.tile_size_x = 16
+        exe.tile_size_y = 16
+        exe.spatial_export = True
+        exe.spatial_export_location = export_location
+        exe.run()
+        return exe
+
+    def test_pipeline_matches_serial(self):
+        serial_location = os.path.join(self.temp_dir.name, "serial")
+        pipeline_location = os.path.join(self.temp_dir.name, "pipeline")
+        serial = self._run(serial_location, 0)
+        pipelined = self._run(pipeline_location, 2)
+
+        self.assertEqual(
+            get_comparable_outputs(serial), get_comparable_outputs(pipelined)
+        )
+
+        def exported_files(location):
+            return sorted(
+                os.path.relpath(os.path.join(root, f), location)
+                for root, _, files in os.walk(location)
+                for f in files
+            )
+
+        self.assertGreater(len(exported_files(serial_location)), 0)
+        self.assertEqual(
+            exported_files(serial_location), exported_files(pipeline_location)
+        )
+
+    def test_pipeline_buffers_freed(self):
+        exe = self._run(os.path.join(self.temp_dir.name, "pipeline"), 2)
+        # all leases were released, and the buffers freed at the end of the run
+        self.assertEqual(exe._buffers.allocated_bytes, 0)
+
+
+class TestExecutorMemoryBudget(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.grid_file = os.path.join(self.temp_dir.name, "test_grid.tif")
+        create_test_grid(self.grid_file, 64, 64)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_tiles_fit_budget(self):
+        ifd = get_test_inputs(self.grid_file)[0]
+        exe = Executor([ifd], all_checks)
+        exe.align_tiles = True
+        bytes_per_pixel = exe._estimate_bytes_per_pixel(ifd)
+        self.assertGreater(bytes_per_pixel, 0)
+
+        # enough memory for 40 rows of data, which will be aligned down to
+        # 32 rows (2 blocks)
+        exe.memory_budget = bytes_per_pixel * 64 * 40
+        tiles = exe._plan_tiles(ifd)
+        self.assertEqual(len(tiles), 2)
+        for tile in tiles:
+            self.assertLessEqual(
+                tile.width * tile.height * bytes_per_pixel, exe.memory_budget
+            )
+            # and tiles are still aligned to the blocks
+            self.assertEqual(tile.min_x % 16, 0)
+            self.assertEqual(tile.min_y % 16, 0)
+
+        # no budget, single tile
+        exe.memory_budget = None
+        self.assertEqual(len(exe._plan_tiles(ifd)), 1)
+
+    def test_default_tile_size(self):
+        ifd = get_test_inputs(self.grid_file)[0]
+        exe = Executor([ifd], all_checks)
+        exe.tile_size_x = 10
+        exe.tile_size_y = 10
+        # tiles are not aligned to the 16 pixel blocks unless asked for
+        tiles = exe._plan_tiles(ifd)
+        self.assertEqual((tiles[0].width, tiles[0].height), (10, 10))
+
+        exe.align_tiles = True
+        tiles = exe._plan_tiles(ifd)
+        self.assertEqual((tiles[0].width, tiles[0].height), (16, 16))
+
+    def test_tiles_in_memory(self):
+        exe = Executor(get_test_inputs(self.grid_file), all_checks, pipeline_depth=2)
+        self.assertEqual(exe._get_tiles_in_memory(), 6)
+        # the pipeline isn't used by worker processes, or with a coordinator
+        exe.workers = 3
+        self.assertEqual(exe._get_tiles_in_memory(), 3)
+        exe.workers = 1
+        exe.coordinator = Coordinator(("127.0.0.1", 0), b"test-authkey")
+        self.assertEqual(exe._get_tiles_in_memory(), 1)
+        exe.coordinator.stop()
+
+
+class TestExecutorLoadData(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.grid_file = os.path.join(self.temp_dir.name, "test_grid.tif")
+        create_test_grid(self.grid_file)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_grouped_read_matches_band_reads(self):
+        ifd = get_test_inputs(self.grid_file)[0]
+        exe = Executor([ifd], all_checks)
+        tile = Tile(5, 3, 37, 29)
+
+        src_ds = exe._datasets.open(self.grid_file)
+        grouped = exe._read_tile_bands(src_ds, [1, 2, 3], tile)
+        for band_index, band_data in zip([1, 2, 3], grouped):
+            expected = src_ds.GetRasterBand(band_index).ReadAsArray(
+                tile.min_x, tile.min_y, tile.width, tile.height
+            )
+            np.testing.assert_array_equal(band_data, expected)
+
+        depth, density, uncertainty, pinkchart, valid = exe._load_data(ifd, tile)
+        self.assertIsNone(pinkchart)
+        self.assertEqual(depth.shape, (tile.height, tile.width))
+        self.assertEqual(valid[BandType.depth].shape, depth.shape)
+        # nodata is not valid, and zeroed for density
+        self.assertFalse(valid[BandType.depth][0, 0])
+        self.assertFalse(valid[BandType.density][0, 0])
+        self.assertEqual(density[0, 0], 0)
+        self.assertTrue(valid[BandType.uncertainty][-1, -1])
+        exe._datasets.close()
+
+    def test_nan_nodata(self):
+        nan_file = os.path.join(self.temp_dir.name, "nan_grid.tif")
+        ds = gdal.GetDriverByName("GTiff").Create(nan_file, 4, 3, 1, gdal.GDT_Float32)
+        band = ds.GetRasterBand(1)
+        band.SetNoDataValue(float("nan"))
+        band_data = np.full((3, 4), 5.0, dtype=np.float32)
+        band_data[1, 2] = np.nan
+        band.WriteArray(band_data)
+        ds = None
+
+        ifd = InputFileDetails()
+        ifd.size_x = 4
+        ifd.size_y = 3
+        ifd.add_band_details(nan_file, 1, BandType.density)
+        ifd.check_ids_and_params = [(DensityCheck.id, DensityCheck.input_params)]
+        exe = Executor([ifd], all_checks)
+        _, density, _, _, valid = exe._load_data(ifd, Tile(0, 0, 4, 3))
+
+        expected_valid = np.ones((3, 4), dtype=bool)
+        expected_valid[1, 2] = False
+        np.testing.assert_array_equal(valid[BandType.density], expected_valid)
+        # the null density is zeroed
+        self.assertEqual(density[1, 2], 0)
+        exe._datasets.close()
+
+    def test_density_dtype(self):
+        ifd = get_test_inputs(self.grid_file)[0]
+        exe = Executor([ifd], all_checks)
+        tile = Tile(5, 3, 37, 29)
+
+        # the float density of the test grid fits in 16 bits
+        _, density, _, _, valid = exe._load_data(ifd, tile)
+        self.assertEqual(density.dtype, np.uint16)
+        src_ds = exe._datasets.open(self.grid_file)
+        expected = src_ds.GetRasterBand(2).ReadAsArray(
+            tile.min_x, tile.min_y, tile.width, tile.height
+        )
+        expected[~valid[BandType.density]] = 0
+        np.testing.assert_array_equal(density, expected.astype(int))
+        exe._datasets.close()
+
+        for data_type, values, expected_dtype in [
+            (gdal.GDT_UInt16, [0, 65535], np.uint16),
+            (gdal.GDT_UInt32, [0, 70000], np.uint32),
+            (gdal.GDT_Float32, [0.5, 70000.0], np.uint32),
+            (gdal.GDT_Float32, [-1.0, 3.0], np.int64),
+            (gdal.GDT_Int32, [1, 2**31 - 1], np.uint32),
+        ]:
+            density_file = os.path.join(self.temp_dir.name, "density.tif")
+            ds = gdal.GetDriverByName("GTiff").Create(density_file, 2, 1, 1, data_type)
+            ds.GetRasterBand(1).WriteArray(np.array([values]))
+            ds = None
+
+            ifd = InputFileDetails()
+            ifd.size_x = 2
+            ifd.size_y = 1
+            ifd.add_band_details(density_file, 1, BandType.density)
+            ifd.check_ids_and_params = [(DensityCheck.id, DensityCheck.input_params)]
+            exe = Executor([ifd], all_checks)
+            _, density, _, _, _ = exe._load_data(ifd, Tile(0, 0, 2, 1))
+            self.assertEqual(density.dtype, expected_dtype)
+            np.testing.assert_array_equal(density, np.array([values]).astype(int))
+            exe._datasets.close()
+
+    def test_load_data_into_buffers(self):
+        ifd = get_test_inputs(self.grid_file)[0]
+        exe = Executor([ifd], all_checks)
+        tile = Tile(5, 3, 37, 29)
+
+        expected = exe._load_data(ifd, tile)
+        lease = exe._buffers.lease()
+        loaded = exe._load_data(ifd, tile, lease)
+        for expected_data, data in zip(expected[:4], loaded[:4]):
+            if expected_data is None:
+                self.assertIsNone(data)
+                continue
+            np.testing.assert_array_equal(data, expected_data)
+        self.assertEqual(loaded[4].keys(), expected[4].keys())
+        for band_type, band_valid in loaded[4].items():
+            np.testing.assert_array_equal(band_valid, expected[4][band_type])
+        lease.release()
+        allocated_bytes = exe._buffers.allocated_bytes
+        self.assertGreater(allocated_bytes, 0)
+
+        # the next tile reuses the buffers
+        lease = exe._buffers.lease()
+        exe._load_data(ifd, Tile(0, 0, 32, 16), lease)
+        lease.release()
+        self.assertEqual(exe._buffers.allocated_bytes, allocated_bytes)
+        exe._datasets.close()
+
+    def test_only_required_bands_loaded(self):
+        ifd = get_test_inputs(self.grid_file)[0]
+        ifd.check_ids_and_params = [
+            (DensityCheck.id, DensityCheck.input_params),
+        ]
+        exe = Executor([ifd], all_checks)
+        tile = Tile(5, 3, 37, 29)
+
+        self.assertEqual(exe._get_required_band_types(ifd), [BandType.density])
+        depth, density, uncertainty, pinkchart, _ = exe._load_data(ifd, tile)
+        self.assertIsNone(depth)
+        self.assertIsNone(uncertainty)
+        self.assertIsNone(pinkchart)
+        self.assertEqual(density.shape, (tile.height, tile.width))
+        # only the density band is read
+        self.assertEqual(exe.stats.counters["bytes_read"], tile.width * tile.height * 4)
+
+        ifd.check_ids_and_params.append((TvuCheck.id, TvuCheck.input_params))
+        self.assertEqual(
+            exe._get_required_band_types(ifd),
+            [BandType.depth, BandType.density, BandType.uncertainty],
+        )
+        exe._datasets.close()
+
+
+class TestExecutorEmptyTiles(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.grid_file = os.path.join(self.temp_dir.name, "test_grid.tif")
+        create_test_grid(self.grid_file)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_sparse_tiles_are_empty(self):
+        sparse_file = os.path.join(self.temp_dir.name, "sparse.tif")
+        ds = gdal.GetDriverByName("GTiff").Create(
+            sparse_file,
+            64,
+            64,
+            1,
+            gdal.GDT_Float32,
+            options=["TILED=YES", "BLOCKXSIZE=16", "BLOCKYSIZE=16", "SPARSE_OK=TRUE"],
+        )
+        band = ds.GetRasterBand(1)
+        band.SetNoDataValue(-9999.0)
+        # only the block at 16,16 is written
+        band.WriteArray(np.ones((16, 16), dtype=np.float32), 16, 16)
+        ds = None
+
+        ifd = InputFileDetails()
+        ifd.size_x = 64
+        ifd.size_y = 64
+        ifd.add_band_details(sparse_file, 1, BandType.depth)
+
+        exe = Executor([ifd], all_checks)
+        self.assertTrue(exe._is_tile_empty(ifd, Tile(0, 0, 16, 16)))
+        self.assertTrue(exe._is_tile_empty(ifd, Tile(32, 32, 64, 64)))
+        self.assertFalse(exe._is_tile_empty(ifd, Tile(16, 16, 32, 32)))
+        self.assertFalse(exe._is_tile_empty(ifd, Tile(0, 0, 64, 64)))
+
+        depth, density, uncertainty, pinkchart, valid = exe._empty_data(ifd)
+        self.assertEqual(depth.size, 0)
+        self.assertEqual(valid, {})
+        self.assertIsNone(density)
+        exe._datasets.close()
+
+    def test_pinkchart_coverage(self):
+        pinkchart_file = os.path.join(self.temp_dir.name, "pinkchart.tif")
+        ds = gdal.GetDriverByName("GTiff").Create(
+            pinkchart_file, 64, 64, 1, gdal.GDT_Byte
+        )
+        pinkchart = np.zeros((64, 64), dtype=np.uint8)
+        # a single covered pixel near the bottom of the raster
+        pinkchart[60, 5] = 1
+        ds.GetRasterBand(1).WriteArray(pinkchart)
+        ds = None
+
+        exe = Executor([], all_checks)
+        band = exe._datasets.open(pinkchart_file).GetRasterBand(1)
+        # the pink chart is read a few rows at a time
+        with mock.patch("ausseabed.mbesgc.lib.executor.PINKCHART_SCAN_PIXELS", 64 * 3):
+            self.assertTrue(exe._is_covered(band, Tile(0, 0, 64, 64)))
+            self.assertTrue(exe._is_covered(band, Tile(0, 48, 16, 64)))
+            self.assertFalse(exe._is_covered(band, Tile(0, 0, 64, 60)))
+            self.assertFalse(exe._is_covered(band, Tile(16, 0, 64, 64)))
+        exe._datasets.close()
+
+    def test_skipping_matches_reading(self):
+        outputs = []
+        for skip_empty_tiles in [True, False]:
+            exe = Executor(get_test_inputs(self.grid_file), all_checks)
+            exe.tile_size_x = 16
+            exe.tile_size_y = 16
+            exe.skip_empty_tiles = skip_empty_tiles
+            exe.run()
+            outputs.append(get_comparable_outputs(exe))
+        self.assertEqual(outputs[0], outputs[1])
+
+
+class TestExecutorCheckpoint(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.grid_file = os.path.join(self.temp_dir.name, "test_grid.tif")
+        self.run_dir = os.path.join(self.temp_dir.name, "run")
+        create_test_grid(self.grid_file)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def get_executor(self, inputs=None):
+        if inputs is None:
+            inputs = get_test_inputs(self.grid_file)
+        exe = Executor(inputs, all_checks, checkpoint_dir=self.run_dir)
+        exe.tile_size_x = 16
+        exe.tile_size_y = 16
+        return exe
+
+    def run_interrupted(self, stop_after: int) -> None:
+        """Runs the executor, stopping it after a number of tiles"""
+        exe = self.get_executor()
+        merged_count = 0
+        merge_checks = exe._merge_checks
+
+        def counting_merge_checks(ifd, tile_checks):
+            nonlocal merged_count
+            merge_checks(ifd, tile_checks)
+            merged_count += 1
+
+        exe._merge_checks = counting_merge_checks
+        exe.run(is_stopped=lambda: merged_count >= stop_after)
+
+    def test_resume(self):
+        exe = self.get_executor()
+        exe.checkpoint_dir = None
+        exe.run()
+        expected_outputs = get_comparable_outputs(exe)
+
+        self.run_interrupted(stop_after=3)
+        self.assertTrue(os.path.exists(os.path.join(self.run_dir, "checkpoint.pkl")))
+
+        exe = self.get_executor()
+        exe.run(resume=True)
+        self.assertEqual(get_comparable_outputs(exe), expected_outputs)
+
+    def test_checkpoint_interval(self):
+        # with a long interval the checkpoint is only saved once all tiles
+        # have been completed
+        exe = self.get_executor()
+        exe.checkpoint_interval = 3600
+        with mock.patch.object(
+            RunCheckpoint, "write", autospec=True, side_effect=RunCheckpoint.write
+        ) as write:
+            exe.run()
+        self.assertEqual(write.call_count, 1)
+
+        exe = self.get_executor()
+        exe.checkpoint_interval = 0
+        with mock.patch.object(
+            RunCheckpoint, "write", autospec=True, side_effect=RunCheckpoint.write
+        ) as write:
+            exe.run()
+        self.assertEqual(write.call_count, sum(exe._completed_tile_counts))
+
+    def test_resume_without_checkpoint(self):
+        exe = self.get_executor()
+        exe.run(resume=True)
+        self.assertEqual(len(exe.check_result_cache), len(all_checks))
+
+    def test_resume_changed_parameters(self):
+        self.run_interrupted(stop_after=3)
+
+        inputs = get_test_inputs(self.grid_file)
+        inputs[0].check_ids_and_params = inputs[0].check_ids_and_params[:1]
+        exe = self.get_executor(inputs)
+        with self.assertRaises(CheckpointError):
+            exe.run(resume=True)
+
+
+class TestExecutorStats(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.grid_file = os.path.join(self.temp_dir.name, "test_grid.tif")
+        create_test_grid(self.grid_file)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_stage_timings(self):
+        exe = Executor(get_test_inputs(self.grid_file), all_checks)
+        exe.tile_size_x = 16
+        exe.tile_size_y = 16
+        # generate the spatial qajson outputs without exporting
+        exe.spatial_export_location = os.path.join(self.temp_dir.name, "unused")
+        exe.run()
+
+        tile_count = 4 * 3
+        stages = exe.stats.to_dict()["stages"]
+        self.assertEqual(stages["run"]["count"], 1)
+        self.assertEqual(stages["validate"]["count"], 1)
+        self.assertEqual(stages["load_data"]["count"], tile_count)
+        self.assertEqual(stages["merge"]["count"], tile_count)
+        for check_class in all_checks:
+            self.assertEqual(stages[f"{check_class.name}/run"]["count"], tile_count)
+        self.assertIn("Density Check/polygonize", stages)
+        self.assertIn("Density Check/grow_pixels", stages)
+        self.assertGreaterEqual(stages["run"]["total"], stages["load_data"]["total"])
+
+    def test_peak_memory(self):
+        exe = Executor(get_test_inputs(self.grid_file), all_checks)
+        exe.tile_size_x = 16
+        exe.tile_size_y = 16
+        exe.track_memory = True
+        exe.run()
+
+        stats = exe.stats.to_dict()
+        self.assertIn("peak_traced", stats["stages"]["load_data"])
+        self.assertIn("peak_traced", stats["stages"]["Density Check/run"])
+        self.assertIsNotNone(stats["peak_memory"]["tile"])
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_track_memory_pipelined(self):
+        # the peak traced is shared by the threads of the pipeline
+        exe = Executor(get_test_inputs(self.grid_file), all_checks, pipeline_depth=2)
+        exe.track_memory = True
+        with self.assertRaises(ValueError):
+            exe.run()
+
+
+class TestExecutorProgress(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.grid_file = os.path.join(self.temp_dir.name, "test_grid.tif")
+        create_test_grid(self.grid_file)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def run_with_progress(self, **kwargs):
+        exe = Executor(get_test_inputs(self.grid_file), all_checks, **kwargs)
+        exe.tile_size_x = 16
+        exe.tile_size_y = 16
+        progress = []
+        progress_infos = []
+        exe.run(progress.append, progress_info_callback=progress_infos.append)
+        return progress, progress_infos
+
+    def check_progress(self, progress, progress_infos):
+        # the float callback is still given the same progress values
+        self.assertEqual(progress, [info.progress for info in progress_infos])
+        self.assertEqual(progress, sorted(progress))
+        self.assertAlmostEqual(progress[-1], 1.0)
+
+        last_info = progress_infos[-1]
+        self.assertEqual(last_info.tiles_done, 4 * 3)
+        self.assertEqual(last_info.tiles_total, 4 * 3)
+        self.assertEqual(last_info.pixels_done, 50 * 40)
+        self.assertEqual(last_info.pixels_total, 50 * 40)
+        self.assertGreater(last_info.bytes_read, 0)
+        self.assertEqual(last_info.eta, 0)
+
+    def test_progress_info(self):
+        self.check_progress(*self.run_with_progress())
+
+    def test_progress_info_pipelined(self):
+        self.check_progress(*self.run_with_progress(pipeline_depth=2))
+
+    def test_progress_info_parallel(self):
+        progress, progress_infos = self.run_with_progress(workers=2)
+        self.assertEqual(progress_infos[-1].tiles_done, 4 * 3)
+        self.assertGreater(progress_infos[-1].bytes_read, 0)
+
+
+class TestExecutorAsync(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.grid_file = os.path.join(self.temp_dir.name, "test_grid.tif")
+        create_test_grid(self.grid_file)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_run_async(self):
+        exe = Executor(get_test_inputs(self.grid_file), all_checks)
+        exe.tile_size_x = 16
+        exe.tile_size_y = 16
+
+        async def run():
+            return [event async for event in exe.run_async()]
+
+        events = asyncio.run(run())
+        records = [e for e in events if isinstance(e, TileRecord)]
+        progress_infos = [e for e in events if isinstance(e, ProgressInfo)]
+        self.assertEqual(len(records), 4 * 3)
+        self.assertAlmostEqual(progress_infos[-1].progress, 1.0)
+        self.assertEqual(
+            [str(record.tile) for record in records],
+            [str(tile) for tile in exe._plan_tiles(exe.input_file_details[0])],
+        )
+
+        serial_exe = Executor(get_test_inputs(self.grid_file), all_checks)
+        serial_exe.tile_size_x = 16
+        serial_exe.tile_size_y = 16
+        serial_exe.run()
+        self.assertEqual(
+            get_comparable_outputs(exe), get_comparable_outputs(serial_exe)
+        )
+
+    def test_run_async_queue_size(self):
+        exe = Executor(get_test_inputs(self.grid_file), all_checks)
+        exe.tile_size_x = 16
+        exe.tile_size_y = 16
+
+        async def run():
+            records = []
+            async for event in exe.run_async(queue_size=1):
+                # the run waits for each event to be consumed
+                await asyncio.sleep(0.01)
+                if isinstance(event, TileRecord):
+                    records.append(event)
+            return records
+
+        records = asyncio.run(run())
+        self.assertEqual(len(records), 4 * 3)
+
+    def test_run_async_cancelled(self):
+        exe = Executor(get_test_inputs(self.grid_file), all_checks)
+        exe.tile_size_x = 4
+        exe.tile_size_y = 4
+        exe.align_tiles = False
+
+        async def run():
+            first_tile = asyncio.Event()
+
+            async def consume():
+                async for event in exe.run_async():
+                    if isinstance(event, TileRecord):
+                        first_tile.set()
+
+            task = asyncio.create_task(consume())
+            await first_tile.wait()
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(run())
+        # the run stopped before all tiles were processed
+        self.assertLess(sum(exe._completed_tile_counts), 13 * 10)
+
+    def test_run_async_error(self):
+        exe = Executor(get_test_inputs(self.grid_file), all_checks)
+        # inputs with two depth bands fail validation
+        exe.input_file_details[0].add_band_details(self.grid_file, 1, BandType.depth)
+
+        async def run():
+            async for _ in exe.run_async():
+                pass
+
+        with self.assertRaises(InputFileDetailsError):
+            asyncio.run(run())
+
+    def test_iter_results(self):
+        exe = Executor(get_test_inputs(self.grid_file), all_checks)
+        exe.tile_size_x = 16
+        exe.tile_size_y = 16
+
+        records = list(exe.iter_results())
+        self.assertTrue(all(isinstance(r, TileRecord) for r in records))
+        self.assertEqual(
+            [str(record.tile) for record in records],
+            [str(tile) for tile in exe._plan_tiles(exe.input_file_details[0])],
+        )
+
+        # the records of each tile add up to the merged results
+        src_ifd = exe.input_file_details[0]
+        for check_class in [TvuCheck, ResolutionCheck]:
+            merged = exe.check_result_cache[(src_ifd, check_class.id)]
+            summaries = [record.checks[check_class.id] for record in records]
+            self.assertEqual(
+                sum(summary.failed_cell_count for summary in summaries),
+                merged.failed_cell_count,
+            )
+            self.assertEqual(
+                sum(summary.total_cell_count for summary in summaries),
+                merged.total_cell_count,
+            )
+        density_histogram = {}
+        for record in records:
+            summary = record.checks[DensityCheck.id]
+            for soundings_count, count in summary.density_histogram.items():
+                density_histogram[soundings_count] = (
+                    density_histogram.get(soundings_count, 0) + count
+                )
+        merged = exe.check_result_cache[(src_ifd, DensityCheck.id)]
+        self.assertEqual(density_histogram, merged.density_histogram)
+        # records can be serialised for streaming to other processes
+        json.dumps([record.to_dict() for record in records])
+
+    def test_iter_results_queue_size(self):
+        exe = Executor(get_test_inputs(self.grid_file), all_checks)
+        exe.tile_size_x = 16
+        exe.tile_size_y = 16
+
+        records = []
+        for record in exe.iter_results(queue_size=1):
+            # the run waits for each record to be consumed
+            time.sleep(0.01)
+            records.append(record)
+        self.assertEqual(len(records), 4 * 3)
+
+    def test_iter_results_closed(self):
+        exe = Executor(get_test_inputs(self.grid_file), all_checks)
+        exe.tile_size_x = 4
+        exe.tile_size_y = 4
+        exe.align_tiles = False
+
+        results = exe.iter_results()
+        next(results)
+        results.close()
+        # the run stopped before all tiles were processed
+        self.assertLess(sum(exe._completed_tile_counts), 13 * 10)
+
+
+class TestExecutorTileOrder(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.grid_file = os.path.join(self.temp_dir.name, "test_grid.tif")
+        create_test_grid(self.grid_file)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_tile_order(self):
+        exe = Executor(get_test_inputs(self.grid_file), all_checks)
+        exe.tile_size_x = 16
+        exe.tile_size_y = 16
+        exe.align_tiles = False
+        ifd = exe.input_file_details[0]
+
+        # tiles are processed in rows by default
+        row_tiles = exe._plan_tiles(ifd)
+        self.assertEqual(
+            [str(tile) for tile in row_tiles],
+            [str(tile) for tile in get_tiles(0, 0, 50, 40, 16, 16)],
+        )
+
+        # the test grid is tiled
+        exe.tile_order = "auto"
+        hilbert_tiles = order_tiles(get_tiles(0, 0, 50, 40, 16, 16), "hilbert")
+        self.assertEqual(
+            [str(tile) for tile in exe._plan_tiles(ifd)],
+            [str(tile) for tile in hilbert_tiles],
+        )
+
+        exe.tile_order = "zorder"
+        zorder_tiles = exe._plan_tiles(ifd)
+        self.assertNotEqual(
+            [str(tile) for tile in zorder_tiles], [str(tile) for tile in row_tiles]
+        )
+        self.assertEqual(
+            sorted(str(tile) for tile in zorder_tiles),
+            sorted(str(tile) for tile in row_tiles),
+        )
+
+        # the results do not depend on the order, other than the order of
+        # the failure geometry
+        exe.run()
+        histogram = exe.check_result_cache[(ifd, all_checks[0].id)].density_histogram
+        row_exe = Executor(get_test_inputs(self.grid_file), all_checks)
+        row_exe.tile_size_x = 16
+        row_exe.tile_size_y = 16
+        row_exe.tile_order = "rows"
+        row_exe.run()
+        row_ifd = row_exe.input_file_details[0]
+        self.assertEqual(
+            histogram,
+            row_exe.check_result_cache[(row_ifd, all_checks[0].id)].density_histogram,
+        )
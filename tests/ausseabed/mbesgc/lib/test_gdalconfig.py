@@ -0,0 +1,44 @@
+import unittest
+
+from osgeo import gdal
+
+from ausseabed.mbesgc.lib.gdalconfig import GdalConfig
+
+
+class TestGdalConfig(unittest.TestCase):
+    def test_applied(self):
+        cache_max = gdal.GetCacheMax()
+        num_threads = gdal.GetConfigOption("GDAL_NUM_THREADS")
+        vsi_cache = gdal.GetConfigOption("VSI_CACHE")
+
+        config = GdalConfig(
+            cache_max=cache_max + 1024 * 1024, num_threads=2, vsi_cache=True
+        )
+        with config.applied():
+            self.assertEqual(gdal.GetCacheMax(), cache_max + 1024 * 1024)
+            self.assertEqual(gdal.GetConfigOption("GDAL_NUM_THREADS"), "2")
+            self.assertEqual(gdal.GetConfigOption("VSI_CACHE"), "TRUE")
+
+        # previous settings are restored after the run
+        self.assertEqual(gdal.GetCacheMax(), cache_max)
+        self.assertEqual(gdal.GetConfigOption("GDAL_NUM_THREADS"), num_threads)
+        self.assertEqual(gdal.GetConfigOption("VSI_CACHE"), vsi_cache)
+
+    def test_unset_settings_unchanged(self):
+        config = GdalConfig()
+        self.assertEqual(config.get_config_options(), {})
+        self.assertEqual(config.get_warp_options(), {})
+
+        cache_max = gdal.GetCacheMax()
+        with config.applied():
+            self.assertEqual(gdal.GetCacheMax(), cache_max)
+
+    def test_warp_options(self):
+        config = GdalConfig(num_threads="ALL_CPUS", warp_memory=256 * 1024 * 1024)
+        self.assertEqual(config.get_config_options(), {"GDAL_NUM_THREADS": "ALL_CPUS"})
+        self.assertEqual(
+            config.get_warp_options(),
+            {"warpMemoryLimit": 256 * 1024 * 1024, "multithread": True},
+        )
+        # the options are accepted by GDAL
+        gdal.WarpOptions(**config.get_warp_options())
@@ -0,0 +1,116 @@
+import io
+import os
+import pickle
+import tempfile
+import unittest
+from unittest import mock
+
+from ausseabed.mbesgc.lib.checkpoint import RunCheckpoint
+from ausseabed.mbesgc.lib.geometrystore import GeometryStore
+
+
+def get_polygon(i: int):
+    """Gets the coordinates of a square polygon offset by `i`"""
+    return [[[i, 0.5], [i + 1.25, 0.5], [i + 1.25, 1.0], [i, 1.0], [i, 0.5]]]
+
+
+class TestGeometryStore(unittest.TestCase):
+    def test_spill(self):
+        store = GeometryStore(spill_count=4)
+        polygons = [get_polygon(i) for i in range(10)]
+        for polygon in polygons[:3]:
+            store.append(polygon)
+        # polygons are kept in memory until there are enough to spill
+        self.assertEqual(store.spilled_count, 0)
+
+        store.extend(polygons[3:])
+        self.assertEqual(store.spilled_count, 8)
+        self.assertEqual(len(store), 10)
+        self.assertEqual(list(store), polygons)
+
+        # polygons can be added after being read back
+        store.append(get_polygon(10))
+        self.assertEqual(list(store), polygons + [get_polygon(10)])
+
+        store.close()
+        self.assertEqual(len(store), 0)
+
+    def test_extend_store(self):
+        a = GeometryStore(spill_count=2)
+        b = GeometryStore(spill_count=2)
+        a.extend([get_polygon(0), get_polygon(1), get_polygon(2)])
+        b.extend([get_polygon(3), get_polygon(4), get_polygon(5)])
+        a.extend(b)
+        self.assertEqual(list(a), [get_polygon(i) for i in range(6)])
+
+    def test_pickle(self):
+        store = GeometryStore(spill_count=2)
+        store.extend([get_polygon(i) for i in range(5)])
+        unpickled = pickle.loads(pickle.dumps(store))
+        self.assertEqual(unpickled.spill_count, 2)
+        self.assertEqual(list(unpickled), list(store))
+
+    def test_pickle_does_not_read_polygons(self):
+        store = GeometryStore(spill_count=10)
+        store.extend([get_polygon(i) for i in range(25)])
+
+        # the spilled polygons are pickled as bytes, without being parsed
+        with mock.patch(
+            "ausseabed.mbesgc.lib.geometrystore.json.loads",
+            side_effect=AssertionError("spilled polygons were read"),
+        ):
+            state = store.__getstate__()
+            data = pickle.dumps(store)
+        # only the polygons that have not been spilled are held as polygons
+        self.assertEqual(len(state["polygons"]), 5)
+        self.assertEqual(len(state["spilled"]), store.spilled_bytes)
+        self.assertEqual(list(pickle.loads(data)), list(store))
+
+    def test_copy_spilled(self):
+        store = GeometryStore(spill_count=2)
+        store.extend([get_polygon(i) for i in range(4)])
+        dest = io.BytesIO()
+        offset = store.copy_spilled(dest)
+        self.assertEqual(offset, store.spilled_bytes)
+
+        # only the polygons spilled since the last copy are copied
+        store.extend([get_polygon(i) for i in range(4, 7)])
+        offset = store.copy_spilled(dest, offset)
+        self.assertEqual(len(dest.getvalue()), offset)
+
+        dest.seek(0)
+        copy = GeometryStore.from_spilled(
+            dest, offset, store.spilled_count, store.memory_polygons, 2
+        )
+        self.assertEqual(list(copy), list(store))
+
+    def test_checkpoint(self):
+        store = GeometryStore(spill_count=10)
+        store.extend([get_polygon(i) for i in range(25)])
+
+        with tempfile.TemporaryDirectory() as run_dir:
+            checkpoint = RunCheckpoint(run_dir, "fingerprint")
+            # the spilled polygons are copied to the run directory, not
+            # included in the checkpoint
+            with mock.patch(
+                "ausseabed.mbesgc.lib.geometrystore.json.loads",
+                side_effect=AssertionError("spilled polygons were read"),
+            ):
+                checkpoint.write(checkpoint.dumps([1], [(0, "check", store)]))
+
+            # polygons added after the checkpoint are not included when it's
+            # loaded, even once they've been copied by the next checkpoint
+            expected = list(store)
+            store.extend([get_polygon(i) for i in range(25, 40)])
+            checkpoint.dumps([2], [(0, "check", store)])
+
+            _, checks = RunCheckpoint(run_dir, "fingerprint").load()
+            self.assertEqual(list(checks[0][2]), expected)
+
+            # geometry of a previous run is removed once replaced
+            old_geometry = [f for f in os.listdir(run_dir) if f.startswith("geo")]
+            new_checkpoint = RunCheckpoint(run_dir, "fingerprint")
+            new_checkpoint.write(new_checkpoint.dumps([0], [(0, "check", store)]))
+            new_geometry = [f for f in os.listdir(run_dir) if f.startswith("geo")]
+            self.assertEqual(len(new_geometry), 1)
+            self.assertNotEqual(new_geometry, old_geometry)
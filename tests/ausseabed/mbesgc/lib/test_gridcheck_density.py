@@ -86,7 +86,7 @@ class TestDensityCheck(unittest.TestCase):
         c_b = DensityCheck([])
         c_b.density_histogram = res_b
 
-        c_a.merge_results(c_b)
+        c_a.combine(c_b)
 
         self.assertEqual(c_a.density_histogram[0], 4)
         self.assertEqual(c_a.density_histogram[1], 5)
@@ -152,3 +152,32 @@ class TestDensityCheck(unittest.TestCase):
         # 95% so this should fail
         # "Minimum Soundings per node" is set to 0 so this wont be tripped.
         self.assertEqual(output.check_state, GridCheckState.cs_fail)
+
+    def test_density_halo(self):
+        ifd = InputFileDetails()
+        ifd.size_x = 10
+        ifd.size_y = 10
+        ifd.geotransform = [100.0, 0.001, 0.0, -10.0, 0.0, -0.001]
+        ifd.projection = self.dummy_ifd.projection
+
+        density = np.ma.array(np.full((10, 10), 10), mask=False)
+        # a failed node just outside the left half of the grid
+        density[4, 5] = 0
+
+        def run_check(tile, density):
+            check = DensityCheck([])
+            # generate the spatial qajson outputs without exporting
+            check.spatial_export_location = "unused"
+            check.run(ifd, tile, None, density, None, None)
+            return check
+
+        # tile covering the left half of the grid
+        check = run_check(Tile(0, 0, 5, 10), density[:, :5])
+        self.assertEqual(check.density_histogram, {10: 50})
+        self.assertEqual(len(check.failure_geometry), 0)
+
+        # the same tile with a halo covering the rest of the grid, the failed
+        # node is not counted but the area grown around it is included
+        check = run_check(Tile(0, 0, 10, 10, 0, 0, 5, 10), density)
+        self.assertEqual(check.density_histogram, {10: 50})
+        self.assertGreater(len(check.failure_geometry), 0)
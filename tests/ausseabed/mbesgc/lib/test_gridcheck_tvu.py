@@ -4,7 +4,7 @@ import unittest
 from ausseabed.qajson.model import QajsonParam
 
 from ausseabed.mbesgc.lib.mbesgridcheck import TvuCheck
-from ausseabed.mbesgc.lib.data import InputFileDetails
+from ausseabed.mbesgc.lib.data import BandType, InputFileDetails
 from ausseabed.mbesgc.lib.tiling import Tile
 
 
@@ -98,6 +98,32 @@ class TestDensityCheck(unittest.TestCase):
         # AND we've specified that 100% of the nodes must pass
         self.assertEqual(outputs.check_state, "fail")
 
+    def test_tvu_valid_masks(self):
+        # the executor gives the checks plain arrays and the masks of their
+        # valid pixels, which give the same results as masked arrays
+        input_params = [
+            QajsonParam("Constant Depth Error", 0.1),
+            QajsonParam("Factor of Depth Dependent Errors", 0.007),
+            QajsonParam("Acceptable Area Percentage", 100.0),
+        ]
+
+        check = TvuCheck(input_params)
+        check.run(
+            ifd=self.dummy_ifd,
+            tile=self.dummy_tile,
+            depth=self.depth.data,
+            density=self.density.data,
+            uncertainty=self.uncertainty.data,
+            pinkchart=None,
+            valid={
+                BandType.depth: ~self.depth.mask,
+                BandType.uncertainty: ~self.uncertainty.mask,
+            },
+        )
+
+        self.assertEqual(check.total_cell_count, 17)
+        self.assertEqual(check.failed_cell_count, 5)
+
     def test_tvu_with_area_threshold(self):
         # here we're saying 5 of the 17 nodes must have an allowable
         # uncertainty value for this check to be deemed a pass
@@ -125,6 +151,29 @@ class TestDensityCheck(unittest.TestCase):
         # pass the threshold which is the case here
         self.assertEqual(outputs.check_state, "pass")
 
+    def test_tvu_double_precision(self):
+        # the allowable uncertainty for this depth is 0.6527415 (rounded to
+        # 0.65274155 in single precision), so the uncertainty only fails when
+        # the allowable uncertainty is calculated in double precision
+        input_params = [
+            QajsonParam("Constant Depth Error", 0.1),
+            QajsonParam("Factor of Depth Dependent Errors", 0.007),
+            QajsonParam("Acceptable Area Percentage", 100.0),
+        ]
+
+        check = TvuCheck(input_params)
+        check.run(
+            ifd=self.dummy_ifd,
+            tile=Tile(0, 0, 1, 1),
+            depth=np.ma.array(np.array([[-92.148]], dtype=np.float32)),
+            density=None,
+            uncertainty=np.ma.array(np.array([[0.65274155]], dtype=np.float32)),
+            pinkchart=None,
+        )
+
+        self.assertEqual(check.total_cell_count, 1)
+        self.assertEqual(check.failed_cell_count, 1)
+
     def test_tvu_negative_uncertainty(self):
         # test that datasest that are produced with a negative uncertainty value
         # are correctly supported. Some bathy tools are known to produce negative
@@ -162,3 +211,27 @@ class TestDensityCheck(unittest.TestCase):
         # [0.29732138 0.29732138 0.29732138 0.29732138]
         # and these values exceed the actual uncertainty data in 5 locations
         self.assertEqual(check.failed_cell_count, 5)
+
+    def test_tvu_combine(self):
+        def tile_check(total_cell_count, failed_cell_count, coordinates):
+            check = TvuCheck([])
+            check.execution_status = "completed"
+            check.total_cell_count = total_cell_count
+            check.failed_cell_count = failed_cell_count
+            check.failure_geometry.extend(coordinates)
+            return check
+
+        # combining is associative, so results can be combined in any grouping
+        a, b, c = tile_check(10, 1, [1]), tile_check(20, 2, [2]), tile_check(5, 0, [])
+        a.combine(b)
+        a.combine(c)
+
+        x, y, z = tile_check(10, 1, [1]), tile_check(20, 2, [2]), tile_check(5, 0, [])
+        y.combine(z)
+        x.combine(y)
+
+        for check in [a, x]:
+            self.assertEqual(check.total_cell_count, 35)
+            self.assertEqual(check.failed_cell_count, 3)
+            # geometry is in the order the tiles were combined
+            self.assertEqual(list(check.failure_geometry), [1, 2])
@@ -0,0 +1,143 @@
+import pickle
+import threading
+import tracemalloc
+import unittest
+
+from ausseabed.mbesgc.lib.profiling import RunStats
+
+
+class TestRunStats(unittest.TestCase):
+    def test_stage(self):
+        stats = RunStats()
+        for _ in range(3):
+            with stats.stage("load_data"):
+                pass
+        stats.add("merge", 2.0)
+        stats.add("merge", 1.0)
+
+        stages = stats.to_dict()["stages"]
+        self.assertEqual(stages["load_data"]["count"], 3)
+        self.assertEqual(stages["merge"]["count"], 2)
+        self.assertEqual(stages["merge"]["total"], 3.0)
+        self.assertEqual(stages["merge"]["mean"], 1.5)
+        self.assertEqual(stages["merge"]["max"], 2.0)
+
+    def test_stage_error(self):
+        # time is recorded even if the stage fails
+        stats = RunStats()
+        with self.assertRaises(ValueError):
+            with stats.stage("run"):
+                raise ValueError()
+        self.assertEqual(stats.stages["run"].count, 1)
+
+    def test_merge(self):
+        stats = RunStats()
+        stats.add("load_data", 1.0)
+
+        # stats are returned from worker processes pickled
+        worker_stats = RunStats()
+        worker_stats.add("load_data", 3.0)
+        worker_stats.add("Density Check/run", 0.5)
+        stats.merge(pickle.loads(pickle.dumps(worker_stats)))
+
+        stages = stats.to_dict()["stages"]
+        self.assertEqual(stages["load_data"]["count"], 2)
+        self.assertEqual(stages["load_data"]["total"], 4.0)
+        self.assertEqual(stages["load_data"]["max"], 3.0)
+        self.assertEqual(stages["Density Check/run"]["count"], 1)
+
+    def test_threads(self):
+        stats = RunStats()
+
+        def add_stages():
+            for _ in range(1000):
+                stats.add("export", 0.001)
+
+        threads = [threading.Thread(target=add_stages) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(stats.stages["export"].count, 4000)
+
+    def test_format_table(self):
+        stats = RunStats()
+        stats.add("load_data", 1.0)
+        stats.add("Density Check/polygonize", 5.0)
+        lines = stats.format_table().split("\n")
+        self.assertEqual(len(lines), 3)
+        # slowest stage is listed first
+        self.assertTrue(lines[1].startswith("Density Check/polygonize"))
+
+
+class TestRunStatsMemory(unittest.TestCase):
+    def setUp(self):
+        tracemalloc.start()
+
+    def tearDown(self):
+        tracemalloc.stop()
+
+    def test_not_tracked(self):
+        stats = RunStats()
+        with stats.stage("load_data", "tile a"):
+            pass
+        self.assertNotIn("peak_traced", stats.to_dict()["stages"]["load_data"])
+        self.assertIsNone(stats.get_peak_memory())
+
+    def test_peak_memory(self):
+        stats = RunStats(track_memory=True)
+        for tile, size in [("tile a", 1000), ("tile b", 4_000_000), ("tile c", 10)]:
+            with stats.stage("load_data", tile):
+                data = bytearray(size)
+                del data
+
+        load_data = stats.to_dict()["stages"]["load_data"]
+        self.assertGreaterEqual(load_data["peak_traced"], 4_000_000)
+        self.assertEqual(load_data["peak_tile"], "tile b")
+
+    def test_nested_stages(self):
+        # the peak of a nested stage is included in the peak of the stage
+        # that encloses it, and is reported as driving the peak
+        stats = RunStats(track_memory=True)
+        with stats.stage("Density Check/run", "tile a"):
+            with stats.stage("Density Check/polygonize", "tile a"):
+                data = bytearray(4_000_000)
+                del data
+            with stats.stage("Density Check/simplify", "tile a"):
+                pass
+
+        stages = stats.to_dict()["stages"]
+        self.assertGreaterEqual(stages["Density Check/run"]["peak_traced"], 4_000_000)
+        self.assertLess(stages["Density Check/simplify"]["peak_traced"], 4_000_000)
+
+        peak_memory = stats.get_peak_memory()
+        self.assertEqual(peak_memory["stage"], "Density Check/polygonize")
+        self.assertEqual(peak_memory["tile"], "tile a")
+        self.assertIn("tile a", stats.format_table().split("\n")[-1])
+
+    def test_merge(self):
+        stats = RunStats(track_memory=True)
+        with stats.stage("load_data", "tile a"):
+            pass
+
+        worker_stats = RunStats(track_memory=True)
+        with worker_stats.stage("load_data", "tile b"):
+            data = bytearray(4_000_000)
+            del data
+        stats.merge(pickle.loads(pickle.dumps(worker_stats)))
+
+        self.assertEqual(stats.stages["load_data"].peak_tile, "tile b")
+
+
+class TestRunStatsCounters(unittest.TestCase):
+    def test_count(self):
+        stats = RunStats()
+        stats.count("bytes_read", 100)
+        stats.count("bytes_read", 50)
+
+        worker_stats = RunStats()
+        worker_stats.count("bytes_read", 10)
+        stats.merge(pickle.loads(pickle.dumps(worker_stats)))
+
+        self.assertEqual(stats.to_dict()["counters"], {"bytes_read": 160})
+        self.assertIn("bytes_read: 160", stats.format_table())
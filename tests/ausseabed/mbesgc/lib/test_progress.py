@@ -0,0 +1,61 @@
+import time
+import unittest
+
+from ausseabed.mbesgc.lib.progress import ProgressTracker
+
+
+class TestProgressTracker(unittest.TestCase):
+    def test_counts(self):
+        tracker = ProgressTracker()
+        tracker.add_planned(4, 400)
+        tracker.total_known = True
+        tracker.tile_done(100, 800)
+        tracker.tile_done(50, 400)
+
+        info = tracker.get_info(0.5)
+        self.assertEqual(info.progress, 0.5)
+        self.assertEqual(info.tiles_done, 2)
+        self.assertEqual(info.tiles_total, 4)
+        self.assertEqual(info.pixels_done, 150)
+        self.assertEqual(info.pixels_total, 400)
+        self.assertEqual(info.bytes_read, 1200)
+        self.assertEqual(tracker.fraction, 150 / 400)
+
+    def test_throughput(self):
+        tracker = ProgressTracker()
+        tracker.add_planned(3, 3_000_000)
+        tracker.total_known = True
+
+        info = tracker.get_info(0.0)
+        self.assertIsNone(info.pixels_per_second)
+        self.assertIsNone(info.eta)
+
+        time.sleep(0.05)
+        tracker.tile_done(1_000_000, 4_000_000)
+        info = tracker.get_info(0.3)
+        self.assertGreater(info.mpix_per_second, 0)
+        # 4 bytes read per pixel
+        self.assertAlmostEqual(info.mb_per_second, info.mpix_per_second * 4)
+        # 2 of the 3 tiles remain, which will take twice as long as the first
+        self.assertAlmostEqual(info.eta, 2 * 1_000_000 / info.pixels_per_second)
+        self.assertIn("MPix/s", str(info))
+        self.assertIn("eta", str(info))
+
+    def test_eta_unknown_total(self):
+        # the time remaining isn't known until all files have been planned
+        tracker = ProgressTracker()
+        tracker.add_planned(2, 200)
+        time.sleep(0.01)
+        tracker.tile_done(100, 100)
+        info = tracker.get_info(0.2)
+        self.assertIsNotNone(info.pixels_per_second)
+        self.assertIsNone(info.eta)
+
+    def test_resume(self):
+        # completed tiles are counted as done, but not in the throughput
+        tracker = ProgressTracker()
+        tracker.add_planned(4, 400, tiles_done=2, pixels_done=200)
+        tracker.total_known = True
+        info = tracker.get_info(0.5)
+        self.assertEqual(info.tiles_done, 2)
+        self.assertIsNone(info.pixels_per_second)
@@ -0,0 +1,64 @@
+import os
+import tempfile
+import unittest
+
+from ausseabed.mbesgc.lib.scheduling import (
+    CostHistory,
+    estimate_tile_cost,
+    get_schedule,
+)
+from ausseabed.mbesgc.lib.tiling import Tile
+
+
+class TestScheduling(unittest.TestCase):
+    def test_estimate_tile_cost(self):
+        tile = Tile(0, 0, 100, 100)
+        empty = estimate_tile_cost(tile, 0.0, None, spatial=True)
+        passing = estimate_tile_cost(tile, 1.0, 0.0, spatial=True)
+        failing = estimate_tile_cost(tile, 1.0, 0.5, spatial=True)
+        self.assertEqual(empty, 0.0)
+        self.assertGreater(passing, empty)
+        self.assertGreater(failing, passing)
+
+        # failures only add to the cost when spatial outputs are generated
+        self.assertEqual(
+            estimate_tile_cost(tile, 1.0, 0.0, spatial=False),
+            estimate_tile_cost(tile, 1.0, 0.5, spatial=False),
+        )
+        # smaller tiles (at the edge of the raster) cost less
+        self.assertLess(
+            estimate_tile_cost(Tile(0, 0, 10, 100), 1.0, 0.5, spatial=True), failing
+        )
+        # the halo of a tile does not add to its cost
+        self.assertEqual(
+            estimate_tile_cost(
+                Tile(0, 0, 104, 104, 2, 2, 102, 102), 1.0, 0.5, spatial=True
+            ),
+            failing,
+        )
+
+    def test_get_schedule(self):
+        # the most costly first, ties are kept in the planned order
+        self.assertEqual(get_schedule([1.0, 5.0, 0.0, 5.0, 2.0]), [1, 3, 4, 0, 2])
+        self.assertEqual(get_schedule([]), [])
+
+    def test_cost_history(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "costs.json")
+            # a missing history is empty
+            history = CostHistory.load(path)
+            self.assertIsNone(history.get("grid.tif", Tile(0, 0, 16, 16)))
+
+            history.record("grid.tif", Tile(0, 0, 16, 16), 0.75, 0.25)
+            history.save(path)
+
+            history = CostHistory.load(path)
+            self.assertEqual(history.get("grid.tif", Tile(0, 0, 16, 16)), (0.75, 0.25))
+            self.assertIsNone(history.get("grid.tif", Tile(0, 0, 32, 32)))
+            self.assertIsNone(history.get("other.tif", Tile(0, 0, 16, 16)))
+
+            # an unreadable history is ignored
+            with open(path, "w") as f:
+                f.write("not json")
+            history = CostHistory.load(path)
+            self.assertIsNone(history.get("grid.tif", Tile(0, 0, 16, 16)))
@@ -1,6 +1,12 @@
 import unittest
 
-from ausseabed.mbesgc.lib.tiling import get_tiles
+from ausseabed.mbesgc.lib.tiling import (
+    get_tiles,
+    get_aligned_tile_size,
+    get_budget_tile_size,
+    get_tile_order,
+    order_tiles,
+)
 
 
 class TestTiling(unittest.TestCase):
@@ -21,3 +27,102 @@ class TestTiling(unittest.TestCase):
         self.assertEqual(tiles[-1].max_y, max_y)
 
         self.assertEqual(len(tiles), 3 * 4)
+
+    def test_aligned_tile_size(self):
+        # tiles are snapped down to a multiple of the common block size
+        size = get_aligned_tile_size(1000, 1000, 5000, 4000, [(256, 256), (512, 128)])
+        self.assertEqual(size, (512, 768))
+
+        # no blocks, no change
+        size = get_aligned_tile_size(1000, 1000, 5000, 4000, [])
+        self.assertEqual(size, (1000, 1000))
+
+    def test_aligned_tile_size_striped(self):
+        # striped rasters use full width tiles with a similar pixel count
+        size = get_aligned_tile_size(1000, 1000, 5000, 4000, [(5000, 1), (5000, 4)])
+        self.assertEqual(size, (5000, 200))
+
+        # but always at least one strip
+        size = get_aligned_tile_size(10, 10, 5000, 4000, [(5000, 8)])
+        self.assertEqual(size, (5000, 8))
+
+    def test_aligned_tile_size_mismatched(self):
+        # common multiple of the blocks is larger than the tile, so the
+        # largest block is used
+        size = get_aligned_tile_size(900, 900, 5000, 4000, [(384, 384), (500, 500)])
+        self.assertEqual(size, (500, 500))
+
+        # blocks larger than the tile leave the tile size unchanged
+        size = get_aligned_tile_size(100, 100, 5000, 4000, [(256, 256)])
+        self.assertEqual(size, (100, 100))
+
+    def test_budget_tile_size(self):
+        # tile already fits within the budget
+        size = get_budget_tile_size(100, 100, 5000, 4000, 20000)
+        self.assertEqual(size, (100, 100))
+
+        # tile is shrunk keeping its aspect ratio
+        size = get_budget_tile_size(40000, 40000, 60000, 60000, 100000000)
+        self.assertEqual(size, (10000, 10000))
+
+        # narrow rasters use the full width and the remaining pixels go to
+        # the height
+        size = get_budget_tile_size(40000, 40000, 500, 60000, 1000000)
+        self.assertEqual(size, (500, 2000))
+
+    def test_get_tile_order(self):
+        self.assertEqual(get_tile_order(5000, [(5000, 8), (5000, 1)]), "rows")
+        self.assertEqual(get_tile_order(5000, [(5000, 8), (256, 256)]), "hilbert")
+        self.assertEqual(get_tile_order(5000, [(256, 256)]), "hilbert")
+
+    def test_order_tiles_hilbert(self):
+        tiles = get_tiles(0, 0, 40, 30, 10, 10)
+        ordered = order_tiles(tiles, "hilbert")
+        self.assertEqual(sorted(map(str, ordered)), sorted(map(str, tiles)))
+        # each tile is next to the tile before it
+        for previous, tile in zip(ordered, ordered[1:]):
+            distance = abs(tile.min_x - previous.min_x) + abs(
+                tile.min_y - previous.min_y
+            )
+            self.assertEqual(distance, 10)
+
+    def test_order_tiles_zorder(self):
+        tiles = get_tiles(0, 0, 40, 40, 10, 10)
+        ordered = order_tiles(tiles, "zorder")
+        # the first four tiles are the top left 2x2 tiles
+        self.assertEqual(
+            [(tile.min_x, tile.min_y) for tile in ordered[:4]],
+            [(0, 0), (10, 0), (0, 10), (10, 10)],
+        )
+
+    def test_order_tiles_rows(self):
+        tiles = get_tiles(0, 0, 40, 30, 10, 10)
+        self.assertEqual(order_tiles(tiles, "rows"), tiles)
+        with self.assertRaises(ValueError):
+            order_tiles(tiles, "spiral")
+
+    def test_get_tiles_halo(self):
+        tiles = get_tiles(0, 0, 14, 10, 5, 5, halo=2)
+        self.assertEqual(len(tiles), 3 * 2)
+
+        # read window is clipped to the extents
+        first = tiles[0]
+        self.assertEqual(
+            (first.min_x, first.min_y, first.max_x, first.max_y), (0, 0, 7, 7)
+        )
+        self.assertEqual(first.core_slices, (slice(0, 5), slice(0, 5)))
+
+        middle = tiles[1]
+        self.assertEqual((middle.min_x, middle.max_x), (3, 12))
+        self.assertEqual((middle.core_min_x, middle.core_max_x), (5, 10))
+        self.assertEqual(middle.core_slices[1], slice(2, 7))
+        self.assertTrue(middle.has_halo)
+        self.assertFalse(middle.core.has_halo)
+
+        # the cores cover the extents without overlapping
+        self.assertEqual(sum(tile.core_pixel_count for tile in tiles), 14 * 10)
+
+        # tiles without a halo are their own core
+        tile = get_tiles(0, 0, 14, 10, 5, 5)[1]
+        self.assertFalse(tile.has_halo)
+        self.assertEqual(tile.core_slices, (slice(0, 5), slice(0, 5)))